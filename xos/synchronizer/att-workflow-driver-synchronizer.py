@@ -29,4 +29,19 @@ if os.path.isfile(mounted_config_file):
 else:
     Config.init(base_config_file, 'synchronizer-config-schema.yaml')
 
-Synchronizer().run()
+
+class AttWorkflowDriverSynchronizer(Synchronizer):
+
+    def wait_for_ready(self):
+        super(AttWorkflowDriverSynchronizer, self).wait_for_ready()
+
+        # NOTE the event steps and the model policies start once this returns,
+        # so the first events after a restart find the caches already loaded
+        from event_workers import check_options
+        from warmup import warm_up, start_tasks
+        check_options()
+        warm_up(self.model_accessor, self.log)
+        start_tasks(self.model_accessor, self.log)
+
+
+AttWorkflowDriverSynchronizer().run()
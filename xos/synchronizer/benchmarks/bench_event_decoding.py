@@ -0,0 +1,81 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Compares the cost per event of decoding and validating the events:
+# - baseline: json.loads and reading the fields by key, as the event steps used to do
+# - decode_event: the shared decoding layer (ujson if installed, precompiled per-topic schemas)
+#
+# usage: python bench_event_decoding.py [--events N]
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+import event_schema  # noqa: E402
+from event_schema import decode_event  # noqa: E402
+
+EVENTS = {
+    "onu.events": {
+        "timestamp": "2018-09-11T01:00:49.506Z",
+        "status": "activated",
+        "serialNumber": "ALPHe3d1cfde",
+        "portNumber": "16",
+        "deviceId": "of:000000000a5a0072",
+    },
+    "authentication.events": {
+        "timestamp": "2018-09-11T00:41:47.483Z",
+        "deviceId": "of:000000000a5a0072",
+        "portNumber": "16",
+        "serialNumber": "ALPHe3d1cfde",
+        "authenticationState": "STARTED",
+    },
+    "dhcp.events": {
+        "deviceId": "of:000000000a5a0072",
+        "portNumber": "16",
+        "macAddress": "90:e2:ba:82:fa:81",
+        "ipAddress": "10.11.1.1",
+        "serialNumber": "ALPHe3d1cfde",
+        "messageType": "DHCPACK",
+    },
+}
+
+
+def baseline(topic, raw):
+    value = json.loads(raw)
+    for (field, required, check) in event_schema.SCHEMAS[topic]:
+        value.get(field)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("json backend: %s" % event_schema.json.__name__)
+    print("%-24s %16s %16s" % ("topic", "baseline us/ev", "decode us/ev"))
+    for (topic, event) in sorted(EVENTS.items()):
+        raw = json.dumps(event)
+        base = timeit.timeit(lambda: baseline(topic, raw), number=args.events)
+        decode = timeit.timeit(lambda: decode_event(topic, raw), number=args.events)
+        print("%-24s %16.2f %16.2f" % (topic, base * 1e6 / args.events, decode * 1e6 / args.events))
+
+
+if __name__ == "__main__":
+    main()
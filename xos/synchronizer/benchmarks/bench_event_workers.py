@@ -0,0 +1,85 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Measures the event throughput of the EventWorkerPool against the number of workers.
+# Processing an event is simulated with a fixed delay, standing for the round trips to the core
+# done by AttHelpers.find_or_create_att_si and save_changed_fields, plus a busy loop standing for
+# the Python code run for each event (decoding, building the protobufs, the helpers).
+# NOTE the delay is a time.sleep, that releases the GIL as waiting on the gRPC socket does, so the speedup is
+# bounded by the cpu time only: with --cpu-ms 0 it shows the best case rather than what the synchronizer achieves.
+#
+# usage: python bench_event_workers.py [--events N] [--onus N] [--latency-ms N] [--cpu-ms N] [--workers 1,2,4,8,16]
+
+import argparse
+import os
+import sys
+import time
+from mock import Mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from event_workers import EventWorkerPool  # noqa: E402
+
+
+class SimulatedStep(object):
+    def __init__(self, latency, cpu):
+        self.latency = latency
+        self.cpu = cpu
+
+    def process_value(self, value):
+        # holds the GIL
+        end = time.time() + self.cpu
+        while time.time() < end:
+            pass
+        # releases the GIL
+        time.sleep(self.latency)
+
+
+def run(workers, events, onus, latency, cpu):
+    pool_class = type("BenchmarkPool", (EventWorkerPool,), {"workers": workers})
+    pool = pool_class(Mock())
+    step = SimulatedStep(latency, cpu)
+
+    start = time.time()
+    for i in range(events):
+        pool.add(step, {"serialNumber": "BRCM%08d" % (i % onus)})
+    pool.join()
+    elapsed = time.time() - start
+
+    pool.stop()
+    return events / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--onus", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--cpu-ms", type=float, default=0.2)
+    parser.add_argument("--workers", default="1,2,4,8,16")
+    args = parser.parse_args()
+
+    print("%d events, %d ONUs, %.1f ms of latency (time.sleep, releases the GIL) and %.1f ms of cpu "
+          "(busy loop, holds the GIL) per event" % (args.events, args.onus, args.latency_ms, args.cpu_ms))
+    print("%8s %14s %8s" % ("workers", "events/s", "speedup"))
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        rate = run(workers, args.events, args.onus, args.latency_ms / 1000.0, args.cpu_ms / 1000.0)
+        baseline = baseline or rate
+        print("%8d %14.1f %7.2fx" % (workers, rate, rate / baseline))
+
+
+if __name__ == "__main__":
+    main()
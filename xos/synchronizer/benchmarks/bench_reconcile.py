@@ -0,0 +1,86 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Measures the time taken by a reconciliation sweep against the number of subscribers, when there is nothing
+# to correct: the snapshot is read from memory, so this is the cost of joining the models.
+#
+# usage: python bench_reconcile.py [--subscribers 1000,10000,100000]
+
+import argparse
+import os
+import sys
+import time
+from mock import Mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+
+from reconcile import Reconciler  # noqa: E402
+
+
+class Obj(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def model_accessor(subscribers):
+    old = time.time() - 3600
+    sis = []
+    entries = []
+    onus = []
+    ports = [Obj(id=i, port_no=i) for i in range(16)]
+    rcord_subscribers = []
+    for i in range(subscribers):
+        serial_number = "BRCM%08d" % i
+        sis.append(Obj(id=i, owner_id=1, serial_number=serial_number, of_dpid="of:1", admin_onu_state="ENABLED",
+                       oper_onu_status="ENABLED", authentication_state="APPROVED", dhcp_state="DHCPACK",
+                       status_message="ONU has been validated - Authentication succeeded", updated=old))
+        entries.append(Obj(id=i, owner_id=1, serial_number=serial_number, pon_port_id=i % 16, device_id="of:1"))
+        onus.append(Obj(id=i, serial_number=serial_number, admin_state="ENABLED", pon_port_id=i % 16, updated=old))
+        rcord_subscribers.append(Obj(id=i, onu_device=serial_number, status="enabled", updated=old))
+
+    accessor = Mock()
+    accessor.AttWorkflowDriverServiceInstance.objects.all.return_value = sis
+    accessor.AttWorkflowDriverWhiteListEntry.objects.all.return_value = entries
+    accessor.ONUDevice.objects.all.return_value = onus
+    accessor.PONPort.objects.all.return_value = ports
+    accessor.RCORDSubscriber.objects.all.return_value = rcord_subscribers
+    return accessor
+
+
+def run(subscribers):
+    reconciler = Reconciler()
+    reconciler.model_accessor = model_accessor(subscribers)
+    reconciler.log = Mock()
+
+    start = time.time()
+    stats = reconciler.sweep()
+    elapsed = time.time() - start
+    assert stats["si"] == stats["onu"] == 0
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", default="1000,10000,100000")
+    args = parser.parse_args()
+
+    print("%12s %10s %14s" % ("subscribers", "sweep (s)", "us/subscriber"))
+    for subscribers in [int(s) for s in args.subscribers.split(",")]:
+        elapsed = run(subscribers)
+        print("%12d %10.2f %14.1f" % (subscribers, elapsed, elapsed * 1e6 / subscribers))
+
+
+if __name__ == "__main__":
+    main()
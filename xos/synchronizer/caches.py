@@ -0,0 +1,661 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# In-process lookup structures shared by the event_steps and the model_policies.
+# They all live in the synchronizer process and are keyed by the normalized (lowercase)
+# serial number, as that is how ONUs are matched across the different models.
+
+import threading
+import time
+
+import metrics
+
+subscriber_index_hits = metrics.counter(
+    "att_workflow_driver_subscriber_index_hits",
+    "RCORDSubscriber lookups resolved by the SubscriberIndex")
+subscriber_index_misses = metrics.counter(
+    "att_workflow_driver_subscriber_index_misses",
+    "RCORDSubscriber lookups that went to the core")
+subscriber_index_negative_hits = metrics.counter(
+    "att_workflow_driver_subscriber_index_negative_hits",
+    "RCORDSubscriber lookups of serial numbers known not to have a subscriber, that didn't go to the core")
+subscriber_index_size = metrics.gauge(
+    "att_workflow_driver_subscriber_index_size",
+    "RCORDSubscribers in the SubscriberIndex")
+
+
+def normalize_serial(serial_number):
+    if serial_number is None:
+        return None
+    return serial_number.lower()
+
+
+class WhitelistIndex(object):
+    """
+    Index of AttWorkflowDriverWhiteListEntry by owner and normalized serial number.
+
+    The entries of an AttWorkflowDriverService are loaded the first time they are needed,
+    after that the index is kept current by AttWorkflowDriverWhiteListEntryPolicy.
+    The delete policy of an entry is not always called, so the entries are loaded again after ttl seconds,
+    and replaced with the ones read by each sweep of the Reconciler.
+    """
+
+    ttl = 600
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # owner_id -> {serial_number -> {entry_id -> entry}}
+            self.owners = {}
+            # entry_id -> (owner_id, serial_number), used to detect serial number changes
+            self.keys = {}
+            # owner_id -> time its entries have been read from the core
+            self.loaded_at = {}
+            # owner_id -> time one of its entries has been updated by the policy
+            self.changed_at = {}
+
+    def is_loaded(self, owner_id):
+        with self.lock:
+            return owner_id in self.owners and time.time() - self.loaded_at.get(owner_id, 0) < self.ttl
+
+    def load(self, model_accessor, owner_id):
+        loaded_at = time.time()
+        entries = model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter(owner_id=owner_id)
+        with self.lock:
+            self._set_owner(owner_id, entries, loaded_at)
+        return len(entries)
+
+    def replace(self, entries, loaded_at):
+        """
+        Replaces the index with entries, all the AttWorkflowDriverWhiteListEntries read at loaded_at.
+        The owners with entries updated since then are kept, they are loaded again after ttl.
+        """
+        owners = {}
+        for entry in entries:
+            owners.setdefault(entry.owner_id, []).append(entry)
+        with self.lock:
+            for owner_id in set(owners.keys()) | set(self.owners.keys()):
+                if self.changed_at.get(owner_id, 0) >= loaded_at:
+                    continue
+                self._set_owner(owner_id, owners.get(owner_id, []), loaded_at)
+
+    def get(self, model_accessor, owner_id, serial_number):
+        """
+        :return: the AttWorkflowDriverWhiteListEntry for serial_number or None
+        """
+        if not self.is_loaded(owner_id):
+            self.load(model_accessor, owner_id)
+
+        with self.lock:
+            matching = self.owners[owner_id].get(normalize_serial(serial_number))
+            if not matching:
+                return None
+            # keep the same precedence as the database, older entries first
+            return matching[min(matching.keys())]
+
+    def entries(self, model_accessor, owner_id):
+        """
+        :return: {normalized serial_number: [AttWorkflowDriverWhiteListEntry]} for an owner, older entries first
+        """
+        if not self.is_loaded(owner_id):
+            self.load(model_accessor, owner_id)
+
+        with self.lock:
+            return dict((serial_number, [matching[entry_id] for entry_id in sorted(matching)])
+                        for (serial_number, matching) in self.owners[owner_id].items())
+
+    def update(self, entry):
+        with self.lock:
+            self.changed_at[entry.owner_id] = time.time()
+            self._remove(entry)
+            # if the owner has not been loaded yet the entry will be picked up by load()
+            if entry.owner_id in self.owners:
+                self._add(entry.owner_id, entry)
+
+    def remove(self, entry):
+        with self.lock:
+            self.changed_at[entry.owner_id] = time.time()
+            self._remove(entry)
+
+    def remove_owner(self, owner_id):
+        with self.lock:
+            for matching in self.owners.pop(owner_id, {}).values():
+                for entry_id in matching:
+                    self.keys.pop(entry_id, None)
+            self.loaded_at.pop(owner_id, None)
+
+    def _set_owner(self, owner_id, entries, loaded_at):
+        self.remove_owner(owner_id)
+        self.owners[owner_id] = {}
+        self.loaded_at[owner_id] = loaded_at
+        for entry in entries:
+            self._add(owner_id, entry)
+
+    def _add(self, owner_id, entry):
+        serial_number = normalize_serial(entry.serial_number)
+        self.owners[owner_id].setdefault(serial_number, {})[entry.id] = entry
+        self.keys[entry.id] = (owner_id, serial_number)
+
+    def _remove(self, entry):
+        key = self.keys.pop(entry.id, None)
+        if not key:
+            return
+        (owner_id, serial_number) = key
+        matching = self.owners.get(owner_id, {}).get(serial_number)
+        if matching is None:
+            return
+        matching.pop(entry.id, None)
+        if not matching:
+            del self.owners[owner_id][serial_number]
+
+
+class NegativeCache(object):
+    """
+    Serial numbers that are known not to have an object, for ttl seconds.
+    It's used under the lock of the cache that owns it.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # serial_number -> time it expires
+        self.expires = {}
+        self.purged_at = 0
+
+    def __contains__(self, serial_number):
+        return self.expires.get(serial_number, 0) > time.time()
+
+    def add(self, serial_number):
+        now = time.time()
+        # the expired serial numbers are dropped at most once per ttl
+        if now - self.purged_at > self.ttl:
+            self.expires = dict((s, t) for (s, t) in self.expires.items() if t > now)
+            self.purged_at = now
+        self.expires[serial_number] = now + self.ttl
+
+    def discard(self, serial_number):
+        self.expires.pop(serial_number, None)
+
+
+class ONUDeviceCache(object):
+    """
+    Maps the normalized serial number of an ONUDevice to its id.
+
+    ONUDevices are owned by the vOLT service, so we can't keep the objects themselves around
+    (the admin_state can be changed by an operator at any time), but the id of a device never changes:
+    once it is known every lookup is a single keyed read.
+    A serial number without an ONUDevice (eg: during the bring-up of an OLT) costs a single keyed lookup,
+    and is remembered for negative_ttl seconds.
+    """
+
+    negative_ttl = 10
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.ids = {}
+            self.missing = NegativeCache(self.negative_ttl)
+
+    def invalidate(self, serial_number):
+        with self.lock:
+            serial_number = normalize_serial(serial_number)
+            self.ids.pop(serial_number, None)
+            self.missing.discard(serial_number)
+
+    def update(self, onu):
+        with self.lock:
+            serial_number = normalize_serial(onu.serial_number)
+            self.ids[serial_number] = onu.id
+            self.missing.discard(serial_number)
+
+    def dump(self):
+        with self.lock:
+            return dict(self.ids)
+
+    def restore(self, ids):
+        with self.lock:
+            self.ids = dict(ids)
+
+    def get(self, model_accessor, serial_number):
+        """
+        :return: the ONUDevice with serial_number (case insensitive) or None
+        """
+        serial_number = normalize_serial(serial_number)
+
+        with self.lock:
+            onu_id = self.ids.get(serial_number)
+
+        if onu_id is not None:
+            try:
+                onu = model_accessor.ONUDevice.objects.get(id=onu_id)
+                if normalize_serial(onu.serial_number) == serial_number:
+                    return onu
+            except Exception:
+                # the device has been removed, fall back to a lookup by serial number
+                pass
+            self.invalidate(serial_number)
+
+        with self.lock:
+            if serial_number in self.missing:
+                return None
+
+        onus = model_accessor.ONUDevice.objects.filter(serial_number__iexact=serial_number)
+        if not onus:
+            with self.lock:
+                self.missing.add(serial_number)
+            return None
+        self.update(onus[0])
+        return onus[0]
+
+    def refresh(self, model_accessor):
+        """
+        Reloads the ids of all the ONUDevices with a single scan
+
+        :return: dict of {serial_number: ONUDevice}
+        """
+        onus = {}
+        for onu in model_accessor.ONUDevice.objects.all():
+            onus[normalize_serial(onu.serial_number)] = onu
+        with self.lock:
+            self.ids = dict((serial_number, onu.id) for (serial_number, onu) in onus.items())
+            self.missing = NegativeCache(self.negative_ttl)
+        return onus
+
+
+class SubscriberIndex(object):
+    """
+    Maps the normalized onu_device of an RCORDSubscriber to its id.
+
+    A serial number that is not in the index costs a single keyed lookup. Subscribers are created by the operator
+    at any time, so a serial number without a subscriber is only remembered for negative_ttl seconds:
+    within that window misses don't go back to the core. The same applies to all the serial numbers
+    that were not found by the last full scan of the subscribers (see refresh).
+    """
+
+    negative_ttl = 30
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.ids = {}
+            self.scanned_at = None
+            self.missing = NegativeCache(self.negative_ttl)
+            self.hits = 0
+            self.misses = 0
+            self.negative_hits = 0
+
+    def invalidate(self, serial_number):
+        with self.lock:
+            serial_number = normalize_serial(serial_number)
+            self.ids.pop(serial_number, None)
+            self.missing.discard(serial_number)
+
+    def update(self, subscriber):
+        with self.lock:
+            serial_number = normalize_serial(subscriber.onu_device)
+            self.ids[serial_number] = subscriber.id
+            self.missing.discard(serial_number)
+
+    def dump(self):
+        with self.lock:
+            return dict(self.ids)
+
+    def restore(self, ids):
+        with self.lock:
+            self.ids = dict(ids)
+            # the subscribers created after the ids have been saved are not known, misses go back to the core
+            self.scanned_at = None
+            self.missing = NegativeCache(self.negative_ttl)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "size": len(self.ids),
+            }
+
+    def get(self, model_accessor, serial_number):
+        """
+        :return: the RCORDSubscriber for serial_number (case insensitive) or None
+        """
+        serial_number = normalize_serial(serial_number)
+
+        with self.lock:
+            subscriber_id = self.ids.get(serial_number)
+
+        if subscriber_id is not None:
+            try:
+                subscriber = model_accessor.RCORDSubscriber.objects.get(id=subscriber_id)
+                if normalize_serial(subscriber.onu_device) == serial_number:
+                    with self.lock:
+                        self.hits += 1
+                    subscriber_index_hits.inc()
+                    return subscriber
+            except Exception:
+                # the subscriber has been removed
+                pass
+            self.invalidate(serial_number)
+        else:
+            with self.lock:
+                if serial_number in self.missing or \
+                        (self.scanned_at is not None and time.time() - self.scanned_at < self.negative_ttl):
+                    self.negative_hits += 1
+                    subscriber_index_negative_hits.inc()
+                    return None
+
+        with self.lock:
+            self.misses += 1
+        subscriber_index_misses.inc()
+        subscribers = model_accessor.RCORDSubscriber.objects.filter(onu_device__iexact=serial_number)
+        if not subscribers:
+            with self.lock:
+                self.missing.add(serial_number)
+            return None
+        self.update(subscribers[0])
+        return subscribers[0]
+
+    def refresh(self, model_accessor):
+        """
+        Reloads the ids of all the RCORDSubscribers with a single scan
+
+        :return: dict of {serial_number: RCORDSubscriber}
+        """
+        subscribers = {}
+        for subscriber in model_accessor.RCORDSubscriber.objects.all():
+            subscribers[normalize_serial(subscriber.onu_device)] = subscriber
+        with self.lock:
+            self.ids = dict((serial_number, s.id) for (serial_number, s) in subscribers.items())
+            self.scanned_at = time.time()
+            self.missing = NegativeCache(self.negative_ttl)
+        return subscribers
+
+
+class ServiceInstanceIndex(object):
+    """
+    Maps the normalized serial number of AttWorkflowDriverServiceInstances to their ids.
+
+    The index is loaded the first time it is needed and is then kept current by
+    AttWorkflowDriverServiceInstancePolicy, so that the whitelist policy only reads the SIs it affects.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.loaded = False
+            # serial_number -> set(si_id)
+            self.ids = {}
+            # si_id -> serial_number, used to detect serial number changes
+            self.keys = {}
+
+    def load(self, model_accessor):
+        sis = model_accessor.AttWorkflowDriverServiceInstance.objects.all()
+        with self.lock:
+            self.ids = {}
+            self.keys = {}
+            for si in sis:
+                self._add(si)
+            self.loaded = True
+        return len(sis)
+
+    def get(self, model_accessor, serial_number):
+        """
+        :return: the list of AttWorkflowDriverServiceInstance for serial_number (case insensitive)
+        """
+        with self.lock:
+            loaded = self.loaded
+        if not loaded:
+            self.load(model_accessor)
+
+        serial_number = normalize_serial(serial_number)
+        with self.lock:
+            si_ids = sorted(self.ids.get(serial_number, []))
+
+        sis = []
+        for si_id in si_ids:
+            try:
+                sis.append(model_accessor.AttWorkflowDriverServiceInstance.objects.get(id=si_id))
+            except Exception:
+                # the SI has been removed and the policy didn't run yet
+                with self.lock:
+                    self._remove(si_id)
+        return sis
+
+    def update(self, si):
+        with self.lock:
+            self._remove(si.id)
+            # if the index has not been loaded yet the SI will be picked up by load()
+            if self.loaded:
+                self._add(si)
+
+    def remove(self, si):
+        with self.lock:
+            self._remove(si.id)
+
+    def dump(self):
+        """
+        :return: dict of {serial_number: [si_id]}, or None if the index has not been loaded
+        """
+        with self.lock:
+            if not self.loaded:
+                return None
+            return dict((serial_number, sorted(si_ids)) for (serial_number, si_ids) in self.ids.items())
+
+    def restore(self, ids):
+        with self.lock:
+            self.ids = {}
+            self.keys = {}
+            for (serial_number, si_ids) in ids.items():
+                self.ids[serial_number] = set(si_ids)
+                for si_id in si_ids:
+                    self.keys[si_id] = serial_number
+            self.loaded = True
+
+    def _add(self, si):
+        serial_number = normalize_serial(si.serial_number)
+        self.ids.setdefault(serial_number, set()).add(si.id)
+        self.keys[si.id] = serial_number
+
+    def _remove(self, si_id):
+        serial_number = self.keys.pop(si_id, None)
+        if serial_number is None:
+            return
+        matching = self.ids.get(serial_number)
+        if matching is None:
+            return
+        matching.discard(si_id)
+        if not matching:
+            del self.ids[serial_number]
+
+
+class OwnerServiceCache(object):
+    """
+    Caches the AttWorkflowDriverService (leaf model) that owns the SIs.
+
+    Invalidated by AttWorkflowDriverServicePolicy when the service changes.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.default = None
+
+    def invalidate(self, service_id):
+        with self.lock:
+            if self.default is not None and self.default.id == service_id:
+                self.default = None
+
+    def load(self, model_accessor):
+        """
+        Caches the first AttWorkflowDriverService, loading all of them with a single query
+
+        :return: the AttWorkflowDriverServices
+        """
+        services = sorted(model_accessor.AttWorkflowDriverService.objects.all(), key=lambda s: s.id)
+        with self.lock:
+            self.default = services[0] if services else None
+        return services
+
+    def first(self, model_accessor):
+        """
+        :return: the first AttWorkflowDriverService, we assume there is only one
+        """
+        with self.lock:
+            service = self.default
+        if service is None:
+            service = model_accessor.AttWorkflowDriverService.objects.first()
+            with self.lock:
+                self.default = service
+        return service
+
+
+class SubscriberIpCache(object):
+    """
+    Caches the RCORDIpAddress of each subscriber, keyed by ip.
+
+    The addresses of a subscriber are loaded with a single query the first time they are needed,
+    a DHCP renewal for an address we already know then costs no round trip to the core.
+    The addresses can also be removed outside of this synchronizer (eg: when the subscriber is deleted),
+    so a subscriber is reloaded after ttl seconds.
+    """
+
+    ttl = 300
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # subscriber_id -> (loaded_at, {ip -> RCORDIpAddress})
+            self.subscribers = {}
+
+    def invalidate(self, subscriber_id):
+        with self.lock:
+            self.subscribers.pop(subscriber_id, None)
+
+    def _ips(self, model_accessor, subscriber_id):
+        with self.lock:
+            cached = self.subscribers.get(subscriber_id)
+            if cached is not None and time.time() - cached[0] < self.ttl:
+                return cached[1]
+
+        ips = {}
+        for ip in model_accessor.RCORDIpAddress.objects.filter(subscriber_id=subscriber_id):
+            ips[ip.ip] = ip
+        with self.lock:
+            self.subscribers[subscriber_id] = (time.time(), ips)
+        return ips
+
+    def load(self, model_accessor, subscriber_ids=()):
+        """
+        Loads the addresses of all the subscribers with a single query
+
+        :param subscriber_ids: subscribers that are cached even if they have no address
+        :return: the number of addresses
+        """
+        subscribers = dict((subscriber_id, {}) for subscriber_id in subscriber_ids)
+        ips = model_accessor.RCORDIpAddress.objects.all()
+        for ip in ips:
+            subscribers.setdefault(ip.subscriber_id, {})[ip.ip] = ip
+        now = time.time()
+        with self.lock:
+            for (subscriber_id, subscriber_ips) in subscribers.items():
+                self.subscribers[subscriber_id] = (now, subscriber_ips)
+        return len(ips)
+
+    def get(self, model_accessor, subscriber_id, ip):
+        """
+        :return: the RCORDIpAddress of subscriber_id for ip or None
+        """
+        ips = self._ips(model_accessor, subscriber_id)
+        with self.lock:
+            return ips.get(ip)
+
+    def add(self, model_accessor, subscriber_id, ip):
+        ips = self._ips(model_accessor, subscriber_id)
+        with self.lock:
+            ips[ip.ip] = ip
+
+    def pop(self, model_accessor, subscriber_id, ip):
+        """
+        Removes ip from the cache
+        :return: the removed RCORDIpAddress or None
+        """
+        ips = self._ips(model_accessor, subscriber_id)
+        with self.lock:
+            return ips.pop(ip, None)
+
+
+class PolicyStateCache(object):
+    """
+    Remembers the state of each AttWorkflowDriverServiceInstance at the end of its last model_policy run,
+    so that the next run can tell which fields have changed in the meantime.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # si_id -> {field -> value}
+            self.states = {}
+
+    def get(self, si_id):
+        with self.lock:
+            return self.states.get(si_id)
+
+    def set(self, si_id, state):
+        with self.lock:
+            self.states[si_id] = state
+
+    def remove(self, si_id):
+        with self.lock:
+            self.states.pop(si_id, None)
+
+
+whitelist_index = WhitelistIndex()
+onu_device_cache = ONUDeviceCache()
+subscriber_index = SubscriberIndex()
+subscriber_index_size.track(lambda: subscriber_index.stats()["size"])
+service_instance_index = ServiceInstanceIndex()
+owner_service_cache = OwnerServiceCache()
+subscriber_ip_cache = SubscriberIpCache()
+policy_state_cache = PolicyStateCache()
+
+
+def clear_caches():
+    whitelist_index.clear()
+    onu_device_cache.clear()
+    subscriber_index.clear()
+    service_instance_index.clear()
+    owner_service_cache.clear()
+    subscriber_ip_cache.clear()
+    policy_state_cache.clear()
@@ -0,0 +1,220 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+from collections import OrderedDict
+
+from caches import normalize_serial
+from helpers import AttHelpers
+import metrics
+import settings
+
+coalescing_onus = metrics.gauge(
+    "att_workflow_driver_coalescing_onus",
+    "ONUs whose events are held by the EventCoalescer")
+
+
+class EventBatcher(object):
+    """
+    Accumulates the events received by an EventStep and hands them over to its process_batch method,
+    in batches of up to batch_size events or with whatever has been received in batch_timeout_ms.
+
+    There is one EventBatcher per EventStep class, batches are processed one at a time and in order.
+    NOTE the Kafka offset of an event is committed when it's added to a batch,
+    events that are still in a batch are lost if the synchronizer is restarted.
+    """
+
+    lock = threading.Lock()
+
+    @classmethod
+    def for_step(cls, step):
+        step_class = step.__class__
+        with cls.lock:
+            batcher = step_class.__dict__.get("batcher")
+            if batcher is None:
+                batcher = cls(step_class, step.model_accessor, step.log)
+                step_class.batcher = batcher
+        return batcher
+
+    def __init__(self, step_class, model_accessor, log):
+        self.step_class = step_class
+        self.model_accessor = model_accessor
+        self.log = log
+        self.batch_size = step_class.batch_size
+        self.batch_timeout = step_class.batch_timeout_ms / 1000.0
+
+        self.events = []
+        self.first_event_at = None
+        self.condition = threading.Condition()
+        # held while a batch is taken and processed, so that batches don't overtake each other
+        self.processing = threading.Lock()
+
+        self.thread = threading.Thread(target=self.run, name="%s-batcher" % step_class.__name__)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, event):
+        with self.condition:
+            if not self.events:
+                self.first_event_at = time.time()
+            self.events.append(event)
+            full = len(self.events) >= self.batch_size
+            self.condition.notify()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.processing:
+            with self.condition:
+                batch = self.events
+                self.events = []
+            if batch:
+                self.process(batch)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.events:
+                    self.condition.wait()
+                remaining = self.first_event_at + self.batch_timeout - time.time()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+            self.flush()
+
+    def process(self, batch):
+        self.log.debug("Processing event batch", step=self.step_class.__name__, events=len(batch))
+        try:
+            self.step_class(model_accessor=self.model_accessor, log=self.log).process_batch(batch)
+        except BaseException:
+            self.log.exception("Exception in event batch", step=self.step_class.__name__, events=len(batch))
+
+
+class EventCoalescer(object):
+    """
+    Holds the authentication and DHCP events of each ONU for window_ms, and then applies them to the SI together,
+    so that a subscriber boot (eg: STARTED, APPROVED, DHCPDISCOVER, DHCPREQUEST, DHCPACK) turns into
+    a single save and a single model_policy run.
+
+    The events of a serial number are always applied in the order they have been received,
+    see AttHelpers.process_coalesced_events for the transitions that are never merged.
+    The onu.events are not held: before one is applied the ONUEventStep flushes the events held for its ONU,
+    so that (eg) an authentication received before the ONU has been disabled is not applied after it is re-enabled.
+    NOTE as for the EventBatcher, events that are still being held are lost if the synchronizer is restarted.
+    """
+
+    # set window_ms (ATT_WORKFLOW_DRIVER_COALESCE_WINDOW_MS) to enable coalescing for the authentication.events
+    # and dhcp.events steps
+    window_ms = settings.COALESCE_WINDOW_MS
+
+    lock = threading.Lock()
+    instance = None
+
+    @classmethod
+    def enabled(cls):
+        return cls.window_ms > 0
+
+    @classmethod
+    def for_step(cls, step):
+        with cls.lock:
+            if cls.instance is None:
+                cls.instance = cls(step.model_accessor, step.log)
+        return cls.instance
+
+    def __init__(self, model_accessor, log):
+        self.model_accessor = model_accessor
+        self.log = log
+        self.window = self.window_ms / 1000.0
+
+        # serial_number -> (first_event_at, [(event, changes)]), oldest first
+        self.pending = OrderedDict()
+        # serial numbers whose events are being applied
+        self.applying = set()
+        self.condition = threading.Condition()
+
+        self.received = 0
+        self.saves = 0
+        coalescing_onus.track(lambda: self.stats()["pending"])
+
+        self.thread = threading.Thread(target=self.run, name="event-coalescer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "received": self.received,
+                "saves": self.saves,
+                "pending": len(self.pending),
+            }
+
+    def add(self, event, changes):
+        serial_number = normalize_serial(event["serialNumber"])
+        with self.condition:
+            if serial_number not in self.pending:
+                self.pending[serial_number] = (time.time(), [])
+            self.pending[serial_number][1].append((event, changes))
+            self.received += 1
+            self.condition.notify()
+
+    def take_expired(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            now = time.time()
+            expired = []
+            for (serial_number, (first_event_at, events)) in self.pending.items():
+                if now - first_event_at < self.window:
+                    break
+                expired.append(serial_number)
+            expired = [(serial_number, self.pending.pop(serial_number)[1]) for serial_number in expired]
+            self.applying.update(serial_number for (serial_number, events) in expired)
+            if not expired:
+                (first_event_at, events) = next(iter(self.pending.values()))
+                self.condition.wait(first_event_at + self.window - now)
+            return expired
+
+    def flush(self, serial_number):
+        """
+        Applies the events held for serial_number now, waiting for the ones that are already being applied
+        """
+        serial_number = normalize_serial(serial_number)
+        with self.condition:
+            while serial_number in self.applying:
+                self.condition.wait()
+            held = self.pending.pop(serial_number, None)
+            if held is None:
+                return
+            self.applying.add(serial_number)
+        self.apply(serial_number, held[1])
+
+    def apply(self, serial_number, events):
+        try:
+            saves = AttHelpers.process_coalesced_events(self.model_accessor, self.log, events)
+            with self.condition:
+                self.saves += saves
+        except BaseException:
+            self.log.exception("Exception while processing coalesced events", events=[e for (e, c) in events])
+        finally:
+            with self.condition:
+                self.applying.discard(serial_number)
+                self.condition.notify_all()
+
+    def run(self):
+        while True:
+            for (serial_number, events) in self.take_expired():
+                self.apply(serial_number, events)
+
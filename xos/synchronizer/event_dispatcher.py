@@ -0,0 +1,153 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import calendar
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from caches import normalize_serial
+import metrics
+import settings
+
+held_events = metrics.gauge(
+    "att_workflow_driver_held_events",
+    "Events held by the EventDispatcher to be dispatched in order")
+
+
+def parse_timestamp(value):
+    """
+    :return: the timestamp of an event (eg: "2018-09-11T01:00:49.506Z") in seconds, or None
+    """
+    timestamp = value.get("timestamp")
+    if not timestamp:
+        return None
+    for fmt in ["%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"]:
+        try:
+            parsed = datetime.strptime(timestamp, fmt)
+            return calendar.timegm(parsed.timetuple()) + parsed.microsecond / 1000000.0
+        except ValueError:
+            pass
+    return None
+
+
+class EventDispatcher(object):
+    """
+    Receives the events of onu.events, authentication.events and dhcp.events and hands them over to their
+    event step in the order they have been generated, rather than the order they have been received.
+
+    Each topic is consumed by a different thread, so (eg) the authentication of an ONU can be received before
+    its activation, and the SI would be created from the authentication event.
+    The events of each ONU are held for window_ms since the first one is received, and then dispatched sorted
+    by their timestamp. Events without a timestamp (dhcp.events) can't be compared with the ONOS clock, so they
+    are kept at the position they have been received in, and only the events with a timestamp are sorted among them.
+    At most max_pending events are held, past that the oldest ONUs are dispatched early.
+    NOTE as for the EventBatcher, events that are still being held are lost if the synchronizer is restarted.
+    """
+
+    # set window_ms (ATT_WORKFLOW_DRIVER_DISPATCH_WINDOW_MS) to enable reordering for all the event steps
+    window_ms = settings.DISPATCH_WINDOW_MS
+    max_pending = 10000
+
+    lock = threading.Lock()
+    instance = None
+
+    @classmethod
+    def enabled(cls):
+        return cls.window_ms > 0
+
+    @classmethod
+    def for_step(cls, step):
+        with cls.lock:
+            if cls.instance is None:
+                cls.instance = cls(step.log)
+        return cls.instance
+
+    def __init__(self, log):
+        self.log = log
+        self.window = self.window_ms / 1000.0
+
+        # serial_number -> (first_event_at, [(timestamp, seq, step, value)]), oldest first
+        self.pending = OrderedDict()
+        self.pending_events = 0
+        self.seq = 0
+        self.condition = threading.Condition()
+
+        self.received = 0
+        self.reordered = 0
+        held_events.track(lambda: self.stats()["pending"])
+
+        self.thread = threading.Thread(target=self.run, name="event-dispatcher")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "received": self.received,
+                "reordered": self.reordered,
+                "pending": self.pending_events,
+            }
+
+    def add(self, step, value):
+        serial_number = normalize_serial(value.get("serialNumber"))
+        timestamp = parse_timestamp(value)
+        with self.condition:
+            if serial_number not in self.pending:
+                self.pending[serial_number] = (time.time(), [])
+            self.pending[serial_number][1].append((timestamp, self.seq, step, value))
+            self.seq += 1
+            self.pending_events += 1
+            self.received += 1
+            self.condition.notify()
+
+    def take_expired(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            now = time.time()
+            expired = []
+            for (serial_number, (first_event_at, events)) in self.pending.items():
+                if now - first_event_at < self.window and self.pending_events <= self.max_pending:
+                    break
+                expired.append(self.pending.pop(serial_number)[1])
+                self.pending_events -= len(events)
+            if not expired:
+                (first_event_at, events) = next(iter(self.pending.values()))
+                self.condition.wait(first_event_at + self.window - now)
+            return expired
+
+    def sort(self, events):
+        """
+        Sorts the events of an ONU by timestamp, events without a timestamp stay where they have been received.
+        The sort is stable, so events with the same timestamp are kept in the order they have been received.
+        """
+        timestamped = iter(sorted([e for e in events if e[0] is not None], key=lambda e: e[0]))
+        ordered = [e if e[0] is None else next(timestamped) for e in events]
+        if [e[1] for e in ordered] != [e[1] for e in events]:
+            with self.condition:
+                self.reordered += 1
+            self.log.debug("Reordered events", events=[e[3] for e in ordered])
+        return ordered
+
+    def run(self):
+        while True:
+            for events in self.take_expired():
+                for (timestamp, seq, step, value) in self.sort(events):
+                    try:
+                        step.handle_value(value)
+                    except BaseException:
+                        self.log.exception("Exception while dispatching event", value=value)
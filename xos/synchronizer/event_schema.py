@@ -0,0 +1,128 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Decoding and validation of the events received on onu.events, authentication.events and dhcp.events.
+# Events are validated before they are handed over to the event steps, so that a malformed event
+# is discarded with a meaningful message instead of failing (eg: with a KeyError) after the SI has been looked up.
+
+try:
+    # ujson is optional, it's considerably faster than the json module of python 2
+    import ujson as json
+except ImportError:
+    import json
+
+import metrics
+
+invalid_events = metrics.counter(
+    "att_workflow_driver_invalid_events",
+    "Events that have been discarded because they could not be decoded or validated")
+
+
+class InvalidEvent(Exception):
+    pass
+
+
+def is_string(value):
+    return isinstance(value, basestring)
+
+
+def is_port(value):
+    return isinstance(value, (int, long)) or (isinstance(value, basestring) and value.isdigit())
+
+
+# topic -> [(field, required, check)]
+SCHEMAS = {
+    "onu.events": [
+        ("serialNumber", True, is_string),
+        ("status", True, is_string),
+        ("deviceId", True, is_string),
+        ("portNumber", True, is_port),
+        ("timestamp", False, is_string),
+    ],
+    "authentication.events": [
+        ("serialNumber", True, is_string),
+        ("authenticationState", True, is_string),
+        ("deviceId", True, is_string),
+        ("portNumber", True, is_port),
+        ("timestamp", False, is_string),
+    ],
+    "dhcp.events": [
+        ("serialNumber", True, is_string),
+        ("messageType", True, is_string),
+        ("ipAddress", True, is_string),
+        ("macAddress", True, is_string),
+        ("deviceId", True, is_string),
+        ("portNumber", True, is_port),
+        ("timestamp", False, is_string),
+    ],
+}
+
+
+def compile_schema(topic, fields):
+    """
+    :return: a function validating a decoded event and extracting the fields of the schema, in a single pass
+    """
+    fields = tuple(fields)
+
+    def extract(value):
+        if not isinstance(value, dict):
+            raise InvalidEvent("%s: event is not an object" % topic)
+        extracted = {}
+        for (field, required, check) in fields:
+            field_value = value.get(field)
+            if field_value is None:
+                if required:
+                    raise InvalidEvent("%s: missing %s" % (topic, field))
+                continue
+            if not check(field_value):
+                raise InvalidEvent("%s: invalid %s %r" % (topic, field, field_value))
+            extracted[field] = field_value
+        return extracted
+
+    return extract
+
+
+extractors = dict((topic, compile_schema(topic, fields)) for (topic, fields) in SCHEMAS.items())
+
+# topic -> counter of the events received, the rate of the topic is computed by the metrics server
+received_events = dict(
+    (topic, metrics.counter("att_workflow_driver_%s_received" % topic.replace(".", "_"),
+                            "Events received on %s" % topic))
+    for topic in SCHEMAS)
+
+# topic -> histogram of the time spent in the process_event method of its event step
+event_seconds = dict(
+    (topic, metrics.histogram("att_workflow_driver_%s_seconds" % topic.replace(".", "_"),
+                              "Time spent processing the events received on %s" % topic))
+    for topic in SCHEMAS)
+
+
+def decode_event(topic, raw):
+    """
+    Decodes and validates an event received on topic
+
+    :return: a dict with the fields of the event described by the schema of topic
+    :raises InvalidEvent: if the event can't be decoded or doesn't match the schema
+    """
+    received_events[topic].inc()
+    try:
+        try:
+            value = json.loads(raw)
+        except (ValueError, TypeError) as e:
+            raise InvalidEvent("%s: can't decode event: %s" % (topic, e))
+        return extractors[topic](value)
+    except InvalidEvent:
+        invalid_events.inc()
+        raise
@@ -13,23 +13,68 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 from xossynchronizer.event_steps.eventstep import EventStep
 from helpers import AttHelpers
+from event_batch import EventBatcher, EventCoalescer
+from event_workers import EventWorkerPool
+from event_dispatcher import EventDispatcher
+from event_schema import decode_event, event_seconds, InvalidEvent
+import settings
 
 
 class SubscriberAuthEventStep(EventStep):
     topics = ["authentication.events"]
     technology = "kafka"
 
+    # set batch_size (ATT_WORKFLOW_DRIVER_EVENT_BATCH_SIZE) to process the events in batches of up to batch_size
+    # events or batch_timeout_ms
+    batch_size = settings.EVENT_BATCH_SIZE
+    batch_timeout_ms = 100
+
     def __init__(self, *args, **kwargs):
         super(SubscriberAuthEventStep, self).__init__(*args, **kwargs)
 
-    def process_event(self, event):
-        value = json.loads(event.value)
-        self.log.info("authentication.events: Got event for subscriber", event_value=value)
-        
+    def get_si_changes(self, value):
+        return {
+            "authentication_state": value["authenticationState"],
+        }
+
+    def process_batch(self, values):
+        AttHelpers.process_event_batch(self.model_accessor, self.log, values, self.get_si_changes)
+
+    def process_value(self, value):
         si = AttHelpers.find_or_create_att_si(self.model_accessor, self.log, value)
         self.log.debug("authentication.events: Updating service instance", si=si)
-        si.authentication_state = value["authenticationState"]
-        si.save_changed_fields(always_update_timestamp=True)
+        changed = AttHelpers.update_att_si(si, self.get_si_changes(value))
+        AttHelpers.save_att_si(self.log, si, changed)
+
+    def handle_value(self, value):
+        if EventCoalescer.enabled():
+            EventCoalescer.for_step(self).add(value, self.get_si_changes(value))
+            return
+
+        if self.batch_size:
+            EventBatcher.for_step(self).add(value)
+            return
+
+        if EventWorkerPool.enabled():
+            EventWorkerPool.for_step(self).add(self, value)
+            return
+
+        self.process_value(value)
+
+    def process_event(self, event):
+        with event_seconds["authentication.events"].time():
+            try:
+                value = decode_event("authentication.events", event.value)
+            except InvalidEvent as e:
+                self.log.warn("authentication.events: discarding invalid event", error=str(e), event_value=event.value)
+                return
+
+            self.log.info("authentication.events: Got event for subscriber", event_value=value)
+
+            if EventDispatcher.enabled():
+                EventDispatcher.for_step(self).add(self, value)
+                return
+
+            self.handle_value(value)
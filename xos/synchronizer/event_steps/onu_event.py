@@ -14,37 +14,96 @@
 # limitations under the License.
 
 
-import json
 from xossynchronizer.event_steps.eventstep import EventStep
 from helpers import AttHelpers
+from event_batch import EventBatcher, EventCoalescer
+from event_workers import EventWorkerPool
+from event_dispatcher import EventDispatcher
+from event_schema import decode_event, event_seconds, InvalidEvent
+from onu_waitlist import onu_waitlist
+from onu_admission import onu_admission
+import settings
 
 
 class ONUEventStep(EventStep):
     topics = ["onu.events"]
     technology = "kafka"
 
-    max_onu_retry = 50
+    # set batch_size (ATT_WORKFLOW_DRIVER_EVENT_BATCH_SIZE) to process the events in batches of up to batch_size
+    # events or batch_timeout_ms
+    batch_size = settings.EVENT_BATCH_SIZE
+    batch_timeout_ms = 100
 
     def __init__(self, *args, **kwargs):
         super(ONUEventStep, self).__init__(*args, **kwargs)
 
-    def process_event(self, event):
-        value = json.loads(event.value)
-        self.log.info("onu.events: received event", value=value)
-
-        att_si = AttHelpers.find_or_create_att_si(self.model_accessor, self.log, value)
+    def get_si_changes(self, value):
         if value["status"] == "activated":
             self.log.info("onu.events: activated onu", value=value)
-            att_si.no_sync = False
-            att_si.uni_port_id = long(value["portNumber"])
-            att_si.of_dpid = value["deviceId"]
-            att_si.oper_onu_status = "ENABLED"
-            att_si.save_changed_fields(always_update_timestamp=True)
+            return {
+                "no_sync": False,
+                "uni_port_id": long(value["portNumber"]),
+                "of_dpid": value["deviceId"],
+                "oper_onu_status": "ENABLED",
+            }
         elif value["status"] == "disabled":
             self.log.info("onu.events: disabled onu, resetting the subscriber", value=value)
-            att_si.oper_onu_status = "DISABLED"
-            att_si.save_changed_fields(always_update_timestamp=True)
-            return
+            return {
+                "oper_onu_status": "DISABLED",
+            }
         else:
             self.log.warn("onu.events: Unknown status value: %s" % value["status"], value=value)
+            return None
+
+    def process_batch(self, values):
+        AttHelpers.process_event_batch(self.model_accessor, self.log, values, self.get_si_changes)
+
+    def process_value(self, value):
+        att_si = AttHelpers.find_or_create_att_si(self.model_accessor, self.log, value)
+        changes = self.get_si_changes(value)
+        if changes:
+            changed = AttHelpers.update_att_si(att_si, changes)
+            AttHelpers.save_att_si(self.log, att_si, changed)
+
+    def handle_value(self, value):
+        # NOTE ONUs that are not in the whitelist only create an SI once, and a few per OLT at a time
+        if not onu_admission.admit(self.model_accessor, self.log, value, step=self):
+            return
+
+        if value["status"] == "activated":
+            # SIs waiting for this ONUDevice, or that gave up waiting, are checked now rather than at the next
+            # check_interval
+            onu_waitlist.wake(value["serialNumber"])
+
+        if EventCoalescer.enabled():
+            # the authentication and DHCP events received before this one are applied first
+            EventCoalescer.for_step(self).flush(value["serialNumber"])
+
+        if self.batch_size:
+            EventBatcher.for_step(self).add(value)
+            return
+
+        if EventWorkerPool.enabled():
+            EventWorkerPool.for_step(self).add(self, value)
             return
+
+        self.process_value(value)
+
+    def process_event(self, event):
+        with event_seconds["onu.events"].time():
+            # the dropped events of ONUs that have been added to the whitelist since the previous event go first
+            onu_admission.replay()
+
+            try:
+                value = decode_event("onu.events", event.value)
+            except InvalidEvent as e:
+                self.log.warn("onu.events: discarding invalid event", error=str(e), event_value=event.value)
+                return
+
+            self.log.info("onu.events: received event", value=value)
+
+            if EventDispatcher.enabled():
+                EventDispatcher.for_step(self).add(self, value)
+                return
+
+            self.handle_value(value)
@@ -50,6 +50,9 @@ class TestSubscriberAuthEvent(unittest.TestCase):
         from xossynchronizer.modelaccessor import model_accessor
         from auth_event import SubscriberAuthEventStep
 
+        from caches import clear_caches
+        clear_caches()
+
         # import all class names to globals
         for (k, v) in model_accessor.all_model_classes.items():
             globals()[k] = v
@@ -89,6 +92,27 @@ class TestSubscriberAuthEvent(unittest.TestCase):
                     'authentication_state', 'serial_number', 'updated'])
             self.assertEqual(self.att_si.authentication_state, 'APPROVED')
 
+    def test_coalesce_events(self):
+        from event_batch import EventCoalescer
+
+        value = {
+            'authenticationState': "APPROVED",
+            'deviceId': "of:0000000ce2314000",
+            'portNumber': "101",
+            'serialNumber': "BRCM1234",
+        }
+        self.event.value = json.dumps(value)
+
+        with patch.object(EventCoalescer, "window_ms", 100), \
+                patch.object(EventCoalescer, "for_step") as for_step, \
+                patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as att_si_mock:
+            att_si_mock.return_value = [self.att_si]
+
+            self.event_step.process_event(self.event)
+
+            for_step.return_value.add.assert_called_with(value, {"authentication_state": "APPROVED"})
+            self.att_si.save.assert_not_called()
+
 
 if __name__ == '__main__':
     sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))  # for import of helpers.py
@@ -50,6 +50,9 @@ class TestSubscriberAuthEvent(unittest.TestCase):
         from xossynchronizer.modelaccessor import model_accessor
         from dhcp_event import SubscriberDhcpEventStep
 
+        from caches import clear_caches
+        clear_caches()
+
         # import all class names to globals
         for (k, v) in model_accessor.all_model_classes.items():
             globals()[k] = v
@@ -48,6 +48,11 @@ class TestSyncOLTDevice(unittest.TestCase):
         from xossynchronizer.modelaccessor import model_accessor
         from onu_event import ONUEventStep
 
+        from caches import clear_caches
+        from onu_admission import onu_admission
+        clear_caches()
+        onu_admission.clear()
+
         # import all class names to globals
         for (k, v) in model_accessor.all_model_classes.items():
             globals()[k] = v
@@ -70,6 +75,9 @@ class TestSyncOLTDevice(unittest.TestCase):
 
     def tearDown(self):
         sys.path = self.sys_path_save
+        self.event_step.__class__.batch_size = 0
+        self.event_step.__class__.batch_timeout_ms = 100
+        self.event_step.__class__.batcher = None
 
     def test_create_instance(self):
 
@@ -151,6 +159,37 @@ class TestSyncOLTDevice(unittest.TestCase):
             self.assertEqual(att_si.admin_onu_state, 'ENABLED')
             self.assertEqual(att_si.oper_onu_status, 'DISABLED')
 
+    def test_disable_onu_flushes_coalesced_events(self):
+        from event_batch import EventCoalescer
+
+        self.event_dict = {
+            'status': 'disabled',
+            'serialNumber': 'BRCM1234',
+            'deviceId': 'of:109299321',
+            'portNumber': '16',
+        }
+        self.event.value = json.dumps(self.event_dict)
+
+        si = AttWorkflowDriverServiceInstance(
+            serial_number=self.event_dict["serialNumber"],
+            oper_onu_status="ENABLED",
+        )
+
+        calls = []
+        with patch.object(EventCoalescer, "window_ms", 100), \
+                patch.object(EventCoalescer, "for_step") as for_step, \
+                patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as att_si_mock, \
+                patch.object(AttWorkflowDriverServiceInstance, "save_changed_fields", autospec=True) as mock_save:
+            att_si_mock.return_value = [si]
+            for_step.return_value.flush.side_effect = lambda serial_number: calls.append("flush")
+            mock_save.side_effect = lambda si, **kwargs: calls.append("save")
+
+            self.event_step.process_event(self.event)
+
+            # the authentication and DHCP events held for the ONU are applied before it's disabled
+            for_step.return_value.flush.assert_called_once_with("BRCM1234")
+            self.assertEqual(calls, ["flush", "save"])
+
     def test_enable_onu(self):
         self.event_dict = {
             'status': 'activated',
@@ -183,6 +222,98 @@ class TestSyncOLTDevice(unittest.TestCase):
             self.assertEqual(att_si.admin_onu_state, 'DISABLED')
             self.assertEqual(att_si.oper_onu_status, 'ENABLED')
 
+    def test_invalid_event(self):
+        del self.event_dict["serialNumber"]
+        self.event.value = json.dumps(self.event_dict)
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as att_si_mock:
+            self.event_step.process_event(self.event)
+
+            # the event is discarded before looking up the SI
+            att_si_mock.assert_not_called()
+
+    def test_onu_not_in_whitelist(self):
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as att_si_mock, \
+                patch.object(AttWorkflowDriverService.objects, "get_items") as service_mock, \
+                patch.object(AttWorkflowDriverServiceInstance, "save", autospec=True) as mock_save:
+            att_si_mock.return_value = []
+            service_mock.return_value = [self.att]
+
+            self.event_step.process_event(self.event)
+            self.event_step.process_event(self.event)
+
+            # the SI is created once, the following events of the ONU are dropped
+            self.assertEqual(mock_save.call_count, 1)
+
+    def test_repeated_event(self):
+        from helpers import suppressed_events
+
+        self.event_dict = {
+            'status': 'disabled',
+            'serialNumber': 'BRCM1234',
+            'deviceId': 'of:109299321',
+            'portNumber': '16',
+        }
+
+        si = AttWorkflowDriverServiceInstance(
+            serial_number=self.event_dict["serialNumber"],
+            of_dpid="foo",
+            uni_port_id="foo",
+            admin_onu_state="ENABLED",
+            oper_onu_status="DISABLED",
+        )
+        si.is_new = False
+        suppressed = suppressed_events.value
+
+        self.event.value = json.dumps(self.event_dict)
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as att_si_mock, \
+                patch.object(AttWorkflowDriverServiceInstance, "save_changed_fields", autospec=True) as mock_save:
+            att_si_mock.return_value = [si]
+
+            self.event_step.process_event(self.event)
+
+            # the event doesn't change the SI, so the model_policy doesn't need to run
+            mock_save.assert_not_called()
+            self.assertEqual(suppressed_events.value, suppressed + 1)
+
+    def test_batch(self):
+        self.event_step.__class__.batch_size = 2
+        self.event_step.__class__.batch_timeout_ms = 10000
+
+        si = AttWorkflowDriverServiceInstance(
+            serial_number=self.event_dict["serialNumber"],
+            of_dpid="foo",
+            uni_port_id="foo",
+            admin_onu_state="DISABLED",
+            oper_onu_status="DISABLED",
+        )
+
+        other_event = Mock()
+        other_event.value = json.dumps({
+            'status': 'activated',
+            'serialNumber': 'BRCM5678',
+            'deviceId': 'of:109299321',
+            'portNumber': '17',
+        })
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as att_si_mock, \
+                patch.object(AttWorkflowDriverService.objects, "get_items") as service_mock, \
+                patch.object(AttWorkflowDriverServiceInstance, "save", autospec=True) as mock_save:
+            att_si_mock.return_value = [si]
+            service_mock.return_value = [self.att]
+
+            self.event_step.process_event(self.event)
+            self.assertEqual(mock_save.call_count, 0)
+
+            self.event_step.process_event(other_event)
+            self.assertEqual(mock_save.call_count, 2)
+
+            saved = [c[0][0] for c in mock_save.call_args_list]
+            self.assertEqual(saved[0], si)
+            self.assertEqual(si.oper_onu_status, 'ENABLED')
+            self.assertEqual(saved[1].serial_number, 'BRCM5678')
+            self.assertEqual(saved[1].uni_port_id, 17)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,156 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import zlib
+from Queue import Queue
+
+from caches import normalize_serial
+from event_batch import EventCoalescer
+from event_dispatcher import EventDispatcher
+import metrics
+import settings
+
+queued_events = metrics.gauge(
+    "att_workflow_driver_queued_events",
+    "Events waiting in the queues of the EventWorkerPool")
+
+
+class EventWorkerPool(object):
+    """
+    Processes the events of the event steps on a pool of worker threads.
+
+    Events are assigned to a worker by hashing their serial number, so the events of an ONU are always processed
+    by the same worker, in the order they have been received, regardless of the topic they come from
+    (onu.events, authentication.events, dhcp.events), while the events of unrelated ONUs are processed in parallel.
+    This also guarantees that only one thread at a time can create the AttWorkflowDriverServiceInstance of an ONU.
+
+    Each worker has a queue of up to queue_size events, when a queue is full the Kafka consumer blocks
+    until the worker catches up.
+    NOTE as for the EventBatcher, the Kafka offset of an event is committed when it's queued,
+    events that are still in a queue are lost if the synchronizer is restarted.
+    The pool can't be used together with the EventCoalescer, see check_options.
+    """
+
+    # set workers (ATT_WORKFLOW_DRIVER_EVENT_WORKERS) to process the events concurrently,
+    # queue_size is ATT_WORKFLOW_DRIVER_EVENT_QUEUE_SIZE
+    workers = settings.EVENT_WORKERS
+    queue_size = settings.EVENT_QUEUE_SIZE
+
+    lock = threading.Lock()
+    instance = None
+
+    @classmethod
+    def enabled(cls):
+        return cls.workers > 0
+
+    @classmethod
+    def for_step(cls, step):
+        with cls.lock:
+            if cls.instance is None:
+                cls.instance = cls(step.log)
+        return cls.instance
+
+    def __init__(self, log):
+        self.log = log
+        self.queues = []
+        self.threads = []
+        for i in range(self.workers):
+            queue = Queue(maxsize=self.queue_size)
+            thread = threading.Thread(target=self.run, args=(queue,), name="event-worker-%d" % i)
+            thread.daemon = True
+            thread.start()
+            self.queues.append(queue)
+            self.threads.append(thread)
+        queued_events.track(lambda: sum(queue.qsize() for queue in self.queues))
+
+    def shard(self, serial_number):
+        return (zlib.crc32(normalize_serial(serial_number) or "") & 0xffffffff) % len(self.queues)
+
+    def add(self, step, value):
+        """
+        Queues value to be processed by step.process_value
+        """
+        self.queues[self.shard(value.get("serialNumber"))].put((step, value))
+
+    def stats(self):
+        return {
+            "workers": len(self.queues),
+            "queued": [queue.qsize() for queue in self.queues],
+        }
+
+    def join(self):
+        """
+        Waits for all the queued events to be processed
+        """
+        for queue in self.queues:
+            queue.join()
+
+    def stop(self):
+        for queue in self.queues:
+            queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def run(self, queue):
+        while True:
+            item = queue.get()
+            try:
+                if item is None:
+                    return
+                (step, value) = item
+                step.process_value(value)
+            except BaseException:
+                self.log.exception("Exception while processing event", value=item[1])
+            finally:
+                queue.task_done()
+
+
+# the pairs of options that can't be set together, and why
+INCOMPATIBLE_OPTIONS = [
+    ("EventWorkerPool.workers", "batch_size",
+     "the batches are processed by the event steps, the pool would be ignored"),
+    ("EventWorkerPool.workers", "EventCoalescer.window_ms",
+     "the events held by the coalescer would be applied after the onu.events that followed them"),
+    ("EventDispatcher.window_ms", "batch_size",
+     "the batches of each event step would be processed out of the order of the dispatcher"),
+    ("EventDispatcher.window_ms", "EventCoalescer.window_ms",
+     "the dispatched events would be held again by the coalescer, out of the order of the dispatcher"),
+]
+
+
+def check_options(batch_size=None):
+    """
+    Rejects the combinations of event processing options that don't keep the events of an ONU in order,
+    or that would be silently ignored, called when the synchronizer starts.
+
+    :param batch_size: the batch_size of the event steps, ATT_WORKFLOW_DRIVER_EVENT_BATCH_SIZE by default
+    """
+    if batch_size is None:
+        batch_size = settings.EVENT_BATCH_SIZE
+    enabled = set()
+    if batch_size > 0:
+        enabled.add("batch_size")
+    if EventWorkerPool.enabled():
+        enabled.add("EventWorkerPool.workers")
+    if EventCoalescer.enabled():
+        enabled.add("EventCoalescer.window_ms")
+    if EventDispatcher.enabled():
+        enabled.add("EventDispatcher.window_ms")
+
+    errors = ["%s and %s can't be set together, %s" % (first, second, reason)
+              for (first, second, reason) in INCOMPATIBLE_OPTIONS if first in enabled and second in enabled]
+    if errors:
+        raise ValueError("; ".join(errors))
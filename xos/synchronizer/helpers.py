@@ -13,8 +13,37 @@
 # limitations under the License.
 
 from xossynchronizer.steps.syncstep import DeferredException
+from caches import whitelist_index, onu_device_cache, owner_service_cache, normalize_serial
+import metrics
+
+suppressed_events = metrics.counter(
+    "att_workflow_driver_suppressed_events",
+    "Events that didn't change the AttWorkflowDriverServiceInstance and have not been saved")
+
+deferred_exceptions = metrics.counter(
+    "att_workflow_driver_deferred_exceptions",
+    "Lookups of ONUDevices that are not known to XOS yet, that have raised a DeferredException")
+
+# status_message of the SIs whose ONU failed the whitelist validation
+NOT_WHITELISTED_MESSAGE = "ONU not found in whitelist"
+WRONG_LOCATION_MESSAGE = "ONU activated in wrong location"
+MANUALLY_DISABLED_MESSAGE = "ONU has been manually disabled"
+VALIDATED_MESSAGE = "ONU has been validated"
+
+# status_message -> counter of the whitelist validations with that outcome
+validation_outcomes = dict(
+    (message, metrics.counter("att_workflow_driver_onus_%s" % outcome,
+                              "Whitelist validations with outcome: %s" % message))
+    for (outcome, message) in [("not_whitelisted", NOT_WHITELISTED_MESSAGE),
+                               ("wrong_location", WRONG_LOCATION_MESSAGE),
+                               ("manually_disabled", MANUALLY_DISABLED_MESSAGE),
+                               ("validated", VALIDATED_MESSAGE)])
+
 
 class AttHelpers():
+    # authentication states that make the model_policy reset the DHCP state and the subscriber
+    AUTH_RESET_STATES = ["AWAITING", "REQUESTED", "STARTED"]
+
     @staticmethod
     def validate_onu(model_accessor, log, att_si):
         """
@@ -26,29 +55,20 @@ class AttHelpers():
         :return: [boolean, string]
         """
 
-        oss_service = att_si.owner.leaf_model
-
         # See if there is a matching entry in the whitelist.
-        matching_entries = model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter(
-            owner_id=oss_service.id,
-        )
-        matching_entries = [e for e in matching_entries if e.serial_number.lower() == att_si.serial_number.lower()]
+        whitelisted = whitelist_index.get(model_accessor, att_si.owner_id, att_si.serial_number)
 
-        if len(matching_entries) == 0:
+        if whitelisted is None:
             log.warn("ONU not found in whitelist", object=str(att_si), serial_number=att_si.serial_number, **att_si.tologdict())
-            return [False, "ONU not found in whitelist"]
-
-        whitelisted = matching_entries[0]
-        try:
-            onu = model_accessor.ONUDevice.objects.get(serial_number=att_si.serial_number)
-            pon_port = onu.pon_port
-        except IndexError:
-            raise DeferredException("ONU device %s is not know to XOS yet" % att_si.serial_number)
+            validation_outcomes[NOT_WHITELISTED_MESSAGE].inc()
+            return [False, NOT_WHITELISTED_MESSAGE]
 
-        if onu.admin_state == "ADMIN_DISABLED":
-            return [False, "ONU has been manually disabled"]
+        onu = AttHelpers.get_onu_device(model_accessor, att_si.serial_number)
+        pon_port = onu.pon_port
 
-        if pon_port.port_no != whitelisted.pon_port_id or att_si.of_dpid != whitelisted.device_id:
+        [valid, message] = AttHelpers.check_onu(att_si, whitelisted, onu, pon_port)
+        validation_outcomes[message].inc()
+        if message == WRONG_LOCATION_MESSAGE:
             log.warn("ONU disable as location don't match",
                      object=str(att_si),
                      serial_number=att_si.serial_number,
@@ -57,26 +77,202 @@ class AttHelpers():
                      device_id=att_si.of_dpid,
                      whitelisted_device_id=whitelisted.device_id,
                      **att_si.tologdict())
-            return [False, "ONU activated in wrong location"]
+        return [valid, message]
+
+    @staticmethod
+    def check_onu(att_si, whitelisted, onu, pon_port):
+        """
+        The part of validate_onu that has no side effects, once the whitelist entry and the ONUDevice are known.
+
+        :param whitelisted: AttWorkflowDriverWhiteListEntry of the ONU, or None
+        :param onu: ONUDevice of the ONU
+        :param pon_port: PONPort of the ONUDevice
+        :return: [boolean, string]
+        """
+        if whitelisted is None:
+            return [False, NOT_WHITELISTED_MESSAGE]
+
+        if onu.admin_state == "ADMIN_DISABLED":
+            return [False, MANUALLY_DISABLED_MESSAGE]
+
+        if pon_port.port_no != whitelisted.pon_port_id or att_si.of_dpid != whitelisted.device_id:
+            return [False, WRONG_LOCATION_MESSAGE]
+
+        return [True, VALIDATED_MESSAGE]
+
+    @staticmethod
+    def revalidate_onu(model_accessor, log, att_si):
+        """
+        Validates the ONU of an AttWorkflowDriverServiceInstance again after a change in the whitelist.
+        The SI is saved, and so its model_policy runs, only if the result of the validation has changed.
 
-        return [True, "ONU has been validated"]
+        :param att_si: AttWorkflowDriverServiceInstance
+        :return: True if the SI has been saved
+        """
+        [valid, message] = AttHelpers.validate_onu(model_accessor, log, att_si)
+        admin_onu_state = "ENABLED" if valid else "DISABLED"
+
+        # NOTE the model_policy appends the authentication state to the validation message
+        if att_si.admin_onu_state == admin_onu_state and (att_si.status_message or "").startswith(message):
+            return False
+
+        att_si.admin_onu_state = admin_onu_state
+        att_si.status_message = message
+        att_si.save_changed_fields(always_update_timestamp=True)
+        return True
+
+    @staticmethod
+    def get_onu_device(model_accessor, serial_number):
+        """
+        Case insensitive lookup of an ONUDevice, shared by the whitelist validation and the model_policies.
+
+        :param serial_number: ONU serial number
+        :return: ONUDevice
+        """
+        onu = onu_device_cache.get(model_accessor, serial_number)
+        if onu is None:
+            deferred_exceptions.inc()
+            raise DeferredException("ONU device %s is not know to XOS yet" % serial_number)
+        return onu
+
+    @staticmethod
+    def get_att_si(model_accessor, serial_number):
+        """
+        Case insensitive lookup of an AttWorkflowDriverServiceInstance, done by the database.
+
+        :param serial_number: ONU serial number
+        :return: AttWorkflowDriverServiceInstance
+        :raises IndexError: if the AttWorkflowDriverServiceInstance does not exist
+        """
+        sis = model_accessor.AttWorkflowDriverServiceInstance.objects.filter(
+            normalized_serial_number=normalize_serial(serial_number)
+        )
+        if sis:
+            return sis[0]
+        # SIs that have not been through the model_policy yet may still miss the normalized serial number
+        return model_accessor.AttWorkflowDriverServiceInstance.objects.get(serial_number=serial_number)
 
     @staticmethod
     def find_or_create_att_si(model_accessor, log, event):
         try:
-            att_si = model_accessor.AttWorkflowDriverServiceInstance.objects.get(
-                serial_number=event["serialNumber"]
-            )
+            att_si = AttHelpers.get_att_si(model_accessor, event["serialNumber"])
             log.debug("AttHelpers: Found existing AttWorkflowDriverServiceInstance", si=att_si)
         except IndexError:
             # create an AttWorkflowDriverServiceInstance, the validation will be
             # triggered in the corresponding sync step
             att_si = model_accessor.AttWorkflowDriverServiceInstance(
                 serial_number=event["serialNumber"],
+                normalized_serial_number=normalize_serial(event["serialNumber"]),
                 of_dpid=event["deviceId"],
                 uni_port_id=long(event["portNumber"]),
                 # we assume there is only one AttWorkflowDriverService
-                owner=model_accessor.AttWorkflowDriverService.objects.first()
+                owner=owner_service_cache.first(model_accessor)
             )
             log.debug("AttHelpers: Created new AttWorkflowDriverServiceInstance", si=att_si)
         return att_si
+
+    @staticmethod
+    def update_att_si(att_si, changes):
+        """
+        Applies the changes caused by an event to an AttWorkflowDriverServiceInstance.
+
+        :param changes: dict of {field_name: value}
+        :return: True if any field has changed
+        """
+        changed = False
+        for (f, v) in changes.items():
+            if getattr(att_si, f) != v:
+                setattr(att_si, f, v)
+                changed = True
+        if not changed and not att_si.is_new:
+            suppressed_events.inc()
+        return changed
+
+    @staticmethod
+    def save_att_si(log, att_si, changed):
+        """
+        Saves an AttWorkflowDriverServiceInstance updated by events, which triggers the model_policy.
+        If the events did not change anything (eg: a repeated event) the save, and the model_policy, are skipped.
+
+        :param changed: whether the events changed the SI
+        :return: True if the SI has been saved
+        """
+        if changed or att_si.is_new:
+            att_si.save_changed_fields(always_update_timestamp=True)
+            return True
+        log.debug("AttHelpers: AttWorkflowDriverServiceInstance has not changed, not saving", si=att_si)
+        return False
+
+    @staticmethod
+    def process_event_batch(model_accessor, log, events, get_si_changes):
+        """
+        Applies a batch of events to the AttWorkflowDriverServiceInstances.
+        Each SI is looked up once for the whole batch and the saves are issued together at the end.
+        If an event overrides a change that has not been saved yet the SI is saved first,
+        so that the model_policy still sees every transition.
+
+        :param events: list of decoded events, in the order they have been received
+        :param get_si_changes: function returning the changes caused by an event (or None)
+        """
+        sis = {}
+        order = []
+        for event in events:
+            changes = get_si_changes(event)
+            if not changes:
+                continue
+
+            serial_number = normalize_serial(event["serialNumber"])
+            if serial_number not in sis:
+                sis[serial_number] = [AttHelpers.find_or_create_att_si(model_accessor, log, event), {}, False]
+                order.append(serial_number)
+            (att_si, pending, changed) = sis[serial_number]
+
+            if any(f in pending and pending[f] != v for (f, v) in changes.items()):
+                AttHelpers.save_att_si(log, att_si, changed)
+                pending = sis[serial_number][1] = {}
+                changed = False
+
+            sis[serial_number][2] = AttHelpers.update_att_si(att_si, changes) or changed
+            pending.update(changes)
+
+        for serial_number in order:
+            (att_si, pending, changed) = sis[serial_number]
+            AttHelpers.save_att_si(log, att_si, changed)
+
+    @staticmethod
+    def process_coalesced_events(model_accessor, log, events):
+        """
+        Applies the events received for one ONU as a single net transition.
+
+        Consecutive events are merged, except when the SI leaves a state in which the model_policy has side effects
+        that the following events would hide: if an APPROVED (or DENIED) subscriber goes through re-authentication
+        the intermediate state is saved, so that the DHCP state and the subscriber IP are reset as they would be
+        if the events were processed one by one.
+
+        :param events: list of (event, changes) for the same serial number, in the order they have been received
+        :return: the number of saves
+        """
+        att_si = AttHelpers.find_or_create_att_si(model_accessor, log, events[0][0])
+
+        saves = 0
+        changed = False
+        base_auth = att_si.authentication_state
+        pending = {}
+        for (event, changes) in events:
+            auth = changes.get("authentication_state")
+            if auth is not None and auth not in AttHelpers.AUTH_RESET_STATES \
+                    and pending.get("authentication_state") in AttHelpers.AUTH_RESET_STATES \
+                    and base_auth not in AttHelpers.AUTH_RESET_STATES:
+                if AttHelpers.save_att_si(log, att_si, changed):
+                    saves += 1
+                changed = False
+                base_auth = pending["authentication_state"]
+                pending = {}
+
+            changed = AttHelpers.update_att_si(att_si, changes) or changed
+            pending.update(changes)
+
+        if AttHelpers.save_att_si(log, att_si, changed):
+            saves += 1
+        log.debug("AttHelpers: applied coalesced events", si=att_si, events=len(events), saves=saves)
+        return saves
@@ -0,0 +1,107 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Request-scoped identity map around the model_accessor.
+
+
+class IdentityMap(object):
+    """
+    Wraps a model_accessor so that, for as long as it is used, each model instance is loaded from the core once.
+
+    Instances are kept by (model, id): once an object has been loaded, by get() or as part of a query,
+    get(id=...) returns the same instance and queries return it instead of a new copy, so changes made by one part
+    of the policy are seen by the others. Queries are cached by their arguments.
+    An IdentityMap lives for one model_policy run, objects can be changed by other synchronizers at any time.
+    """
+
+    def __init__(self, model_accessor):
+        self.model_accessor = model_accessor
+        # (model_name, id) -> instance
+        self.instances = {}
+        # (model_name, method, args) -> result
+        self.queries = {}
+        self.models = {}
+        # model_name -> number of reads that went to the core
+        self.reads = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self.model_accessor, name)
+        if not hasattr(attr, "objects"):
+            return attr
+        if name not in self.models:
+            self.models[name] = ModelReads(self, name, attr)
+        return self.models[name]
+
+    def stats(self):
+        return dict(self.reads)
+
+    def register(self, model_name, instance):
+        """
+        :return: the instance already in the map for the same object, if any
+        """
+        if instance is None or getattr(instance, "id", None) is None:
+            return instance
+        return self.instances.setdefault((model_name, instance.id), instance)
+
+    def read(self, model_name, method, kwargs, fetch):
+        key = (model_name, method, tuple(sorted(kwargs.items())))
+        if key in self.queries:
+            return self.queries[key]
+
+        if method == "get" and kwargs.keys() == ["id"] and (model_name, kwargs["id"]) in self.instances:
+            return self.instances[(model_name, kwargs["id"])]
+
+        self.reads[model_name] = self.reads.get(model_name, 0) + 1
+        result = fetch()
+        if isinstance(result, list):
+            result = [self.register(model_name, instance) for instance in result]
+        else:
+            result = self.register(model_name, result)
+        self.queries[key] = result
+        return result
+
+
+class ModelReads(object):
+    def __init__(self, identity_map, model_name, model_class):
+        self.model_class = model_class
+        self.objects = ManagerReads(identity_map, model_name, model_class.objects)
+
+    def __call__(self, *args, **kwargs):
+        return self.model_class(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model_class, name)
+
+
+class ManagerReads(object):
+    def __init__(self, identity_map, model_name, manager):
+        self.identity_map = identity_map
+        self.model_name = model_name
+        self.manager = manager
+
+    def get(self, **kwargs):
+        return self.identity_map.read(self.model_name, "get", kwargs, lambda: self.manager.get(**kwargs))
+
+    def filter(self, **kwargs):
+        return self.identity_map.read(self.model_name, "filter", kwargs, lambda: list(self.manager.filter(**kwargs)))
+
+    def all(self):
+        return self.identity_map.read(self.model_name, "all", {}, lambda: list(self.manager.all()))
+
+    def first(self):
+        return self.identity_map.read(self.model_name, "first", {}, lambda: self.manager.first())
+
+    def __getattr__(self, name):
+        return getattr(self.manager, name)
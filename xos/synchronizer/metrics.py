@@ -0,0 +1,252 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Metrics describing what the synchronizer is doing, shared by the event_steps and the model_policies.
+# They are served in the Prometheus text format by the MetricsExporter.
+
+import bisect
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+
+class Counter(object):
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+
+class Gauge(object):
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        with self.lock:
+            self.value = value
+
+    def track(self, function):
+        """
+        Reads the value from function when the metrics are collected, rather than keeping it current
+        """
+        with self.lock:
+            self.function = function
+
+    def get(self):
+        with self.lock:
+            function = self.function
+            value = self.value
+        return function() if function is not None else value
+
+    def reset(self):
+        self.set(0)
+
+
+class Timer(object):
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # NOTE the time is observed even if an exception has been raised
+        self.histogram.observe(time.time() - self.start)
+
+
+class Histogram(object):
+    # seconds
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, description, buckets=None):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self.lock = threading.Lock()
+        self.reset()
+
+    def observe(self, value):
+        # the last count is for the values past the last bucket
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """
+        :return: a context manager observing the time spent in its block
+        """
+        return Timer(self)
+
+    def get(self):
+        """
+        :return: ([(bucket, cumulative count)], sum, count)
+        """
+        with self.lock:
+            counts = list(self.counts)
+            (total, count) = (self.sum, self.count)
+        cumulative = []
+        observed = 0
+        for (bucket, c) in zip(self.buckets + (float("inf"),), counts):
+            observed += c
+            cumulative.append((bucket, observed))
+        return (cumulative, total, count)
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+
+registry = {}
+registry_lock = threading.Lock()
+
+
+def counter(name, description):
+    with registry_lock:
+        if name not in registry:
+            registry[name] = Counter(name, description)
+        return registry[name]
+
+
+def gauge(name, description):
+    with registry_lock:
+        if name not in registry:
+            registry[name] = Gauge(name, description)
+        return registry[name]
+
+
+def histogram(name, description, buckets=None):
+    with registry_lock:
+        if name not in registry:
+            registry[name] = Histogram(name, description, buckets)
+        return registry[name]
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    :return: the metrics in the Prometheus text format
+    """
+    with registry_lock:
+        metrics = sorted(registry.values(), key=lambda m: m.name)
+
+    lines = []
+    for metric in metrics:
+        lines.append("# HELP %s %s" % (metric.name, metric.description))
+        if isinstance(metric, Histogram):
+            lines.append("# TYPE %s histogram" % metric.name)
+            (buckets, total, count) = metric.get()
+            for (bucket, observed) in buckets:
+                lines.append('%s_bucket{le="%s"} %d' % (metric.name, format_value(bucket), observed))
+            lines.append("%s_sum %s" % (metric.name, format_value(total)))
+            lines.append("%s_count %d" % (metric.name, count))
+        elif isinstance(metric, Gauge):
+            lines.append("# TYPE %s gauge" % metric.name)
+            lines.append("%s %s" % (metric.name, format_value(metric.get())))
+        else:
+            lines.append("# TYPE %s counter" % metric.name)
+            lines.append("%s %s" % (metric.name, format_value(metric.value)))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ["/", "/metrics"]:
+            self.send_error(404)
+            return
+        body = render()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes are not logged
+        pass
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsExporter(object):
+    """
+    Serves the metrics at http://<address>:<port>/metrics, from a thread that is started with the synchronizer
+    (see warmup.start_tasks).
+    """
+
+    # set port to 0 to disable the exporter
+    port = 8000
+    address = ""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self, log):
+        with self.lock:
+            if self.server is not None or not self.port:
+                return
+            try:
+                self.server = MetricsServer((self.address, self.port), MetricsHandler)
+            except Exception:
+                log.exception("MetricsExporter: can't serve the metrics", address=self.address, port=self.port)
+                return
+            thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter")
+            thread.daemon = True
+        thread.start()
+        log.info("MetricsExporter: serving the metrics", address=self.address, port=self.port)
+
+    def stop(self):
+        with self.lock:
+            server = self.server
+            self.server = None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+exporter = MetricsExporter()
+
+
+def reset_metrics():
+    with registry_lock:
+        for metric in registry.values():
+            metric.reset()
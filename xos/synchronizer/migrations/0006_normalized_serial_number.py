@@ -0,0 +1,46 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def populate_normalized_serial_number(apps, schema_editor):
+    for model_name in ["AttWorkflowDriverServiceInstance", "AttWorkflowDriverWhiteListEntry"]:
+        model = apps.get_model("att-workflow-driver", model_name)
+        model.objects.update(normalized_serial_number=Lower("serial_number"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('att-workflow-driver', '0005_auto_20190425_2002'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attworkflowdriverserviceinstance',
+            name='normalized_serial_number',
+            field=models.CharField(blank=True, db_index=True, help_text=b'Lowercase serial number of ONU, used for case insensitive lookups', max_length=256, null=True),
+        ),
+        migrations.AddField(
+            model_name='attworkflowdriverwhitelistentry',
+            name='normalized_serial_number',
+            field=models.CharField(blank=True, db_index=True, help_text=b'Lowercase ONU Serial Number, used for case insensitive lookups', max_length=256, null=True),
+        ),
+        migrations.RunPython(populate_normalized_serial_number, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Copyright 2017-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_validated(apps, schema_editor):
+    # the history of the existing service instances is not known,
+    # they are considered validated so that the ONUAdmission never removes them
+    model = apps.get_model("att-workflow-driver", "AttWorkflowDriverServiceInstance")
+    model.objects.update(validated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('att-workflow-driver', '0006_normalized_serial_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attworkflowdriverserviceinstance',
+            name='validated',
+            field=models.BooleanField(default=False, help_text=b'Whether the ONU has ever been validated against the whitelist'),
+        ),
+        migrations.RunPython(populate_validated, migrations.RunPython.noop),
+    ]
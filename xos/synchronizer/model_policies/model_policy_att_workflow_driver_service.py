@@ -0,0 +1,49 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+from caches import owner_service_cache, whitelist_index
+from xossynchronizer.model_policies.policy import Policy
+import os
+import sys
+
+sync_path = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+sys.path.append(sync_path)
+
+
+class AttWorkflowDriverServicePolicy(Policy):
+    model_name = "AttWorkflowDriverService"
+
+    # The service is cached by the helpers on the ONU onboarding path,
+    # we only need to drop it so that the next lookup reads the new version.
+
+    def handle_create(self, service):
+        self.handle_update(service)
+
+    def handle_update(self, service):
+        self.logger.debug("MODEL_POLICY: handle_update for AttWorkflowDriverService", service=service)
+        owner_service_cache.invalidate(service.id)
+
+        # NOTE the delete policy only runs for the objects that ask for it
+        service.backend_need_delete_policy = True
+        service.save_changed_fields()
+
+    def handle_delete(self, service):
+        self.logger.debug("MODEL_POLICY: handle_delete for AttWorkflowDriverService", service=service)
+        owner_service_cache.invalidate(service.id)
+        whitelist_index.remove_owner(service.id)
+
+        service.backend_need_reap = True
+        service.save_changed_fields()
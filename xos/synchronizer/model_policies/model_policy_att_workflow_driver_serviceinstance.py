@@ -15,7 +15,14 @@
 
 
 from helpers import AttHelpers
+from caches import subscriber_index, service_instance_index, subscriber_ip_cache, policy_state_cache, normalize_serial
+from onu_waitlist import onu_waitlist, WAITING_MESSAGE
+import workflow
+import metrics
+from unit_of_work import UnitOfWork
+from identity_map import IdentityMap
 from xossynchronizer.model_policies.policy import Policy
+from xossynchronizer.steps.syncstep import DeferredException
 
 import os
 import sys
@@ -23,14 +30,40 @@ import sys
 sync_path = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
 sys.path.append(sync_path)
 
+# The SI fields read by each stage of the policy, a stage is skipped if none of them has changed since the last run
+STAGE_INPUTS = {
+    # whitelist validation and ONUDevice admin_state (status_message and admin_onu_state are also written by
+    # AttWorkflowDriverWhiteListEntryPolicy when the whitelist changes)
+    "onu": ["serial_number", "of_dpid", "uni_port_id", "owner_id", "oper_onu_status", "admin_onu_state",
+            "status_message"],
+    # authentication and DHCP state machine
+    "workflow": ["admin_onu_state", "oper_onu_status", "authentication_state", "dhcp_state"],
+    # RCORDSubscriber lookup, status and IP address
+    "subscriber": ["serial_number", "authentication_state", "dhcp_state", "ip_address", "mac_address"],
+}
 
-class DeferredException(Exception):
-    pass
+skipped_stages = dict(
+    (stage, metrics.counter("att_workflow_driver_policy_%s_skipped" % stage,
+                            "Runs of AttWorkflowDriverServiceInstancePolicy that skipped the %s stage" % stage))
+    for stage in STAGE_INPUTS)
+
+# method -> histogram of the time spent in it, for handle_update and the stages it runs
+stage_seconds = dict(
+    (method, metrics.histogram("att_workflow_driver_policy_%s_seconds" % method,
+                               "Time spent in AttWorkflowDriverServiceInstancePolicy.%s" % method))
+    for method in ["handle_update", "process_onu_state", "process_workflow", "get_subscriber", "update_subscriber"])
 
 
 class AttWorkflowDriverServiceInstancePolicy(Policy):
     model_name = "AttWorkflowDriverServiceInstance"
 
+    def __init__(self, *args, **kwargs):
+        super(AttWorkflowDriverServiceInstancePolicy, self).__init__(*args, **kwargs)
+        # NOTE all the objects written by handle_update are saved together at the end of the run
+        self.writes = UnitOfWork(self.logger)
+        # and the objects it reads are loaded once, see handle_update
+        self.reads = self.model_accessor
+
     def handle_create(self, si):
         self.logger.debug("MODEL_POLICY: handle_create for AttWorkflowDriverServiceInstance %s " % si.id)
         self.handle_update(si)
@@ -39,94 +72,121 @@ class AttWorkflowDriverServiceInstancePolicy(Policy):
         self.logger.debug("MODEL_POLICY: handle_update for AttWorkflowDriverServiceInstance %s " %
                           (si.id), onu_state=si.admin_onu_state, authentication_state=si.authentication_state)
 
+        self.reads = IdentityMap(self.model_accessor)
+        try:
+            with stage_seconds["handle_update"].time(), self.writes.begin():
+                self.process_si(si)
+        finally:
+            self.logger.debug("MODEL_POLICY: reads for AttWorkflowDriverServiceInstance %s" % si.id,
+                              reads=self.reads.stats())
+            self.reads = self.model_accessor
+
+    def process_si(self, si):
+        si.normalized_serial_number = normalize_serial(si.serial_number)
+        service_instance_index.update(si)
+        # NOTE the delete policy only runs for the objects that ask for it
+        si.backend_need_delete_policy = True
+
+        # NOTE the stages only run if the fields they read have changed since the last run,
+        # for example a DHCP event doesn't need the whitelist validation
+        previous = policy_state_cache.get(si.id)
+
         # Changing ONU state can change auth state
         # Changing auth state can change DHCP state
         # So need to process in this order
-        self.process_onu_state(si)
-        self.process_auth_state(si)
-        self.process_dhcp_state(si)
+        if self.has_changed(si, previous, "onu"):
+            try:
+                with stage_seconds["process_onu_state"].time():
+                    self.process_onu_state(si)
+            except DeferredException as e:
+                # NOTE rather than failing, and being retried on every run of the policy loop,
+                # the SI waits for the ONUDevice and is re-evaluated once it appears
+                self.logger.info("MODEL_POLICY: parking AttWorkflowDriverServiceInstance %s" % si.id, reason=str(e))
+                si.status_message = WAITING_MESSAGE
+                onu_waitlist.park(self.model_accessor, self.logger, si)
+                self.writes.save_changed_fields(si)
+                policy_state_cache.remove(si.id)
+                return
+            onu_waitlist.discard(si)
+            onu_message = si.status_message
+            # the status_message is rebuilt by the workflow
+            previous = None
+        else:
+            onu_message = previous["onu_message"]
 
-        self.validate_states(si)
+        if self.has_changed(si, previous, "workflow"):
+            si.status_message = onu_message
+            with stage_seconds["process_workflow"].time():
+                self.process_workflow(si)
 
         # handling the subscriber status
         # It's a combination of all the other states
-        subscriber = self.get_subscriber(si.serial_number)
-        if subscriber:
-            self.update_subscriber(subscriber, si)
+        # NOTE subscribers can be created at any time, so we keep looking for one until it's found
+        if previous is None or not previous["subscriber"] or self.has_changed(si, previous, "subscriber"):
+            with stage_seconds["get_subscriber"].time():
+                subscriber = self.get_subscriber(si.serial_number)
+            if subscriber:
+                with stage_seconds["update_subscriber"].time():
+                    self.update_subscriber(subscriber, si)
+            has_subscriber = subscriber is not None
+        else:
+            has_subscriber = True
 
-        si.save_changed_fields()
+        # NOTE the SI is saved last, if any other write fails the policy will run again
+        self.writes.save_changed_fields(si)
+
+        state = dict((f, getattr(si, f)) for fields in STAGE_INPUTS.values() for f in fields)
+        state["onu_message"] = onu_message
+        state["subscriber"] = has_subscriber
+        self.writes.after_commit(lambda: policy_state_cache.set(si.id, state))
+
+    def has_changed(self, si, previous, stage):
+        """
+        :return: True if the inputs of stage have changed since the last run of the policy (or if it never ran)
+        """
+        if previous is None:
+            return True
+        changed = [f for f in STAGE_INPUTS[stage] if getattr(si, f) != previous[f]]
+        if not changed:
+            skipped_stages[stage].inc()
+            self.logger.debug("MODEL_POLICY: skipping %s stage, nothing has changed" % stage, si=si)
+        return bool(changed)
 
     # Check the whitelist to see if the ONU is valid.  If it is, make sure that it's enabled.
     def process_onu_state(self, si):
-        [valid, message] = AttHelpers.validate_onu(self.model_accessor, self.logger, si)
+        [valid, message] = AttHelpers.validate_onu(self.reads, self.logger, si)
         si.status_message = message
         if valid:
             si.admin_onu_state = "ENABLED"
+            # the SI is kept by the ONUAdmission if the ONU is removed from the whitelist later on
+            si.validated = True
             self.update_onu(si.serial_number, "ENABLED")
         else:
             si.admin_onu_state = "DISABLED"
             self.update_onu(si.serial_number, "DISABLED")
 
-    # If the ONU has been disabled then we force re-authentication when it
-    # is re-enabled.
-    # Setting si.authentication_state = AWAITING:
-    #   -> subscriber status = "awaiting_auth"
-    #   -> service chain deleted
-    #   -> need authentication to restore connectivity after ONU enabled
-    def process_auth_state(self, si):
-        auth_msgs = {
-            "AWAITING": " - Awaiting Authentication",
-            "REQUESTED": " - Authentication requested",
-            "STARTED": " - Authentication started",
-            "APPROVED": " - Authentication succeeded",
-            "DENIED": " - Authentication denied"
-        }
-        if si.admin_onu_state == "DISABLED" or si.oper_onu_status == "DISABLED":
-            si.authentication_state = "AWAITING"
-        else:
-            si.status_message += auth_msgs[si.authentication_state]
-
-    # The DhcpL2Relay ONOS app generates events that update the fields below.
-    # It only sends events when it processes DHCP packets.  It keeps no internal state.
-    # We reset dhcp_state when:
-    # si.authentication_state in ["AWAITING", "REQUESTED", "STARTED"]
-    #   -> subscriber status = "awaiting_auth"
-    #   -> service chain not present
-    #   -> subscriber's OLT flow rules, xconnect not present
-    #   -> DHCP packets won't go through
-    # Note, however, that the DHCP state at the endpoints is not changed.
-    # A previously issued DHCP lease may still be valid.
-    def process_dhcp_state(self, si):
-        if si.authentication_state in ["AWAITING", "REQUESTED", "STARTED"]:
+    # Apply the authentication and DHCP part of the workflow, as described in workflow.py
+    def process_workflow(self, si):
+        transition = workflow.evaluate(si)
+
+        si.authentication_state = transition.authentication_state
+        si.status_message += transition.status_message
+        if transition.reset_dhcp:
             si.ip_address = ""
             si.mac_address = ""
             si.dhcp_state = "AWAITING"
 
-    # Make sure the object is in a legitimate state
-    # It should be after the above processing steps
-    # However this might still fail if an event has fired in the meantime
-    # Valid states:
-    # ONU       | Auth     | DHCP
-    # ===============================
-    # AWAITING  | AWAITING | AWAITING
-    # ENABLED   | *        | AWAITING
-    # ENABLED   | APPROVED | *
-    # DISABLED  | AWAITING | AWAITING
-    def validate_states(self, si):
-        if (si.admin_onu_state == "AWAITING" or si.admin_onu_state ==
-                "DISABLED") and si.authentication_state == "AWAITING" and si.dhcp_state == "AWAITING":
-            return
-        if si.admin_onu_state == "ENABLED" and (si.authentication_state == "APPROVED" or si.dhcp_state == "AWAITING"):
-            return
-        self.logger.warning(
-            "MODEL_POLICY (validate_states): invalid state combination",
-            onu_state=si.admin_onu_state,
-            auth_state=si.authentication_state,
-            dhcp_state=si.dhcp_state)
+        if not transition.valid:
+            # this might happen if an event has fired in the meantime
+            self.logger.warning(
+                "MODEL_POLICY (validate_states): invalid state combination",
+                onu_state=si.admin_onu_state,
+                auth_state=si.authentication_state,
+                dhcp_state=si.dhcp_state)
+        return transition
 
     def update_onu(self, serial_number, admin_state):
-        onu = [onu for onu in self.model_accessor.ONUDevice.objects.all() if onu.serial_number.lower()
-               == serial_number.lower()][0]
+        onu = AttHelpers.get_onu_device(self.reads, serial_number)
         if onu.admin_state == "ADMIN_DISABLED":
             self.logger.debug(
                 "MODEL_POLICY: ONUDevice [%s] has been manually disabled, not changing state to %s" %
@@ -139,68 +199,63 @@ class AttWorkflowDriverServiceInstancePolicy(Policy):
         else:
             self.logger.debug("MODEL_POLICY: setting ONUDevice [%s] admin_state to %s" % (serial_number, admin_state))
             onu.admin_state = admin_state
-            onu.save_changed_fields(always_update_timestamp=True)
+            self.writes.save_changed_fields(onu, always_update_timestamp=True)
 
     def get_subscriber(self, serial_number):
-        try:
-            return [s for s in self.model_accessor.RCORDSubscriber.objects.all() if s.onu_device.lower()
-                    == serial_number.lower()][0]
-        except IndexError:
+        subscriber = subscriber_index.get(self.reads, serial_number)
+        if subscriber is None:
             # If the subscriber doesn't exist we don't do anything
             self.logger.debug(
                 "MODEL_POLICY: subscriber does not exists for this SI, doing nothing",
-                onu_device=serial_number)
-            return None
+                onu_device=serial_number, subscriber_index=subscriber_index.stats())
+        return subscriber
 
     def update_subscriber_ip(self, subscriber, ip):
-        # TODO check if the subscriber has an IP and update it,
-        # or create a new one
-        try:
-            ip = self.model_accessor.RCORDIpAddress.objects.filter(
-                subscriber_id=subscriber.id,
-                ip=ip
-            )[0]
+        existing_ip = subscriber_ip_cache.get(self.reads, subscriber.id, ip)
+        if existing_ip:
+            # NOTE nothing changes on an existing address (eg: DHCP renewal), so there's nothing to save
             self.logger.debug("MODEL_POLICY: found existing RCORDIpAddress for subscriber",
-                              onu_device=subscriber.onu_device, subscriber_status=subscriber.status, ip=ip)
-            ip.save_changed_fields()
-        except IndexError:
-            self.logger.debug(
-                "MODEL_POLICY: Creating new RCORDIpAddress for subscriber",
-                onu_device=subscriber.onu_device,
-                subscriber_status=subscriber.status,
-                ip=ip)
-            ip = self.model_accessor.RCORDIpAddress(
-                subscriber_id=subscriber.id,
-                ip=ip,
-                description="DHCP Assigned IP Address"
-            )
-            ip.save()
+                              onu_device=subscriber.onu_device, subscriber_status=subscriber.status, ip=existing_ip)
+            return
+
+        self.logger.debug(
+            "MODEL_POLICY: Creating new RCORDIpAddress for subscriber",
+            onu_device=subscriber.onu_device,
+            subscriber_status=subscriber.status,
+            ip=ip)
+        ip = self.model_accessor.RCORDIpAddress(
+            subscriber_id=subscriber.id,
+            ip=ip,
+            description="DHCP Assigned IP Address"
+        )
+        self.writes.save(ip, after=lambda: subscriber_ip_cache.add(self.model_accessor, subscriber.id, ip))
 
     def delete_subscriber_ip(self, subscriber, ip):
-        try:
-            ip = self.model_accessor.RCORDIpAddress.objects.filter(
-                subscriber_id=subscriber.id,
-                ip=ip
-            )[0]
-            self.logger.debug(
-                "MODEL_POLICY: delete RCORDIpAddress for subscriber",
-                onu_device=subscriber.onu_device,
-                subscriber_status=subscriber.status,
-                ip=ip)
-            ip.delete()
-        except BaseException:
+        existing_ip = subscriber_ip_cache.get(self.reads, subscriber.id, ip)
+        if not existing_ip:
             self.logger.warning("MODEL_POLICY: no RCORDIpAddress object found, cannot delete", ip=ip)
+            return
+
+        self.logger.debug(
+            "MODEL_POLICY: delete RCORDIpAddress for subscriber",
+            onu_device=subscriber.onu_device,
+            subscriber_status=subscriber.status,
+            ip=existing_ip)
+        self.writes.delete(
+            existing_ip,
+            after=lambda: subscriber_ip_cache.pop(self.model_accessor, subscriber.id, ip),
+            on_error=lambda e: self.delete_subscriber_ip_failed(subscriber, ip, e))
+
+    def delete_subscriber_ip_failed(self, subscriber, ip, e):
+        # the cached RCORDIpAddress may have been removed by someone else, forget it rather than failing every run
+        self.logger.warning("MODEL_POLICY: cannot delete RCORDIpAddress", ip=ip, e=e)
+        subscriber_ip_cache.pop(self.model_accessor, subscriber.id, ip)
 
     def update_subscriber(self, subscriber, si):
         cur_status = subscriber.status
         # Don't change state if someone has disabled the subscriber
         if subscriber.status != "disabled":
-            if si.authentication_state in ["AWAITING", "REQUESTED", "STARTED"]:
-                subscriber.status = "awaiting-auth"
-            elif si.authentication_state == "APPROVED":
-                subscriber.status = "enabled"
-            elif si.authentication_state == "DENIED":
-                subscriber.status = "auth-failed"
+            subscriber.status = workflow.SUBSCRIBER_STATUS.get(si.authentication_state, subscriber.status)
 
         # NOTE we save the subscriber only if:
         # - the status has changed
@@ -221,10 +276,16 @@ class AttWorkflowDriverServiceInstancePolicy(Policy):
                 authentication_state=si.authentication_state,
                 subscriber_status=subscriber.status,
                 always_update_timestamp=important_change)
-            subscriber.save_changed_fields(always_update_timestamp=important_change)
+            self.writes.save_changed_fields(subscriber, always_update_timestamp=important_change)
         else:
             self.logger.debug("MODEL_POLICY: subscriber status has not changed", onu_device=subscriber.onu_device,
                               authentication_state=si.authentication_state, subscriber_status=subscriber.status)
 
     def handle_delete(self, si):
-        pass
+        self.logger.debug("MODEL_POLICY: handle_delete for AttWorkflowDriverServiceInstance %s" % si.id)
+        service_instance_index.remove(si)
+        onu_waitlist.discard(si)
+        policy_state_cache.remove(si.id)
+
+        si.backend_need_reap = True
+        si.save_changed_fields()
@@ -14,6 +14,8 @@
 
 
 from helpers import AttHelpers
+from caches import whitelist_index, service_instance_index, normalize_serial
+from onu_admission import onu_admission
 from xossynchronizer.model_policies.policy import Policy
 import os
 import sys
@@ -31,11 +33,11 @@ class AttWorkflowDriverWhiteListEntryPolicy(Policy):
     # Update the SI if the onu_state has changed.
     # The SI model policy will take care of updating other state.
     def validate_onu_state(self, si):
-        [valid, message] = AttHelpers.validate_onu(self.model_accessor, self.logger, si)
-        if valid:
-            si.admin_onu_state = "ENABLED"
-        else:
-            si.admin_onu_state = "DISABLED"
+        # NOTE SIs whose validation result has not changed are not saved
+        if not AttHelpers.revalidate_onu(self.model_accessor, self.logger, si):
+            self.logger.debug("MODEL_POLICY: AttWorkflowDriverServiceInstance is not affected by the whitelist change",
+                              si=si, onu_state=si.admin_onu_state)
+            return
 
         self.logger.debug(
             "MODEL_POLICY: activating AttWorkflowDriverServiceInstance because of change in the whitelist",
@@ -43,20 +45,19 @@ class AttWorkflowDriverWhiteListEntryPolicy(Policy):
             onu_state=si.admin_onu_state,
             authentication_state=si.authentication_state)
 
-        si.status_message = message
-        si.save_changed_fields(always_update_timestamp=True)
-
     def handle_update(self, whitelist):
         self.logger.debug("MODEL_POLICY: handle_update for AttWorkflowDriverWhiteListEntry", whitelist=whitelist)
 
-        sis = self.model_accessor.AttWorkflowDriverServiceInstance.objects.all()
-
-        for si in sis:
+        # the index needs to be current before the SIs are validated against it
+        whitelist.normalized_serial_number = normalize_serial(whitelist.serial_number)
+        whitelist_index.update(whitelist)
+        # the events of the ONU are not dropped anymore
+        onu_admission.forget(whitelist.serial_number)
 
-            if si.serial_number.lower() != whitelist.serial_number.lower():
-                # NOTE we don't care about this SI as it has a different serial number
-                continue
+        # NOTE we only care about the SIs with the same serial number
+        sis = service_instance_index.get(self.model_accessor, whitelist.serial_number)
 
+        for si in sis:
             self.validate_onu_state(si)
 
         whitelist.backend_need_delete_policy = True
@@ -73,8 +74,9 @@ class AttWorkflowDriverWhiteListEntryPolicy(Policy):
 
         assert(whitelist.owner)
 
-        sis = self.model_accessor.AttWorkflowDriverServiceInstance.objects.all()
-        sis = [si for si in sis if si.serial_number.lower() == whitelist.serial_number.lower()]
+        whitelist_index.remove(whitelist)
+
+        sis = service_instance_index.get(self.model_accessor, whitelist.serial_number)
 
         for si in sis:
             self.validate_onu_state(si)
@@ -0,0 +1,107 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import unittest
+from mock import patch
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestModelPolicyAttWorkflowDriverService(unittest.TestCase):
+    def setUp(self):
+        self.sys_path_save = sys.path
+
+        config = os.path.join(test_path, "../test_config.yaml")
+        from xosconfig import Config
+        Config.clear()
+        Config.init(config, 'synchronizer-config-schema.yaml')
+
+        from xossynchronizer.mock_modelaccessor_build import mock_modelaccessor_config
+        mock_modelaccessor_config(test_path, [("att-workflow-driver", "att-workflow-driver.xproto"),
+                                              ("olt-service", "volt.xproto"),
+                                              ("rcord", "rcord.xproto")])
+
+        import xossynchronizer.modelaccessor
+        import mock_modelaccessor
+        reload(mock_modelaccessor)  # in case nose2 loaded it in a previous test
+        reload(xossynchronizer.modelaccessor)      # in case nose2 loaded it in a previous test
+
+        from xossynchronizer.modelaccessor import model_accessor
+        from model_policy_att_workflow_driver_service import AttWorkflowDriverServicePolicy
+
+        from caches import clear_caches, owner_service_cache, whitelist_index
+        clear_caches()
+        self.owner_service_cache = owner_service_cache
+        self.whitelist_index = whitelist_index
+
+        # import all class names to globals
+        for (k, v) in model_accessor.all_model_classes.items():
+            globals()[k] = v
+
+        model_accessor.reset_all_object_stores()
+
+        self.model_accessor = model_accessor
+        self.policy = AttWorkflowDriverServicePolicy(model_accessor=model_accessor)
+
+        self.service = AttWorkflowDriverService(id=1, name="att-workflow-driver")
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+        self.service = None
+
+    def test_service_update(self):
+        updated_service = AttWorkflowDriverService(id=1, name="att-workflow-driver")
+
+        with patch.object(AttWorkflowDriverService.objects, "get_items") as service_items, \
+                patch.object(updated_service, "save_changed_fields") as service_save:
+            service_items.return_value = [self.service]
+            self.assertEqual(self.owner_service_cache.first(self.model_accessor), self.service)
+
+            service_items.return_value = [updated_service]
+            self.assertEqual(self.owner_service_cache.first(self.model_accessor), self.service)
+
+            self.policy.handle_update(updated_service)
+            self.assertEqual(self.owner_service_cache.first(self.model_accessor), updated_service)
+
+            # so that handle_delete runs when the service is removed
+            self.assertTrue(updated_service.backend_need_delete_policy)
+            service_save.assert_called_once_with()
+
+    def test_service_delete(self):
+        wle = AttWorkflowDriverWhiteListEntry(id=1, serial_number="BRCM333", owner_id=self.service.id)
+
+        with patch.object(AttWorkflowDriverService.objects, "get_items") as service_items, \
+                patch.object(AttWorkflowDriverWhiteListEntry.objects, "get_items") as wle_items, \
+                patch.object(self.service, "save_changed_fields") as service_save:
+            service_items.return_value = [self.service]
+            wle_items.return_value = [wle]
+            self.owner_service_cache.first(self.model_accessor)
+            self.whitelist_index.load(self.model_accessor, self.service.id)
+
+            self.policy.handle_delete(self.service)
+
+            self.assertEqual(self.owner_service_cache.default, None)
+            self.assertFalse(self.whitelist_index.is_loaded(self.service.id))
+            self.assertTrue(self.service.backend_need_reap)
+            service_save.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+    unittest.main()
@@ -23,6 +23,21 @@ import sys
 test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 
 
+def filter_iexact(objects):
+    """
+    The mock model accessor only implements exact matches, this adds the __iexact lookups done by the caches
+    """
+    def filter(**kwargs):
+        items = objects.get_items()
+        for (k, v) in kwargs.items():
+            if k.endswith("__iexact"):
+                items = [x for x in items if (getattr(x, k[:-len("__iexact")]) or "").lower() == v.lower()]
+            else:
+                items = [x for x in items if getattr(x, k) == v]
+        return items
+    return filter
+
+
 class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
     def setUp(self):
 
@@ -47,6 +62,15 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
         from model_policy_att_workflow_driver_serviceinstance import AttWorkflowDriverServiceInstancePolicy, AttHelpers
         self.AttHelpers = AttHelpers
 
+        from caches import clear_caches, subscriber_index, service_instance_index
+        clear_caches()
+        from onu_waitlist import onu_waitlist, WAITING_MESSAGE
+        onu_waitlist.clear()
+        self.onu_waitlist = onu_waitlist
+        self.WAITING_MESSAGE = WAITING_MESSAGE
+        self.subscriber_index = subscriber_index
+        self.service_instance_index = service_instance_index
+
         # import all class names to globals
         for (k, v) in model_accessor.all_model_classes.items():
             globals()[k] = v
@@ -55,12 +79,20 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
         # creation of tags. Ideally, this wouldn't happen, but it does. So make sure we reset the world.
         model_accessor.reset_all_object_stores()
 
+        self.model_accessor = model_accessor
         self.policy = AttWorkflowDriverServiceInstancePolicy(model_accessor=model_accessor)
+
+        self.filters = [patch.object(model.objects, "filter", filter_iexact(model.objects))
+                        for model in [ONUDevice, RCORDSubscriber]]
+        for f in self.filters:
+            f.start()
         self.si = AttWorkflowDriverServiceInstance()
         self.si.owner = AttWorkflowDriverService()
         self.si.serial_number = "BRCM1234"
 
     def tearDown(self):
+        for f in self.filters:
+            f.stop()
         sys.path = self.sys_path_save
 
     def test_update_onu(self):
@@ -93,6 +125,7 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
             update_onu.assert_called_with("BRCM1234", "ENABLED")
 
             self.assertIn("valid onu", self.si.status_message)
+            self.assertTrue(self.si.validated)
 
     def test_disable_onu(self):
         with patch.object(self.AttHelpers, "validate_onu") as validate_onu, \
@@ -105,6 +138,7 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
             update_onu.assert_called_with("BRCM1234", "DISABLED")
 
             self.assertIn("invalid onu", self.si.status_message)
+            self.assertFalse(self.si.validated)
 
     def test_handle_update_validate_onu(self):
         """
@@ -132,7 +166,120 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
             self.policy.handle_update(self.si)
             process_onu_state.assert_called_with(self.si)
 
+    def test_handle_update_unknown_onu(self):
+        """
+        Testing that an SI whose ONUDevice is not known yet is parked, instead of failing the policy
+        """
+        from xossynchronizer.steps.syncstep import DeferredException
+
+        self.si.id = 42
+        with patch.object(self.policy, "process_onu_state") as process_onu_state, \
+                patch.object(self.policy, "process_workflow") as process_workflow, \
+                patch.object(self.onu_waitlist, "start") as start, \
+                patch.object(self.si, "save_changed_fields") as si_save:
+            process_onu_state.side_effect = DeferredException("ONU device BRCM1234 is not know to XOS yet")
+
+            self.policy.handle_update(self.si)
+
+            process_workflow.assert_not_called()
+            start.assert_called_once()
+            si_save.assert_called_once()
+            self.assertEqual(self.si.status_message, self.WAITING_MESSAGE)
+            self.assertTrue(self.onu_waitlist.is_parked(self.si))
+
+            # once the ONUDevice is there the SI leaves the waitlist
+            process_onu_state.side_effect = None
+            with patch.object(self.policy, "get_subscriber") as get_subscriber:
+                get_subscriber.return_value = None
+                self.policy.handle_update(self.si)
+            self.assertFalse(self.onu_waitlist.is_parked(self.si))
+
+    def test_handle_update_skip_stages(self):
+        """
+        Testing that the stages whose inputs have not changed are skipped
+        """
+        from model_policy_att_workflow_driver_serviceinstance import skipped_stages
+
+        self.si.id = 7
+        self.si.admin_onu_state = "ENABLED"
+        self.si.oper_onu_status = "ENABLED"
+        self.si.authentication_state = "APPROVED"
+        sub = RCORDSubscriber(onu_device="BRCM1234")
+        skipped = dict((stage, counter.value) for (stage, counter) in skipped_stages.items())
+
+        with patch.object(self.policy, "process_onu_state") as process_onu_state, \
+                patch.object(self.policy, "get_subscriber") as get_subscriber, \
+                patch.object(self.policy, "update_subscriber") as update_subscriber:
+            get_subscriber.return_value = sub
+
+            self.policy.handle_update(self.si)
+            self.assertEqual(process_onu_state.call_count, 1)
+            self.assertEqual(update_subscriber.call_count, 1)
+
+            # a DHCP event doesn't need the whitelist validation
+            self.si.dhcp_state = "DHCPACK"
+            self.si.ip_address = "10.11.1.1"
+            self.si.mac_address = "90:e2:ba:82:fa:81"
+            self.policy.handle_update(self.si)
+            self.assertEqual(process_onu_state.call_count, 1)
+            self.assertEqual(update_subscriber.call_count, 2)
+            self.assertEqual(self.si.dhcp_state, "DHCPACK")
+            self.assertEqual(skipped_stages["onu"].value, skipped["onu"] + 1)
+
+            # nothing has changed
+            self.policy.handle_update(self.si)
+            self.assertEqual(process_onu_state.call_count, 1)
+            self.assertEqual(update_subscriber.call_count, 2)
+            self.assertEqual(skipped_stages["onu"].value, skipped["onu"] + 2)
+            self.assertEqual(skipped_stages["workflow"].value, skipped["workflow"] + 1)
+            self.assertEqual(skipped_stages["subscriber"].value, skipped["subscriber"] + 1)
+
+            # an ONU event runs all the stages
+            self.si.oper_onu_status = "DISABLED"
+            self.policy.handle_update(self.si)
+            self.assertEqual(process_onu_state.call_count, 2)
+            self.assertEqual(update_subscriber.call_count, 3)
+            self.assertEqual(self.si.authentication_state, "AWAITING")
+
+    def test_handle_update_failure(self):
+        """
+        Testing that nothing is written if the policy fails
+        """
+        onu = ONUDevice(serial_number="BRCM1234", admin_state="DISABLED")
+
+        def process_onu_state(si):
+            onu.admin_state = "ENABLED"
+            self.policy.writes.save_changed_fields(onu, always_update_timestamp=True)
+
+        with patch.object(self.policy, "process_onu_state") as process_onu_state_mock, \
+                patch.object(self.policy, "get_subscriber") as get_subscriber, \
+                patch.object(onu, "save_changed_fields") as onu_save, \
+                patch.object(self.si, "save_changed_fields") as si_save:
+            process_onu_state_mock.side_effect = process_onu_state
+            get_subscriber.side_effect = Exception("core not reachable")
+
+            with self.assertRaises(Exception):
+                self.policy.handle_update(self.si)
+
+            onu_save.assert_not_called()
+            si_save.assert_not_called()
+
+            # the writes are done at the end of a successful run, the SI last
+            get_subscriber.side_effect = None
+            get_subscriber.return_value = None
+            calls = []
+            onu_save.side_effect = lambda **kwargs: calls.append("onu")
+            si_save.side_effect = lambda **kwargs: calls.append("si")
+
+            self.policy.handle_update(self.si)
+
+            onu_save.assert_called_once_with(always_update_timestamp=True)
+            self.assertEqual(calls, ["onu", "si"])
+
     def test_get_subscriber(self):
+        import caches
+        counters = [caches.subscriber_index_hits, caches.subscriber_index_misses, caches.subscriber_index_negative_hits]
+        before = [c.value for c in counters]
 
         sub = RCORDSubscriber(
             onu_device="BRCM1234"
@@ -149,6 +296,39 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
 
             res = self.policy.get_subscriber("foo")
             self.assertEqual(res, None)
+            res = self.policy.get_subscriber("foo")
+            self.assertEqual(res, None)
+
+            # each miss is a keyed lookup, the subscribers are never scanned
+            self.assertEqual(self.subscriber_index.stats(), {"hits": 1, "misses": 2, "negative_hits": 1, "size": 1})
+            self.assertEqual(get_subscribers.call_count, 3)
+
+            # and are exported as metrics
+            self.assertEqual([c.value - b for (c, b) in zip(counters, before)], [1, 2, 1])
+            self.assertEqual(caches.subscriber_index_size.get(), 1)
+
+    def test_get_subscriber_negative_ttl(self):
+
+        sub = RCORDSubscriber(
+            onu_device="BRCM1234"
+        )
+
+        with patch.object(RCORDSubscriber.objects, "get_items") as get_subscribers, \
+                patch("caches.time.time") as now:
+            get_subscribers.return_value = []
+            now.return_value = 1000
+
+            self.assertEqual(self.policy.get_subscriber("BRCM1234"), None)
+
+            # the subscriber is created, but we remember the miss for a while
+            get_subscribers.return_value = [sub]
+            now.return_value = 1000 + self.subscriber_index.negative_ttl - 1
+            self.assertEqual(self.policy.get_subscriber("BRCM1234"), None)
+
+            now.return_value = 1000 + self.subscriber_index.negative_ttl
+            self.assertEqual(self.policy.get_subscriber("BRCM1234"), sub)
+
+            self.assertEqual(self.subscriber_index.stats(), {"hits": 0, "misses": 2, "negative_hits": 1, "size": 1})
 
     def test_update_subscriber(self):
 
@@ -253,7 +433,13 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
                 update_fields=['id', 'mac_address', 'onu_device', 'status'])
             self.assertEqual(sub.mac_address, self.si.mac_address)
 
-            ip_mock.assert_called_with()
+            # the address already exists, there's nothing to save
+            ip_mock.assert_not_called()
+
+            # a DHCP renewal is resolved from the cache
+            self.policy.update_subscriber(sub, self.si)
+            self.assertEqual(get_ips.call_count, 1)
+            ip_mock.assert_not_called()
 
     def test_update_subscriber_dhcp_with_new_ip(self):
         sub = RCORDSubscriber(
@@ -281,6 +467,54 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
             self.assertEqual(saved_ip.subscriber_id, sub.id)
             self.assertEqual(saved_ip.description, "DHCP Assigned IP Address")
 
+    def test_delete_subscriber_ip(self):
+        sub = RCORDSubscriber(
+            id=10,
+            onu_device="BRCM1234"
+        )
+
+        ip = RCORDIpAddress(
+            subscriber_id=sub.id,
+            ip='10.11.2.23'
+        )
+
+        with patch.object(RCORDIpAddress.objects, "get_items") as get_ips, \
+                patch.object(ip, "delete") as ip_delete:
+            get_ips.return_value = [ip]
+
+            self.policy.update_subscriber_ip(sub, "10.11.2.23")
+            self.policy.delete_subscriber_ip(sub, "10.11.2.23")
+            ip_delete.assert_called_once_with()
+
+            # the address is gone, deleting it again is a no-op
+            self.policy.delete_subscriber_ip(sub, "10.11.2.23")
+            ip_delete.assert_called_once_with()
+            self.assertEqual(get_ips.call_count, 1)
+
+    def test_delete_subscriber_ip_failed(self):
+        sub = RCORDSubscriber(
+            id=10,
+            onu_device="BRCM1234"
+        )
+
+        ip = RCORDIpAddress(
+            subscriber_id=sub.id,
+            ip='10.11.2.23'
+        )
+
+        with patch.object(RCORDIpAddress.objects, "get_items") as get_ips, \
+                patch.object(ip, "delete") as ip_delete:
+            get_ips.return_value = [ip]
+            ip_delete.side_effect = Exception("RCORDIpAddress matching query does not exist")
+
+            self.policy.update_subscriber_ip(sub, "10.11.2.23")
+            self.policy.delete_subscriber_ip(sub, "10.11.2.23")
+            ip_delete.assert_called_once_with()
+
+            # the stale address is not cached anymore, the next run doesn't fail on it again
+            self.policy.delete_subscriber_ip(sub, "10.11.2.23")
+            ip_delete.assert_called_once_with()
+
     def test_handle_update_subscriber(self):
         self.si.admin_onu_state = "DISABLED"
 
@@ -307,7 +541,7 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
         self.si.oper_onu_status = "ENABLED"
         self.si.authentication_state, "APPROVED"
 
-        self.policy.process_auth_state(self.si)
+        self.policy.process_workflow(self.si)
         self.assertEqual(self.si.authentication_state, "AWAITING")
 
         # testing change in oper_onu_status
@@ -315,10 +549,33 @@ class TestModelPolicyAttWorkflowDriverServiceInstance(unittest.TestCase):
         self.si.oper_onu_status = "DISABLED"
         self.si.authentication_state, "APPROVED"
 
-        self.policy.process_auth_state(self.si)
+        self.policy.process_workflow(self.si)
         self.assertEqual(self.si.authentication_state, "AWAITING")
 
 
+    def test_service_instance_index(self):
+        self.si.id = 1
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as get_sis, \
+                patch.object(self.policy, "process_onu_state") as process_onu_state, \
+                patch.object(self.policy, "get_subscriber") as get_subscriber:
+            get_sis.return_value = []
+            get_subscriber.return_value = None
+            self.service_instance_index.load(self.model_accessor)
+
+            get_sis.return_value = [self.si]
+            self.policy.handle_update(self.si)
+            self.assertEqual(self.service_instance_index.get(self.model_accessor, "brcm1234"), [self.si])
+            # so that handle_delete runs when the SI is removed
+            self.assertTrue(self.si.backend_need_delete_policy)
+
+            with patch.object(self.si, "save_changed_fields") as si_save:
+                self.policy.handle_delete(self.si)
+            self.assertEqual(self.service_instance_index.get(self.model_accessor, "brcm1234"), [])
+            self.assertTrue(self.si.backend_need_reap)
+            si_save.assert_called_once_with()
+
+
 if __name__ == '__main__':
     sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
     unittest.main()
@@ -46,6 +46,11 @@ class TestModelPolicyAttWorkflowDriverWhiteListEntry(unittest.TestCase):
         from model_policy_att_workflow_driver_whitelistentry import AttWorkflowDriverWhiteListEntryPolicy, AttHelpers
         self.AttHelpers = AttHelpers
 
+        from caches import clear_caches, whitelist_index, service_instance_index
+        clear_caches()
+        self.whitelist_index = whitelist_index
+        self.service_instance_index = service_instance_index
+
         from mock_modelaccessor import MockObjectList
         self.MockObjectList = MockObjectList
 
@@ -57,6 +62,7 @@ class TestModelPolicyAttWorkflowDriverWhiteListEntry(unittest.TestCase):
         # creation of tags. Ideally, this wouldn't happen, but it does. So make sure we reset the world.
         model_accessor.reset_all_object_stores()
 
+        self.model_accessor = model_accessor
         self.policy = AttWorkflowDriverWhiteListEntryPolicy(model_accessor=model_accessor)
 
         self.service = AttWorkflowDriverService()
@@ -91,6 +97,19 @@ class TestModelPolicyAttWorkflowDriverWhiteListEntry(unittest.TestCase):
                 always_update_timestamp=True, update_fields=[
                     'admin_onu_state', 'serial_number', 'status_message', 'updated'])
 
+    def test_onu_unchanged(self):
+        si = AttWorkflowDriverServiceInstance(serial_number="BRCM333", owner_id=self.service.id,
+                                              admin_onu_state="ENABLED",
+                                              status_message="valid onu - Authentication succeeded")
+        with patch.object(self.AttHelpers, "validate_onu") as validate_onu, \
+                patch.object(si, "save") as save_si:
+            validate_onu.return_value = [True, "valid onu"]
+
+            self.policy.validate_onu_state(si)
+
+            # the validation result has not changed, so the SI model_policy doesn't need to run
+            save_si.assert_not_called()
+
     def test_whitelist_update(self):
         si = AttWorkflowDriverServiceInstance(serial_number="BRCM333", owner_id=self.service.id)
         wle = AttWorkflowDriverWhiteListEntry(serial_number="brcm333", owner_id=self.service.id, owner=self.service)
@@ -98,14 +117,17 @@ class TestModelPolicyAttWorkflowDriverWhiteListEntry(unittest.TestCase):
                 patch.object(self.policy, "validate_onu_state") as validate_onu_state, \
                 patch.object(wle, "save") as wle_save:
             oss_si_items.return_value = [si]
+            self.whitelist_index.load(self.model_accessor, self.service.id)
 
             self.policy.handle_update(wle)
 
             validate_onu_state.assert_called_with(si)
             self.assertTrue(wle.backend_need_delete_policy)
+            self.assertEqual(self.whitelist_index.get(self.model_accessor, self.service.id, "BRCM333"), wle)
             wle_save.assert_called_with(
                 always_update_timestamp=False, update_fields=[
-                    'backend_need_delete_policy', 'owner', 'serial_number'])
+                    'backend_need_delete_policy', 'normalized_serial_number', 'owner', 'serial_number'])
+            self.assertEqual(wle.normalized_serial_number, "brcm333")
 
     def test_whitelist_delete(self):
         si = AttWorkflowDriverServiceInstance(serial_number="BRCM333", owner_id=self.service.id)
@@ -114,9 +136,13 @@ class TestModelPolicyAttWorkflowDriverWhiteListEntry(unittest.TestCase):
                 patch.object(self.policy, "validate_onu_state") as validate_onu_state, \
                 patch.object(wle, "save") as wle_save:
             oss_si_items.return_value = [si]
+            self.whitelist_index.load(self.model_accessor, self.service.id)
+            self.whitelist_index.update(wle)
 
             self.policy.handle_delete(wle)
 
+            self.assertEqual(self.whitelist_index.get(self.model_accessor, self.service.id, "BRCM333"), None)
+
             validate_onu_state.assert_called_with(si)
             self.assertTrue(wle.backend_need_reap)
             wle_save.assert_called_with(
@@ -124,6 +150,39 @@ class TestModelPolicyAttWorkflowDriverWhiteListEntry(unittest.TestCase):
                     'backend_need_reap', 'owner', 'serial_number'])
 
 
+    def test_whitelist_update_only_affected_sis(self):
+        si = AttWorkflowDriverServiceInstance(id=1, serial_number="BRCM333", owner_id=self.service.id)
+        other_si = AttWorkflowDriverServiceInstance(id=2, serial_number="BRCM444", owner_id=self.service.id)
+        wle = AttWorkflowDriverWhiteListEntry(serial_number="brcm333", owner_id=self.service.id, owner=self.service)
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as oss_si_items, \
+                patch.object(self.policy, "validate_onu_state") as validate_onu_state, \
+                patch.object(wle, "save") as wle_save:
+            oss_si_items.return_value = [si, other_si]
+
+            self.policy.handle_update(wle)
+            self.policy.handle_update(wle)
+
+            self.assertEqual(validate_onu_state.call_count, 2)
+            validate_onu_state.assert_called_with(si)
+
+    def test_whitelist_update_new_si(self):
+        si = AttWorkflowDriverServiceInstance(id=1, serial_number="BRCM333", owner_id=self.service.id)
+        wle = AttWorkflowDriverWhiteListEntry(serial_number="brcm333", owner_id=self.service.id, owner=self.service)
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as oss_si_items, \
+                patch.object(self.policy, "validate_onu_state") as validate_onu_state, \
+                patch.object(wle, "save") as wle_save:
+            oss_si_items.return_value = []
+            self.service_instance_index.load(self.model_accessor)
+
+            # the SI policy adds new SIs to the index
+            oss_si_items.return_value = [si]
+            self.service_instance_index.update(si)
+
+            self.policy.handle_update(wle)
+
+            validate_onu_state.assert_called_once_with(si)
+
+
 if __name__ == '__main__':
     sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
     unittest.main()
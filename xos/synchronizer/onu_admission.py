@@ -0,0 +1,231 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+from collections import OrderedDict
+
+from caches import whitelist_index, owner_service_cache, normalize_serial
+from event_dispatcher import EventDispatcher
+from event_workers import EventWorkerPool
+from helpers import NOT_WHITELISTED_MESSAGE
+import metrics
+
+rejected_onu_events = metrics.counter(
+    "att_workflow_driver_rejected_onu_events",
+    "onu.events of ONUs that are not in the whitelist that have been dropped")
+rogue_onus = metrics.gauge(
+    "att_workflow_driver_rogue_onus",
+    "ONUs that are not in the whitelist whose onu.events are being dropped")
+replayed_onu_events = metrics.counter(
+    "att_workflow_driver_replayed_onu_events",
+    "Dropped onu.events processed once their ONU has been added to the whitelist")
+reaped_sis = metrics.counter(
+    "att_workflow_driver_reaped_sis",
+    "AttWorkflowDriverServiceInstances of ONUs that have never been in the whitelist removed after si_ttl")
+
+
+class ONUAdmission(object):
+    """
+    Admission control for the onu.events of ONUs that are not in the whitelist.
+
+    The first event of an ONU that is not in the whitelist is processed, so that its SI reports it, then its
+    serial number is kept in a negative cache and its events are dropped for negative_ttl seconds.
+    At most max_admissions ONUs that are not in the whitelist are admitted per OLT every admission_window seconds,
+    the events of the others are dropped. An ONU is removed from the negative cache when it's added to the whitelist,
+    and the last of its dropped events is then processed, so that an ONU dropped by the per OLT limit gets its SI.
+    The event is handed back to the EventDispatcher or the EventWorkerPool if they are enabled, otherwise it is
+    processed by the onu.events consumer before its next event (see replay).
+    The dropped events of up to max_dropped ONUs are kept.
+    The SIs of ONUs that have never been in the whitelist are removed after si_ttl seconds without updates, by a thread
+    that is started with the synchronizer (see warmup.start_tasks), or with the first ONU that is not in the whitelist.
+    SIs that have been validated once are kept, as their ONU may only be removed from the whitelist temporarily.
+    """
+
+    negative_ttl = 300
+    max_admissions = 20
+    admission_window = 60
+    max_dropped = 10000
+    # set si_ttl to 0 to keep the SIs of the ONUs that are not in the whitelist
+    si_ttl = 86400
+    reap_interval = 600
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.thread = None
+        self.model_accessor = None
+        self.log = None
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            # normalized serial_number -> time its events are admitted again
+            self.rejected = {}
+            # device_id -> times ONUs that are not in the whitelist have been admitted within admission_window
+            self.admissions = {}
+            # normalized serial_number -> (step, value) of the last dropped event, oldest first
+            self.dropped = OrderedDict()
+            # (step, value) of the dropped events of ONUs added to the whitelist, waiting for the onu.events consumer
+            self.replays = []
+            rogue_onus.set(0)
+
+    def start(self, model_accessor, log):
+        with self.lock:
+            self.model_accessor = model_accessor
+            self.log = log
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="onu-admission")
+            self.thread.daemon = True
+        self.thread.start()
+
+    def is_whitelisted(self, model_accessor, serial_number):
+        # NOTE as in find_or_create_att_si we assume there is only one AttWorkflowDriverService
+        service = owner_service_cache.first(model_accessor)
+        if service is None:
+            return True
+        return whitelist_index.get(model_accessor, service.id, serial_number) is not None
+
+    def admit(self, model_accessor, log, value, step=None):
+        """
+        :param value: a decoded onu.events
+        :param step: the ONUEventStep, a dropped event is handed over to its handle_value once the ONU is whitelisted
+        :return: False if the event has to be dropped
+        """
+        if self.is_whitelisted(model_accessor, value["serialNumber"]):
+            return True
+
+        serial_number = normalize_serial(value["serialNumber"])
+        device_id = value["deviceId"]
+        now = time.time()
+        with self.lock:
+            if self.rejected.get(serial_number, 0) > now:
+                rejected_onu_events.inc()
+                self.drop(serial_number, step, value)
+                log.debug("onu.events: dropping event of ONU not in whitelist", value=value)
+                return False
+
+            admissions = [t for t in self.admissions.get(device_id, []) if t > now - self.admission_window]
+            self.admissions[device_id] = admissions
+            if len(admissions) >= self.max_admissions:
+                rejected_onu_events.inc()
+                self.drop(serial_number, step, value)
+                log.debug("onu.events: too many ONUs not in whitelist on this OLT, dropping event", value=value,
+                          max_admissions=self.max_admissions, admission_window=self.admission_window)
+                return False
+
+            admissions.append(now)
+            self.rejected[serial_number] = now + self.negative_ttl
+            self.dropped.pop(serial_number, None)
+            rogue_onus.set(len(self.rejected))
+
+        log.info("onu.events: admitting ONU not in whitelist", value=value, negative_ttl=self.negative_ttl)
+        self.start(model_accessor, log)
+        return True
+
+    def drop(self, serial_number, step, value):
+        if step is None:
+            return
+        with self.lock:
+            self.dropped.pop(serial_number, None)
+            self.dropped[serial_number] = (step, value)
+            while len(self.dropped) > self.max_dropped:
+                self.dropped.popitem(last=False)
+
+    def forget(self, serial_number):
+        """
+        Admits the events of serial_number again (eg: it has been added to the whitelist),
+        and processes the last of its events that have been dropped
+        """
+        serial_number = normalize_serial(serial_number)
+        with self.lock:
+            self.rejected.pop(serial_number, None)
+            rogue_onus.set(len(self.rejected))
+            dropped = self.dropped.pop(serial_number, None)
+
+        if dropped is None:
+            return
+        (step, value) = dropped
+        step.log.info("onu.events: processing the dropped event of ONU added to the whitelist", value=value)
+        replayed_onu_events.inc()
+        # NOTE this runs on the thread of the whitelist model_policy, the event is processed by the same threads as
+        # the other events of the ONU, so that it can't race them on the creation of the SI
+        if EventDispatcher.enabled():
+            EventDispatcher.for_step(step).add(step, value)
+        elif EventWorkerPool.enabled():
+            EventWorkerPool.for_step(step).add(step, value)
+        else:
+            with self.lock:
+                self.replays.append((step, value))
+
+    def replay(self):
+        """
+        Processes the dropped events of ONUs added to the whitelist, called by the onu.events consumer
+        """
+        with self.lock:
+            (replays, self.replays) = (self.replays, [])
+        for (step, value) in replays:
+            try:
+                step.handle_value(value)
+            except Exception:
+                step.log.exception("onu.events: exception while processing the dropped event", value=value)
+
+    def purge(self):
+        now = time.time()
+        with self.lock:
+            for serial_number in [s for (s, t) in self.rejected.items() if t <= now]:
+                del self.rejected[serial_number]
+            expired = now - self.admission_window
+            for device_id in [d for (d, a) in self.admissions.items() if not a or a[-1] <= expired]:
+                del self.admissions[device_id]
+            rogue_onus.set(len(self.rejected))
+
+    def reap(self):
+        """
+        Removes the SIs of ONUs that have never been validated against the whitelist
+        and have not been updated for si_ttl seconds
+
+        :return: the ids of the removed SIs
+        """
+        if not self.si_ttl:
+            return []
+
+        reaped = []
+        limit = time.time() - self.si_ttl
+        sis = self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter(admin_onu_state="DISABLED",
+                                                                                  validated=False)
+        for si in sis:
+            if not (si.status_message or "").startswith(NOT_WHITELISTED_MESSAGE) or si.updated > limit:
+                continue
+            # the ONU may have been added to the whitelist but not revalidated yet
+            if self.is_whitelisted(self.model_accessor, si.serial_number):
+                continue
+            self.log.info("ONUAdmission: removing SI of ONU not in whitelist", si=si, si_ttl=self.si_ttl)
+            si.delete()
+            reaped.append(si.id)
+            reaped_sis.inc()
+        return reaped
+
+    def run(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.purge()
+                self.reap()
+            except Exception:
+                self.log.exception("ONUAdmission: exception while removing the SIs of ONUs not in whitelist")
+
+
+onu_admission = ONUAdmission()
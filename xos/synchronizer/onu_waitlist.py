@@ -0,0 +1,248 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+
+from caches import onu_device_cache, normalize_serial
+import metrics
+
+parked_sis = metrics.gauge(
+    "att_workflow_driver_parked_sis",
+    "AttWorkflowDriverServiceInstances waiting for their ONUDevice")
+released_sis = metrics.counter(
+    "att_workflow_driver_released_sis",
+    "AttWorkflowDriverServiceInstances re-evaluated after their ONUDevice appeared")
+expired_sis = metrics.counter(
+    "att_workflow_driver_expired_sis",
+    "AttWorkflowDriverServiceInstances that stopped waiting for their ONUDevice after max_onu_retry checks")
+
+# status_message of the SIs in the waitlist, used to restore the waitlist after a restart
+WAITING_MESSAGE = "Waiting for the ONU device to be known to XOS"
+# status_message of the SIs that stopped waiting, formatted with max_onu_retry
+EXPIRED_MESSAGE = "ONU device not found after %s checks"
+
+
+class ONUWaitlist(object):
+    """
+    AttWorkflowDriverServiceInstances whose ONUDevice has not been created by the vOLT synchronizer yet.
+
+    Rather than failing the model_policy, which is then retried on every run of the policy loop, SIs are parked here
+    until their ONUDevice appears. A single thread looks up the ONUDevice of each parked serial number with a keyed
+    read every check_interval seconds, and the ONUs an onu.events has been received for as soon as possible,
+    at most once every min_wake_interval seconds.
+    When the ONUDevice appears the SI is saved, so that its model_policy runs exactly once more.
+    After max_onu_retry checks the SI stops waiting and its status_message reports that the ONU was not found,
+    it is parked again when the ONU is activated later on.
+    The thread is started when the first SI is parked, it then restores the SIs parked before a restart.
+    """
+
+    check_interval = 10
+    min_wake_interval = 1
+    max_onu_retry = 50
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.thread = None
+        self.model_accessor = None
+        self.log = None
+        self.clear()
+
+    def clear(self):
+        with self.condition:
+            # serial_number -> {si_id: checks}
+            self.parked = {}
+            # serial_number -> set of si_ids that stopped waiting
+            self.expired = {}
+            # serial numbers to check before the next check_interval
+            self.woken = set()
+            self.checked_at = 0
+            parked_sis.set(0)
+
+    def start(self, model_accessor, log):
+        with self.condition:
+            self.model_accessor = model_accessor
+            self.log = log
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="onu-waitlist")
+            self.thread.daemon = True
+        self.thread.start()
+
+    def load(self):
+        """
+        Restores the SIs that were parked before the synchronizer has been restarted
+        """
+        objects = self.model_accessor.AttWorkflowDriverServiceInstance.objects
+        sis = objects.filter(status_message=WAITING_MESSAGE)
+        expired = objects.filter(status_message=EXPIRED_MESSAGE % self.max_onu_retry)
+        with self.condition:
+            for si in sis:
+                self.parked.setdefault(normalize_serial(si.serial_number), {}).setdefault(si.id, 0)
+            for si in expired:
+                self.expired.setdefault(normalize_serial(si.serial_number), set()).add(si.id)
+            self.update_gauge()
+
+    def update_gauge(self):
+        parked_sis.set(sum(len(si_ids) for si_ids in self.parked.values()))
+
+    def is_parked(self, si):
+        with self.condition:
+            return si.id in self.parked.get(normalize_serial(si.serial_number), {})
+
+    def park(self, model_accessor, log, si):
+        with self.condition:
+            serial_number = normalize_serial(si.serial_number)
+            self.parked.setdefault(serial_number, {}).setdefault(si.id, 0)
+            self.discard_expired(serial_number, si.id)
+            self.update_gauge()
+        self.start(model_accessor, log)
+
+    def discard(self, si):
+        with self.condition:
+            serial_number = normalize_serial(si.serial_number)
+            si_ids = self.parked.get(serial_number, {})
+            si_ids.pop(si.id, None)
+            if not si_ids:
+                self.parked.pop(serial_number, None)
+            self.discard_expired(serial_number, si.id)
+            self.update_gauge()
+
+    def discard_expired(self, serial_number, si_id):
+        si_ids = self.expired.get(serial_number, set())
+        si_ids.discard(si_id)
+        if not si_ids:
+            self.expired.pop(serial_number, None)
+
+    def wake(self, serial_number):
+        """
+        Checks serial_number soon if it is parked (eg: the ONU has just been activated),
+        the SIs that stopped waiting for it are parked again
+        """
+        serial_number = normalize_serial(serial_number)
+        with self.condition:
+            if serial_number in self.expired:
+                si_ids = self.parked.setdefault(serial_number, {})
+                for si_id in self.expired.pop(serial_number):
+                    si_ids.setdefault(si_id, 0)
+                self.update_gauge()
+            if serial_number in self.parked and serial_number not in self.woken:
+                self.woken.add(serial_number)
+                self.condition.notify()
+
+    def check(self, serial_numbers=None):
+        """
+        Releases the SIs whose ONUDevice is now known and counts a check for the others
+
+        :param serial_numbers: only look up these serial numbers (eg: the ONUs that have just been activated),
+               without counting a check for the SIs that are still waiting
+        :return: (released, expired) lists of si ids
+        """
+        count = serial_numbers is None
+        with self.condition:
+            self.checked_at = time.time()
+            if count:
+                serial_numbers = list(self.parked.keys())
+            else:
+                serial_numbers = [s for s in serial_numbers if s in self.parked]
+            if not serial_numbers:
+                return [], []
+
+        found = set()
+        for serial_number in serial_numbers:
+            if not count:
+                # the ONUDevice may have been created since it was last looked up
+                onu_device_cache.invalidate(serial_number)
+            if onu_device_cache.get(self.model_accessor, serial_number) is not None:
+                found.add(serial_number)
+
+        released = []
+        expired = []
+        with self.condition:
+            for serial_number in serial_numbers:
+                si_ids = self.parked.get(serial_number)
+                if si_ids is None:
+                    continue
+                if serial_number in found:
+                    released += si_ids.keys()
+                    del self.parked[serial_number]
+                    continue
+                if not count:
+                    continue
+                for si_id in list(si_ids.keys()):
+                    si_ids[si_id] += 1
+                    if si_ids[si_id] >= self.max_onu_retry:
+                        expired.append(si_id)
+                        self.expired.setdefault(serial_number, set()).add(si_id)
+                        del si_ids[si_id]
+                if not si_ids:
+                    del self.parked[serial_number]
+            self.update_gauge()
+
+        for si_id in released:
+            self.release(si_id)
+        for si_id in expired:
+            self.expire(si_id)
+        return released, expired
+
+    def release(self, si_id):
+        try:
+            si = self.model_accessor.AttWorkflowDriverServiceInstance.objects.get(id=si_id)
+        except Exception:
+            # the SI has been removed in the meantime
+            return
+        self.log.info("ONUWaitlist: ONU device is now known, re-evaluating the SI", si=si)
+        # always_update_timestamp makes the model_policy run again
+        si.save(update_fields=["updated"], always_update_timestamp=True)
+        released_sis.inc()
+
+    def expire(self, si_id):
+        try:
+            si = self.model_accessor.AttWorkflowDriverServiceInstance.objects.get(id=si_id)
+        except Exception:
+            return
+        self.log.warn("ONUWaitlist: ONU device not found, giving up", si=si, checks=self.max_onu_retry)
+        si.status_message = EXPIRED_MESSAGE % self.max_onu_retry
+        si.save_changed_fields()
+        expired_sis.inc()
+
+    def run(self):
+        try:
+            self.load()
+        except Exception:
+            self.log.exception("ONUWaitlist: failed to restore the parked SIs")
+        next_check = time.time() + self.check_interval
+        while True:
+            with self.condition:
+                if not self.woken:
+                    self.condition.wait(max(next_check - time.time(), 0))
+                # the woken ONUs are checked together, at most once every min_wake_interval
+                delay = self.checked_at + self.min_wake_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            with self.condition:
+                woken = self.woken
+                self.woken = set()
+            try:
+                if woken:
+                    self.check(woken)
+                if time.time() >= next_check:
+                    next_check = time.time() + self.check_interval
+                    self.check()
+            except Exception:
+                self.log.exception("ONUWaitlist: exception while checking the parked SIs")
+
+
+onu_waitlist = ONUWaitlist()
@@ -0,0 +1,185 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+
+from helpers import AttHelpers
+from caches import policy_state_cache, whitelist_index, normalize_serial
+from onu_waitlist import WAITING_MESSAGE
+import workflow
+import metrics
+
+reconciled_sis = metrics.counter(
+    "att_workflow_driver_reconciled_sis",
+    "AttWorkflowDriverServiceInstances whose model_policy has been run again by the reconciliation")
+reconciled_onus = metrics.counter(
+    "att_workflow_driver_reconciled_onus",
+    "ONUDevices whose admin_state has been corrected by the reconciliation")
+reconciliation_seconds = metrics.gauge(
+    "att_workflow_driver_reconciliation_seconds",
+    "Duration of the last reconciliation sweep")
+
+
+class Snapshot(object):
+    """
+    All the models the workflow depends on, read with one query per model and indexed by normalized serial number
+    """
+
+    def __init__(self, model_accessor):
+        self.time = time.time()
+        self.sis = model_accessor.AttWorkflowDriverServiceInstance.objects.all()
+
+        self.whitelist_entries = model_accessor.AttWorkflowDriverWhiteListEntry.objects.all()
+        # (owner_id, serial_number) -> entry, the oldest entry wins as in WhitelistIndex
+        self.whitelist = {}
+        for entry in sorted(self.whitelist_entries, key=lambda e: e.id):
+            self.whitelist.setdefault((entry.owner_id, normalize_serial(entry.serial_number)), entry)
+
+        self.onus = dict((normalize_serial(onu.serial_number), onu) for onu in model_accessor.ONUDevice.objects.all())
+        self.pon_ports = dict((port.id, port) for port in model_accessor.PONPort.objects.all())
+        self.subscribers = dict((normalize_serial(subscriber.onu_device), subscriber)
+                                for subscriber in model_accessor.RCORDSubscriber.objects.all())
+
+
+class Reconciler(object):
+    """
+    Periodically repairs the drift between the AttWorkflowDriverServiceInstances, the whitelist, the ONUDevices and
+    the RCORDSubscribers, that otherwise is only repaired when an event arrives for the ONU.
+
+    Each sweep reads a Snapshot and joins the models in memory, which is O(N), then applies the corrections:
+    - an ONUDevice whose admin_state doesn't match its SI is corrected directly
+    - an SI whose whitelist validation, authentication state or subscriber status doesn't match is saved, after
+      dropping its state in the policy_state_cache, so that its model_policy runs all the stages again
+    At most max_corrections_per_second corrections are applied, and a sweep stops after time_budget seconds, the
+    remaining corrections are applied by the next sweep. Objects updated less than settle_time seconds before the
+    snapshot are skipped, as their events and model_policies may still be in progress.
+    The thread is started with the synchronizer, see warmup.start_tasks.
+    """
+
+    # set interval to 0 to disable the reconciliation
+    interval = 3600
+    time_budget = 600
+    max_corrections_per_second = 10
+    settle_time = 60
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.model_accessor = None
+        self.log = None
+
+    def start(self, model_accessor, log):
+        with self.lock:
+            self.model_accessor = model_accessor
+            self.log = log
+            if self.thread is not None or not self.interval:
+                return
+            self.thread = threading.Thread(target=self.run, name="reconciler")
+            self.thread.daemon = True
+        self.thread.start()
+
+    def settled(self, snapshot, obj):
+        return obj.updated <= snapshot.time - self.settle_time
+
+    def check(self, snapshot, si):
+        """
+        Compares an SI with the other models
+
+        :return: ("si", reason), ("onu", onu) or None if nothing has to be corrected
+        """
+        serial_number = normalize_serial(si.serial_number)
+        onu = snapshot.onus.get(serial_number)
+        if onu is None or si.status_message == WAITING_MESSAGE:
+            # the SI is waiting for its ONUDevice, see ONUWaitlist
+            return None
+        if si.admin_onu_state == "AWAITING":
+            # the model_policy has not validated the SI yet
+            return None
+
+        whitelisted = snapshot.whitelist.get((si.owner_id, serial_number))
+        pon_port = snapshot.pon_ports.get(onu.pon_port_id) or onu.pon_port
+        [valid, message] = AttHelpers.check_onu(si, whitelisted, onu, pon_port)
+        if si.admin_onu_state != ("ENABLED" if valid else "DISABLED") or \
+                not (si.status_message or "").startswith(message):
+            return ("si", "whitelist")
+
+        if workflow.evaluate(si).authentication_state != si.authentication_state:
+            return ("si", "authentication")
+
+        subscriber = snapshot.subscribers.get(serial_number)
+        if subscriber is not None and subscriber.status != "disabled" and self.settled(snapshot, subscriber) and \
+                subscriber.status != workflow.SUBSCRIBER_STATUS.get(si.authentication_state, subscriber.status):
+            return ("si", "subscriber")
+
+        if onu.admin_state not in ("ADMIN_DISABLED", si.admin_onu_state) and self.settled(snapshot, onu):
+            return ("onu", onu)
+
+        return None
+
+    def correct(self, si, correction):
+        (kind, detail) = correction
+        if kind == "onu":
+            self.log.info("Reconciler: correcting ONUDevice admin_state", onu_device=detail.serial_number,
+                          admin_state=detail.admin_state, expected=si.admin_onu_state)
+            detail.admin_state = si.admin_onu_state
+            detail.save_changed_fields(always_update_timestamp=True)
+            reconciled_onus.inc()
+        else:
+            self.log.info("Reconciler: running the model_policy of the SI again", si=si, reason=detail)
+            # all the stages have to run, not only the ones whose inputs have changed
+            policy_state_cache.remove(si.id)
+            si.save(update_fields=["updated"], always_update_timestamp=True)
+            reconciled_sis.inc()
+
+    def sweep(self):
+        """
+        :return: the number of corrections of each kind, and whether the sweep has been completed
+        """
+        start = time.time()
+        snapshot = Snapshot(self.model_accessor)
+        # the model_policies have to validate the SIs against the same whitelist, or they would be corrected again
+        # at every sweep (eg: the delete policy of an entry has not been called)
+        whitelist_index.replace(snapshot.whitelist_entries, snapshot.time)
+        stats = {"sis": len(snapshot.sis), "si": 0, "onu": 0, "completed": True}
+
+        delay = 1.0 / self.max_corrections_per_second if self.max_corrections_per_second else 0
+        for si in snapshot.sis:
+            if not self.settled(snapshot, si):
+                continue
+            correction = self.check(snapshot, si)
+            if correction is None:
+                continue
+            if time.time() - start > self.time_budget:
+                stats["completed"] = False
+                break
+            self.correct(si, correction)
+            stats[correction[0]] += 1
+            time.sleep(delay)
+
+        reconciliation_seconds.set(time.time() - start)
+        self.log.info("Reconciler: sweep done", elapsed="%.1fs" % (time.time() - start), **stats)
+        return stats
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception:
+                self.log.exception("Reconciler: exception while reconciling the SIs")
+
+
+reconciler = Reconciler()
@@ -0,0 +1,39 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Tunables of the event path, read from the environment of the synchronizer container.
+# NOTE they can't go in the synchronizer config, as xosconfig rejects the keys that are not in its schema.
+
+import os
+
+
+def env_int(name, default):
+    """
+    :return: the value of the environment variable name as an int, or default if it is not set
+    """
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("%s must be an integer, got '%s'" % (name, value))
+
+
+EVENT_BATCH_SIZE = env_int("ATT_WORKFLOW_DRIVER_EVENT_BATCH_SIZE", 0)
+COALESCE_WINDOW_MS = env_int("ATT_WORKFLOW_DRIVER_COALESCE_WINDOW_MS", 0)
+DISPATCH_WINDOW_MS = env_int("ATT_WORKFLOW_DRIVER_DISPATCH_WINDOW_MS", 0)
+EVENT_WORKERS = env_int("ATT_WORKFLOW_DRIVER_EVENT_WORKERS", 0)
+EVENT_QUEUE_SIZE = env_int("ATT_WORKFLOW_DRIVER_EVENT_QUEUE_SIZE", 1000)
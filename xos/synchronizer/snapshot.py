@@ -0,0 +1,185 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import os
+import threading
+import time
+
+try:
+    # ujson is optional, it's considerably faster than the json module of python 2
+    import ujson as json
+except ImportError:
+    import json
+
+from caches import onu_device_cache, subscriber_index, service_instance_index
+import metrics
+
+snapshot_seconds = metrics.gauge(
+    "att_workflow_driver_snapshot_seconds",
+    "Time taken to restore the caches from the snapshot when the synchronizer has started")
+
+# bump when the content of the snapshot changes, snapshots of other versions are ignored
+SNAPSHOT_VERSION = 1
+
+
+def catch_up_onu_devices(model_accessor, since):
+    onus = model_accessor.ONUDevice.objects.filter(updated__gte=since)
+    for onu in onus:
+        onu_device_cache.update(onu)
+    return len(onus)
+
+
+def catch_up_subscribers(model_accessor, since):
+    subscribers = model_accessor.RCORDSubscriber.objects.filter(updated__gte=since)
+    for subscriber in subscribers:
+        subscriber_index.update(subscriber)
+    return len(subscribers)
+
+
+def catch_up_service_instances(model_accessor, since):
+    sis = model_accessor.AttWorkflowDriverServiceInstance.objects.filter(updated__gte=since)
+    for si in sis:
+        service_instance_index.update(si)
+    return len(sis)
+
+
+# name (as in warmup.LOADERS) -> (cache, function applying the objects updated since a time to the cache)
+SNAPSHOTS = {
+    "onu_devices": (onu_device_cache, catch_up_onu_devices),
+    "subscribers": (subscriber_index, catch_up_subscribers),
+    "service_instances": (service_instance_index, catch_up_service_instances),
+}
+
+
+class StateSnapshot(object):
+    """
+    Saves the ids held by the caches to disk, so that after a restart they are restored and brought up to date
+    with the objects updated since the snapshot has been saved, instead of scanning all the models again.
+
+    Only the caches that verify what they return are saved (a stale id costs a lookup, never a wrong answer),
+    the whitelist is always loaded from the core, as a deleted entry would still validate its ONU.
+    The snapshot is saved every interval seconds, by a thread that is started with the synchronizer
+    (see warmup.start_tasks). Snapshots older than max_age seconds are ignored.
+    """
+
+    # set path to None to disable the snapshot
+    path = "/var/lib/att-workflow-driver/snapshot.json"
+    interval = 300
+    max_age = 86400
+    # the objects updated since the snapshot has been saved are read again, allow for the clock of the core
+    clock_skew = 600
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.thread = None
+        self.model_accessor = None
+        self.log = None
+
+    def start(self, model_accessor, log):
+        with self.lock:
+            self.model_accessor = model_accessor
+            self.log = log
+            if self.thread is not None or not self.path:
+                return
+            self.thread = threading.Thread(target=self.run, name="state-snapshot")
+            self.thread.daemon = True
+        self.thread.start()
+
+    def save(self):
+        """
+        :return: the names of the caches that have been saved
+        """
+        snapshot = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "caches": {}}
+        for (name, (cache, catch_up)) in SNAPSHOTS.items():
+            state = cache.dump()
+            if state is not None:
+                snapshot["caches"][name] = state
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # the snapshot is replaced at once, a restart while it's being written finds the previous one
+        tmp = "%s.tmp" % self.path
+        with open(tmp, "w") as f:
+            f.write(json.dumps(snapshot))
+        os.rename(tmp, self.path)
+        return sorted(snapshot["caches"].keys())
+
+    def read(self, log):
+        """
+        :return: the snapshot, or None if there is no usable snapshot
+        """
+        if not self.path or not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                snapshot = json.loads(f.read())
+        except Exception:
+            log.exception("Snapshot: failed to read, ignoring it", path=self.path)
+            return None
+
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            log.info("Snapshot: saved by another version, ignoring it", path=self.path)
+            return None
+        age = time.time() - snapshot.get("saved_at", 0)
+        if age > self.max_age:
+            log.info("Snapshot: too old, ignoring it", path=self.path, age="%ds" % age)
+            return None
+        return snapshot
+
+    def restore(self, model_accessor, log):
+        """
+        Restores the caches from the snapshot and applies the objects that have been updated since it was saved.
+        A cache that fails to catch up is cleared, it will be loaded as it would be without the snapshot.
+
+        :return: dict of {name: objects updated since the snapshot}, for the caches that have been restored
+        """
+        start = time.time()
+        snapshot = self.read(log)
+        if snapshot is None:
+            return {}
+
+        # NOTE updated is compared as an integer, as the filters of the core only carry integers and strings
+        since = int(snapshot["saved_at"] - self.clock_skew)
+        restored = {}
+        for (name, state) in snapshot["caches"].items():
+            if name not in SNAPSHOTS:
+                continue
+            (cache, catch_up) = SNAPSHOTS[name]
+            try:
+                cache.restore(state)
+                restored[name] = catch_up(model_accessor, since)
+            except Exception:
+                log.exception("Snapshot: failed to restore %s, it will be loaded from the core" % name)
+                cache.clear()
+                restored.pop(name, None)
+
+        elapsed = time.time() - start
+        snapshot_seconds.set(elapsed)
+        log.info("Snapshot: caches restored", path=self.path, elapsed="%.1fs" % elapsed,
+                 **dict((name, "%s objects updated" % objects) for (name, objects) in restored.items()))
+        return restored
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.save()
+            except Exception:
+                self.log.exception("Snapshot: exception while saving the caches", path=self.path)
+
+
+state_snapshot = StateSnapshot()
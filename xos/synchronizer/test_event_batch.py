@@ -0,0 +1,98 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import Mock, patch
+import threading
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestEventCoalescer(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from event_batch import EventCoalescer
+        from helpers import AttHelpers
+        # don't start the coalescing thread, the test drives take_expired and flush
+        self.coalescer = type("TestCoalescer", (EventCoalescer,), {"window_ms": 60000, "run": lambda self: None})(
+            Mock(), Mock())
+
+        # what has been applied to the SI, in order
+        self.applied = []
+        self.patcher = patch.object(AttHelpers, "process_coalesced_events", side_effect=self.process_coalesced_events)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        sys.path = self.sys_path_save
+
+    def process_coalesced_events(self, model_accessor, log, events):
+        self.applied += [changes for (event, changes) in events]
+        return 1
+
+    def auth_event(self, state, serial_number="BRCM1234"):
+        return ({"serialNumber": serial_number, "authenticationState": state}, {"authentication_state": state})
+
+    def test_disable_reenable(self):
+        # the subscriber is approved, then the ONU is disabled and re-enabled within the window
+        self.coalescer.add(*self.auth_event("APPROVED"))
+        self.coalescer.add(*self.auth_event("APPROVED", serial_number="BRCM5678"))
+
+        # each onu.events is applied after the events held for its ONU
+        self.coalescer.flush("brcm1234")
+        self.applied.append({"oper_onu_status": "DISABLED"})
+        self.coalescer.flush("BRCM1234")
+        self.applied.append({"oper_onu_status": "ENABLED"})
+
+        # the re-enabled ONU has to authenticate again
+        self.assertEqual(self.applied, [
+            {"authentication_state": "APPROVED"},
+            {"oper_onu_status": "DISABLED"},
+            {"oper_onu_status": "ENABLED"},
+        ])
+        # the events of the other ONUs are still held
+        self.assertEqual(self.coalescer.stats(), {"received": 2, "saves": 1, "pending": 1})
+
+    def test_flush_waits(self):
+        self.coalescer.window = 0
+        self.coalescer.add(*self.auth_event("APPROVED"))
+        [(serial_number, events)] = self.coalescer.take_expired()
+
+        flushed = threading.Event()
+
+        def flush():
+            self.coalescer.flush("BRCM1234")
+            flushed.set()
+        flusher = threading.Thread(target=flush)
+        flusher.daemon = True
+        flusher.start()
+
+        # the events taken by the coalescing thread are applied before the onu.events
+        self.assertFalse(flushed.wait(0.1))
+        self.coalescer.apply(serial_number, events)
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual(self.applied, [{"authentication_state": "APPROVED"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+from mock import Mock
+import threading
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestEventDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from event_dispatcher import EventDispatcher, parse_timestamp
+        self.EventDispatcher = EventDispatcher
+        self.parse_timestamp = parse_timestamp
+
+        self.onu_step = Mock(name="onu")
+        self.auth_step = Mock(name="auth")
+        self.dhcp_step = Mock(name="dhcp")
+
+        self.onu_event = {
+            "timestamp": "2018-09-11T01:00:49.506Z",
+            "status": "activated",
+            "serialNumber": "BRCM1234",
+            "portNumber": "16",
+            "deviceId": "of:000000000a5a0072",
+        }
+        self.auth_event = {
+            "timestamp": "2018-09-11T01:00:50.100Z",
+            "deviceId": "of:000000000a5a0072",
+            "portNumber": "16",
+            "serialNumber": "brcm1234",
+            "authenticationState": "APPROVED",
+        }
+        self.dhcp_event = {
+            "deviceId": "of:000000000a5a0072",
+            "portNumber": "16",
+            "macAddress": "90:e2:ba:82:fa:81",
+            "ipAddress": "10.11.1.1",
+            "serialNumber": "BRCM1234",
+            "messageType": "DHCPACK",
+        }
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def create_dispatcher(self, **kwargs):
+        # don't start the dispatching thread, the test drives take_expired and sort
+        attrs = {"window_ms": 1000, "run": lambda self: None}
+        attrs.update(kwargs)
+        return type("TestDispatcher", (self.EventDispatcher,), attrs)(Mock())
+
+    def test_disabled_by_default(self):
+        self.assertFalse(self.EventDispatcher.enabled())
+
+    def test_parse_timestamp(self):
+        self.assertEqual(self.parse_timestamp({"timestamp": "2018-09-11T01:00:49.506Z"}), 1536627649.506)
+        self.assertEqual(self.parse_timestamp({"timestamp": "2018-09-11T01:00:49Z"}), 1536627649)
+        self.assertEqual(self.parse_timestamp({"timestamp": "yesterday"}), None)
+        self.assertEqual(self.parse_timestamp({}), None)
+
+    def test_reorder(self):
+        dispatcher = self.create_dispatcher(window_ms=0.001)
+
+        # authentication is received before the ONU activation, dhcp has no timestamp
+        dispatcher.add(self.auth_step, self.auth_event)
+        dispatcher.add(self.onu_step, self.onu_event)
+        dispatcher.add(self.dhcp_step, self.dhcp_event)
+
+        expired = dispatcher.take_expired()
+        self.assertEqual(len(expired), 1)
+
+        ordered = [(step, value) for (timestamp, seq, step, value) in dispatcher.sort(expired[0])]
+        self.assertEqual(ordered, [
+            (self.onu_step, self.onu_event),
+            (self.auth_step, self.auth_event),
+            (self.dhcp_step, self.dhcp_event),
+        ])
+        self.assertEqual(dispatcher.stats(), {"received": 3, "reordered": 1, "pending": 0})
+
+    def test_untimestamped(self):
+        dispatcher = self.create_dispatcher(window_ms=0.001)
+
+        # dhcp has no timestamp, it stays where it has been received and the other events are sorted around it
+        auth_event = dict(self.auth_event, timestamp="2018-09-11T01:00:50.100Z")
+        onu_event = dict(self.onu_event, timestamp="2018-09-11T01:00:49.506Z")
+        dispatcher.add(self.auth_step, auth_event)
+        dispatcher.add(self.dhcp_step, self.dhcp_event)
+        dispatcher.add(self.onu_step, onu_event)
+
+        ordered = [(e[2], e[3]) for e in dispatcher.sort(dispatcher.take_expired()[0])]
+        self.assertEqual(ordered, [
+            (self.onu_step, onu_event),
+            (self.dhcp_step, self.dhcp_event),
+            (self.auth_step, auth_event),
+        ])
+
+    def test_in_order(self):
+        dispatcher = self.create_dispatcher(window_ms=0.001)
+
+        dispatcher.add(self.onu_step, self.onu_event)
+        dispatcher.add(self.auth_step, self.auth_event)
+        dispatcher.add(self.dhcp_step, self.dhcp_event)
+
+        events = dispatcher.take_expired()[0]
+        self.assertEqual(dispatcher.sort(events), events)
+        self.assertEqual(dispatcher.stats()["reordered"], 0)
+
+    def test_hold_window(self):
+        dispatcher = self.create_dispatcher(window_ms=200)
+
+        dispatcher.add(self.onu_step, self.onu_event)
+
+        # nothing is dispatched before the window expires
+        self.assertEqual(dispatcher.take_expired(), [])
+        self.assertEqual(dispatcher.stats()["pending"], 1)
+
+    def test_max_pending(self):
+        dispatcher = self.create_dispatcher(window_ms=60000, max_pending=2)
+
+        dispatcher.add(self.onu_step, dict(self.onu_event, serialNumber="BRCM1"))
+        dispatcher.add(self.onu_step, dict(self.onu_event, serialNumber="BRCM2"))
+        dispatcher.add(self.onu_step, dict(self.onu_event, serialNumber="BRCM3"))
+
+        # the oldest ONU is dispatched early to stay within max_pending
+        expired = dispatcher.take_expired()
+        self.assertEqual([[e[3]["serialNumber"] for e in events] for events in expired], [["BRCM1"]])
+        self.assertEqual(dispatcher.stats()["pending"], 2)
+
+    def test_dispatch(self):
+        dispatcher = type("TestDispatcher", (self.EventDispatcher,), {"window_ms": 200})(Mock())
+        done = threading.Event()
+        dispatched = []
+        self.onu_step.handle_value.side_effect = lambda value: dispatched.append(value)
+        self.auth_step.handle_value.side_effect = lambda value: (dispatched.append(value), done.set())
+
+        dispatcher.add(self.auth_step, self.auth_event)
+        dispatcher.add(self.onu_step, self.onu_event)
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(dispatched, [self.onu_event, self.auth_event])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+import json
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestEventSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from event_schema import decode_event, InvalidEvent, invalid_events
+        self.decode_event = decode_event
+        self.InvalidEvent = InvalidEvent
+        self.invalid_events = invalid_events
+
+        self.onu_event = {
+            "timestamp": "2018-09-11T01:00:49.506Z",
+            "status": "activated",
+            "serialNumber": "BRCM1234",
+            "portNumber": "16",
+            "deviceId": "of:000000000a5a0072",
+        }
+        self.dhcp_event = {
+            "deviceId": "of:000000000a5a0072",
+            "portNumber": "16",
+            "macAddress": "90:e2:ba:82:fa:81",
+            "ipAddress": "10.11.1.1",
+            "serialNumber": "BRCM1234",
+            "messageType": "DHCPACK",
+        }
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_valid(self):
+        self.assertEqual(self.decode_event("onu.events", json.dumps(self.onu_event)), self.onu_event)
+        self.assertEqual(self.decode_event("dhcp.events", json.dumps(self.dhcp_event)), self.dhcp_event)
+
+    def test_extract(self):
+        value = self.decode_event("onu.events", json.dumps(dict(self.onu_event, extra="ignored")))
+        self.assertEqual(value, self.onu_event)
+
+    def test_integer_port(self):
+        value = self.decode_event("onu.events", json.dumps(dict(self.onu_event, portNumber=16)))
+        self.assertEqual(value["portNumber"], 16)
+
+    def test_missing_field(self):
+        del self.dhcp_event["ipAddress"]
+        with self.assertRaises(self.InvalidEvent) as e:
+            self.decode_event("dhcp.events", json.dumps(self.dhcp_event))
+        self.assertEqual(str(e.exception), "dhcp.events: missing ipAddress")
+
+    def test_invalid_field(self):
+        with self.assertRaises(self.InvalidEvent) as e:
+            self.decode_event("onu.events", json.dumps(dict(self.onu_event, portNumber="uni-16")))
+        self.assertEqual(str(e.exception), "onu.events: invalid portNumber u'uni-16'")
+
+    def test_not_json(self):
+        invalid = self.invalid_events.value
+        with self.assertRaises(self.InvalidEvent):
+            self.decode_event("authentication.events", "{not json")
+        with self.assertRaises(self.InvalidEvent):
+            self.decode_event("authentication.events", "[]")
+        self.assertEqual(self.invalid_events.value, invalid + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+from mock import Mock, patch
+import threading
+import time
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class FakeStep(object):
+    def __init__(self, name, processed, delay=0):
+        self.name = name
+        self.processed = processed
+        self.delay = delay
+
+    def process_value(self, value):
+        time.sleep(self.delay)
+        self.processed.append((self.name, value["serialNumber"], value["seq"], threading.current_thread().name))
+
+
+class TestEventWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from event_workers import EventWorkerPool
+        self.EventWorkerPool = EventWorkerPool
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.stop()
+        sys.path = self.sys_path_save
+
+    def create_pool(self, workers, queue_size=1000):
+        pool_class = type("TestPool", (self.EventWorkerPool,), {"workers": workers, "queue_size": queue_size})
+        pool = pool_class(Mock())
+        self.pools.append(pool)
+        return pool
+
+    def test_disabled_by_default(self):
+        self.assertFalse(self.EventWorkerPool.enabled())
+
+    def test_check_options(self):
+        from event_workers import check_options
+        from event_batch import EventCoalescer
+        from event_dispatcher import EventDispatcher
+
+        check_options()
+        check_options(batch_size=10)
+
+        with patch.object(self.EventWorkerPool, "workers", 4):
+            check_options()
+            with patch.object(EventCoalescer, "window_ms", 100):
+                with self.assertRaises(ValueError):
+                    check_options()
+            # the batches would be processed without the pool
+            with self.assertRaises(ValueError):
+                check_options(batch_size=10)
+
+        with patch.object(EventDispatcher, "window_ms", 100):
+            # the dispatcher hands the events of an ONU over to the pool in order
+            with patch.object(self.EventWorkerPool, "workers", 4):
+                check_options()
+            with self.assertRaises(ValueError):
+                check_options(batch_size=10)
+            with patch.object(EventCoalescer, "window_ms", 100):
+                with self.assertRaises(ValueError) as e:
+                    check_options(batch_size=10)
+                # all the incompatible options are reported at once
+                self.assertEqual(str(e.exception).count("can't be set together"), 2)
+
+    def test_shard_is_case_insensitive(self):
+        pool = self.create_pool(4)
+        self.assertEqual(pool.shard("BRCM1234"), pool.shard("brcm1234"))
+
+    def test_per_serial_ordering(self):
+        pool = self.create_pool(4)
+        processed = []
+        steps = [FakeStep(topic, processed, delay=0.001) for topic in ["onu", "auth", "dhcp"]]
+
+        for seq in range(30):
+            for serial_number in ["BRCM1", "BRCM2", "BRCM3", "BRCM4", "BRCM5"]:
+                pool.add(steps[seq % 3], {"serialNumber": serial_number, "seq": seq})
+        pool.join()
+
+        self.assertEqual(len(processed), 150)
+        for serial_number in ["BRCM1", "BRCM2", "BRCM3", "BRCM4", "BRCM5"]:
+            events = [p for p in processed if p[1] == serial_number]
+            # events of the same ONU are processed in order, across topics, by a single worker
+            self.assertEqual([p[2] for p in events], range(30))
+            self.assertEqual([p[0] for p in events], [["onu", "auth", "dhcp"][seq % 3] for seq in range(30)])
+            self.assertEqual(len(set(p[3] for p in events)), 1)
+
+    def test_parallel(self):
+        pool = self.create_pool(8)
+        processed = []
+        step = FakeStep("onu", processed, delay=0.05)
+
+        start = time.time()
+        for i in range(8):
+            # pick serial numbers that land on different workers
+            serial_number = next("BRCM%d" % n for n in range(1000) if pool.shard("BRCM%d" % n) == i)
+            pool.add(step, {"serialNumber": serial_number, "seq": 0})
+        pool.join()
+
+        self.assertEqual(len(processed), 8)
+        self.assertLess(time.time() - start, 0.05 * 4)
+
+    def test_exception(self):
+        pool = self.create_pool(1)
+        processed = []
+        failing = Mock()
+        failing.process_value.side_effect = Exception("boom")
+
+        pool.add(failing, {"serialNumber": "BRCM1", "seq": 0})
+        pool.add(FakeStep("onu", processed), {"serialNumber": "BRCM1", "seq": 1})
+        pool.join()
+
+        # an event failing doesn't stop the worker
+        self.assertEqual([p[2] for p in processed], [1])
+        pool.log.exception.assert_called()
+
+    def test_queue_bound(self):
+        pool = self.create_pool(1, queue_size=2)
+        processed = []
+        blocker = threading.Event()
+        step = Mock()
+        step.process_value.side_effect = lambda value: blocker.wait()
+
+        pool.add(step, {"serialNumber": "BRCM1", "seq": 0})
+        pool.add(step, {"serialNumber": "BRCM1", "seq": 1})
+        pool.add(step, {"serialNumber": "BRCM1", "seq": 2})
+
+        adder = threading.Thread(
+            target=pool.add, args=(FakeStep("onu", processed), {"serialNumber": "BRCM1", "seq": 3}))
+        adder.daemon = True
+        adder.start()
+        adder.join(0.1)
+        # the queue is full, so the producer is blocked
+        self.assertTrue(adder.is_alive())
+
+        blocker.set()
+        adder.join()
+        pool.join()
+        self.assertEqual([p[2] for p in processed], [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
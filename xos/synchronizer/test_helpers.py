@@ -15,12 +15,28 @@
 import unittest
 from mock import patch, call, Mock, PropertyMock
 import json
+import time
 
 import os, sys
 
 test_path=os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 
 
+def filter_iexact(objects):
+    """
+    The mock model accessor only implements exact matches, this adds the __iexact lookups done by the caches
+    """
+    def filter(**kwargs):
+        items = objects.get_items()
+        for (k, v) in kwargs.items():
+            if k.endswith("__iexact"):
+                items = [x for x in items if (getattr(x, k[:-len("__iexact")]) or "").lower() == v.lower()]
+            else:
+                items = [x for x in items if getattr(x, k) == v]
+        return items
+    return filter
+
+
 class TestAttHelpers(unittest.TestCase):
 
     def setUp(self):
@@ -50,6 +66,11 @@ class TestAttHelpers(unittest.TestCase):
         from xossynchronizer.modelaccessor import model_accessor
         from helpers import AttHelpers
 
+        from caches import clear_caches, whitelist_index, onu_device_cache
+        clear_caches()
+        self.onu_device_cache = onu_device_cache
+        self.whitelist_index = whitelist_index
+
         # import all class names to globals
         for (k, v) in model_accessor.all_model_classes.items():
             globals()[k] = v
@@ -57,6 +78,9 @@ class TestAttHelpers(unittest.TestCase):
         self.helpers = AttHelpers
         self.model_accessor = model_accessor
 
+        self.onu_filter = patch.object(ONUDevice.objects, "filter", filter_iexact(ONUDevice.objects))
+        self.onu_filter.start()
+
         self._volt = VOLTService()
         self._volt.id = 1
 
@@ -89,6 +113,7 @@ class TestAttHelpers(unittest.TestCase):
 
 
     def tearDown(self):
+        self.onu_filter.stop()
         sys.path = self.sys_path_save
 
     def test_not_in_whitelist(self):
@@ -159,5 +184,232 @@ class TestAttHelpers(unittest.TestCase):
             self.assertTrue(res)
             self.assertEqual(message, "ONU has been validated")
 
+    def test_whitelist_loaded_once(self):
+        with patch.object(AttWorkflowDriverWhiteListEntry.objects, "get_items") as whitelist_mock, \
+            patch.object(ONUDevice.objects, "get_items") as onu_mock:
+            whitelist_mock.return_value = [self.whitelist_entry]
+            onu_mock.return_value = [self.onu]
+
+            self.helpers.validate_onu(self.model_accessor, self.log, self.att_si)
+            [res, message] = self.helpers.validate_onu(self.model_accessor, self.log, self.att_si)
+
+            self.assertTrue(res)
+            self.assertEqual(whitelist_mock.call_count, 1)
+
+    def test_whitelist_index_update(self):
+        with patch.object(AttWorkflowDriverWhiteListEntry.objects, "get_items") as whitelist_mock, \
+            patch.object(ONUDevice.objects, "get_items") as onu_mock:
+            whitelist_mock.return_value = []
+            onu_mock.return_value = [self.onu]
+
+            [res, message] = self.helpers.validate_onu(self.model_accessor, self.log, self.att_si)
+            self.assertEqual(message, "ONU not found in whitelist")
+
+            self.whitelist_index.update(self.whitelist_entry)
+            [res, message] = self.helpers.validate_onu(self.model_accessor, self.log, self.att_si)
+            self.assertEqual(message, "ONU has been validated")
+
+            self.whitelist_index.remove(self.whitelist_entry)
+            [res, message] = self.helpers.validate_onu(self.model_accessor, self.log, self.att_si)
+            self.assertEqual(message, "ONU not found in whitelist")
+
+            self.assertEqual(whitelist_mock.call_count, 1)
+
+    def test_whitelist_index_ttl(self):
+        with patch.object(AttWorkflowDriverWhiteListEntry.objects, "get_items") as whitelist_mock:
+            whitelist_mock.return_value = [self.whitelist_entry]
+            self.assertEqual(
+                self.whitelist_index.get(self.model_accessor, self.volt.id, "brcm1234"), self.whitelist_entry)
+
+            # the entry has been deleted, but its delete policy has not been called
+            whitelist_mock.return_value = []
+            with patch("time.time", return_value=time.time() + self.whitelist_index.ttl + 1):
+                self.assertEqual(self.whitelist_index.get(self.model_accessor, self.volt.id, "brcm1234"), None)
+            self.assertEqual(whitelist_mock.call_count, 2)
+
+    def test_whitelist_index_serial_change(self):
+        with patch.object(AttWorkflowDriverWhiteListEntry.objects, "get_items") as whitelist_mock:
+            whitelist_mock.return_value = [self.whitelist_entry]
+
+            self.assertEqual(
+                self.whitelist_index.get(self.model_accessor, self.volt.id, "brcm1234"), self.whitelist_entry)
+
+            self.whitelist_entry.serial_number = "BRCM5678"
+            self.whitelist_index.update(self.whitelist_entry)
+
+            self.assertEqual(self.whitelist_index.get(self.model_accessor, self.volt.id, "brcm1234"), None)
+            self.assertEqual(
+                self.whitelist_index.get(self.model_accessor, self.volt.id, "brcm5678"), self.whitelist_entry)
+
+    def test_get_onu_device_keyed(self):
+        self.onu.id = 10
+        with patch.object(ONUDevice.objects, "all") as onu_all, \
+            patch.object(ONUDevice.objects, "filter") as onu_filter, \
+            patch.object(ONUDevice.objects, "get") as onu_get:
+            onu_filter.return_value = [self.onu]
+            onu_get.return_value = self.onu
+
+            self.assertEqual(self.helpers.get_onu_device(self.model_accessor, "BRCM1234"), self.onu)
+            self.assertEqual(self.helpers.get_onu_device(self.model_accessor, "brcm1234"), self.onu)
+            self.assertEqual(self.helpers.get_onu_device(self.model_accessor, "BRCM1234"), self.onu)
+
+            # a miss is a keyed lookup, not a scan of the ONUDevices
+            onu_all.assert_not_called()
+            onu_filter.assert_called_once_with(serial_number__iexact="brcm1234")
+            self.assertEqual(onu_get.call_count, 2)
+            onu_get.assert_called_with(id=10)
+
+    def test_get_onu_device_negative_ttl(self):
+        with patch.object(ONUDevice.objects, "get_items") as onu_mock, \
+            patch("caches.time.time") as now:
+            onu_mock.return_value = []
+            now.return_value = 1000
+
+            with self.assertRaises(Exception):
+                self.helpers.get_onu_device(self.model_accessor, "BRCM1234")
+
+            # the ONUDevice is created, but we remember the miss for a while
+            onu_mock.return_value = [self.onu]
+            now.return_value = 1000 + self.onu_device_cache.negative_ttl - 1
+            with self.assertRaises(Exception):
+                self.helpers.get_onu_device(self.model_accessor, "BRCM1234")
+            self.assertEqual(onu_mock.call_count, 1)
+
+            now.return_value = 1000 + self.onu_device_cache.negative_ttl
+            self.assertEqual(self.helpers.get_onu_device(self.model_accessor, "BRCM1234"), self.onu)
+
+    def test_get_onu_device_removed(self):
+        self.onu.id = 10
+        other_onu = ONUDevice(id=10, serial_number="BRCM5678")
+        with patch.object(ONUDevice.objects, "get_items") as onu_mock:
+            onu_mock.return_value = [self.onu]
+            self.helpers.get_onu_device(self.model_accessor, "BRCM1234")
+
+            # the device has been replaced, the id does not point to the same serial number anymore
+            onu_mock.return_value = [other_onu]
+            with self.assertRaises(Exception) as e:
+                self.helpers.get_onu_device(self.model_accessor, "BRCM1234")
+            self.assertEqual(e.exception.message, "ONU device BRCM1234 is not know to XOS yet")
+
+    def test_get_att_si_normalized(self):
+        self.att_si.normalized_serial_number = "brcm1234"
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as si_mock:
+            si_mock.return_value = [self.att_si]
+
+            self.assertEqual(self.helpers.get_att_si(self.model_accessor, "brcm1234"), self.att_si)
+            self.assertEqual(self.helpers.get_att_si(self.model_accessor, "BRCM1234"), self.att_si)
+
+    def test_get_att_si_not_normalized(self):
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as si_mock:
+            si_mock.return_value = [self.att_si]
+
+            self.assertEqual(self.helpers.get_att_si(self.model_accessor, "BRCM1234"), self.att_si)
+            with self.assertRaises(IndexError):
+                self.helpers.get_att_si(self.model_accessor, "BRCM5678")
+
+    def test_owner_not_fetched(self):
+        # the whitelist is looked up by the owner_id of the SI, the owner service itself is not needed
+        self.volt.leaf_model = None
+
+        with patch.object(AttWorkflowDriverWhiteListEntry.objects, "get_items") as whitelist_mock, \
+            patch.object(ONUDevice.objects, "get_items") as onu_mock:
+            whitelist_mock.return_value = [self.whitelist_entry]
+            onu_mock.return_value = [self.onu]
+
+            [res, message] = self.helpers.validate_onu(self.model_accessor, self.log, self.att_si)
+
+            self.assertTrue(res)
+            self.assertEqual(message, "ONU has been validated")
+
+    def test_process_event_batch(self):
+        self.att_si.normalized_serial_number = "brcm1234"
+        other_si = AttWorkflowDriverServiceInstance(
+            serial_number="BRCM5678",
+            normalized_serial_number="brcm5678",
+            owner=self.volt,
+            owner_id=self.volt.id,
+            of_dpid="of:1234"
+        )
+        events = [
+            {"serialNumber": "BRCM1234", "authenticationState": "STARTED"},
+            {"serialNumber": "BRCM5678", "authenticationState": "STARTED"},
+            {"serialNumber": "BRCM1234", "authenticationState": "STARTED"},
+        ]
+        get_si_changes = lambda e: {"authentication_state": e["authenticationState"]}
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as si_mock, \
+            patch.object(self.att_si, "save") as si_save, \
+            patch.object(other_si, "save") as other_si_save:
+            si_mock.return_value = [self.att_si, other_si]
+
+            self.helpers.process_event_batch(self.model_accessor, self.log, events, get_si_changes)
+
+            # each SI is looked up and saved once
+            self.assertEqual(si_mock.call_count, 2)
+            si_save.assert_called_once()
+            other_si_save.assert_called_once()
+            self.assertEqual(self.att_si.authentication_state, "STARTED")
+            self.assertEqual(other_si.authentication_state, "STARTED")
+
+    def test_process_event_batch_transitions(self):
+        self.att_si.normalized_serial_number = "brcm1234"
+        events = [
+            {"serialNumber": "BRCM1234", "authenticationState": "STARTED"},
+            {"serialNumber": "BRCM1234", "authenticationState": "APPROVED"},
+        ]
+        get_si_changes = lambda e: {"authentication_state": e["authenticationState"]}
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as si_mock, \
+            patch.object(self.att_si, "save") as si_save:
+            si_mock.return_value = [self.att_si]
+
+            self.helpers.process_event_batch(self.model_accessor, self.log, events, get_si_changes)
+
+            # the STARTED state is saved before being overridden
+            self.assertEqual(si_save.call_count, 2)
+            self.assertEqual(self.att_si.authentication_state, "APPROVED")
+
+    def test_process_coalesced_events(self):
+        self.att_si.authentication_state = "AWAITING"
+        event = {"serialNumber": "BRCM1234"}
+        events = [
+            (event, {"authentication_state": "STARTED"}),
+            (event, {"authentication_state": "APPROVED"}),
+            (event, {"dhcp_state": "DHCPDISCOVER", "ip_address": "", "mac_address": "4321"}),
+            (event, {"dhcp_state": "DHCPACK", "ip_address": "10.11.2.23", "mac_address": "4321"}),
+        ]
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as si_mock, \
+            patch.object(self.att_si, "save") as si_save:
+            si_mock.return_value = [self.att_si]
+
+            saves = self.helpers.process_coalesced_events(self.model_accessor, self.log, events)
+
+            self.assertEqual(saves, 1)
+            si_save.assert_called_once()
+            self.assertEqual(self.att_si.authentication_state, "APPROVED")
+            self.assertEqual(self.att_si.dhcp_state, "DHCPACK")
+            self.assertEqual(self.att_si.ip_address, "10.11.2.23")
+
+    def test_process_coalesced_events_reauthentication(self):
+        self.att_si.authentication_state = "APPROVED"
+        event = {"serialNumber": "BRCM1234"}
+        events = [
+            (event, {"authentication_state": "STARTED"}),
+            (event, {"authentication_state": "APPROVED"}),
+        ]
+        saved_states = []
+
+        with patch.object(AttWorkflowDriverServiceInstance.objects, "get_items") as si_mock, \
+            patch.object(self.att_si, "save") as si_save:
+            si_mock.return_value = [self.att_si]
+            si_save.side_effect = lambda **kwargs: saved_states.append(self.att_si.authentication_state)
+
+            saves = self.helpers.process_coalesced_events(self.model_accessor, self.log, events)
+
+            # the model_policy needs to see the SI going through re-authentication
+            self.assertEqual(saves, 2)
+            self.assertEqual(saved_states, ["STARTED", "APPROVED"])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,213 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import Mock
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class FakeManager(object):
+    """
+    In memory objects manager, that counts the reads that would go to the core
+    """
+
+    def __init__(self, reads, model_name):
+        self.reads = reads
+        self.model_name = model_name
+        self.items = []
+
+    def count(self):
+        self.reads[self.model_name] = self.reads.get(self.model_name, 0) + 1
+
+    def matching(self, kwargs):
+        def match(i, k, v):
+            if k.endswith("__iexact"):
+                return getattr(i, k[:-len("__iexact")]).lower() == v.lower()
+            return getattr(i, k) == v
+        return [i for i in self.items if all(match(i, k, v) for (k, v) in kwargs.items())]
+
+    def get(self, **kwargs):
+        self.count()
+        matching = self.matching(kwargs)
+        if not matching:
+            raise Exception("%s matching query does not exist" % self.model_name)
+        return matching[0]
+
+    def filter(self, **kwargs):
+        self.count()
+        return self.matching(kwargs)
+
+    def all(self):
+        self.count()
+        return list(self.items)
+
+    def first(self):
+        self.count()
+        return self.items[0] if self.items else None
+
+
+class FakeModel(object):
+    def __init__(self, reads, model_name):
+        self.objects = FakeManager(reads, model_name)
+
+    def __call__(self, **kwargs):
+        return Mock(id=None, **kwargs)
+
+
+class FakeModelAccessor(object):
+    def __init__(self):
+        self.reads = {}
+        for model_name in ["AttWorkflowDriverServiceInstance", "AttWorkflowDriverWhiteListEntry", "ONUDevice",
+                           "RCORDSubscriber", "RCORDIpAddress"]:
+            setattr(self, model_name, FakeModel(self.reads, model_name))
+
+
+class TestIdentityMap(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from identity_map import IdentityMap
+        self.model_accessor = FakeModelAccessor()
+        self.onus = [Mock(id=1, serial_number="BRCM1"), Mock(id=2, serial_number="BRCM2")]
+        self.model_accessor.ONUDevice.objects.items = self.onus
+        self.reads = IdentityMap(self.model_accessor)
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_get(self):
+        onu = self.reads.ONUDevice.objects.get(id=1)
+        self.assertIs(self.reads.ONUDevice.objects.get(id=1), onu)
+        self.assertEqual(self.model_accessor.reads, {"ONUDevice": 1})
+        self.assertEqual(self.reads.stats(), {"ONUDevice": 1})
+
+    def test_get_after_query(self):
+        onus = self.reads.ONUDevice.objects.all()
+        self.assertIs(self.reads.ONUDevice.objects.get(id=2), onus[1])
+        self.assertEqual(self.reads.ONUDevice.objects.filter(serial_number="BRCM1"), [onus[0]])
+        self.assertEqual(self.model_accessor.reads, {"ONUDevice": 2})
+
+    def test_identity(self):
+        onu = self.reads.ONUDevice.objects.get(id=1)
+        # the same object loaded by a query is the instance that is already in the map
+        self.model_accessor.ONUDevice.objects.items = [Mock(id=1, serial_number="BRCM1")]
+        self.assertIs(self.reads.ONUDevice.objects.all()[0], onu)
+
+    def test_missing(self):
+        with self.assertRaises(Exception):
+            self.reads.ONUDevice.objects.get(id=3)
+        with self.assertRaises(Exception):
+            self.reads.ONUDevice.objects.get(id=3)
+        self.assertEqual(self.model_accessor.reads, {"ONUDevice": 2})
+
+    def test_create(self):
+        ip = self.reads.RCORDIpAddress(ip="10.0.0.1")
+        self.assertEqual(ip.ip, "10.0.0.1")
+        self.assertEqual(self.model_accessor.reads, {})
+
+
+class TestPolicyReads(unittest.TestCase):
+    """
+    Counts the reads done by one run of AttWorkflowDriverServiceInstancePolicy
+    """
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+        sys.path.append(os.path.join(test_path, "model_policies"))
+
+        from xosconfig import Config
+        Config.clear()
+        Config.init(os.path.join(test_path, "test_config.yaml"), "synchronizer-config-schema.yaml")
+
+        from caches import clear_caches
+        from onu_waitlist import onu_waitlist
+        clear_caches()
+        onu_waitlist.clear()
+
+        from model_policy_att_workflow_driver_serviceinstance import AttWorkflowDriverServiceInstancePolicy
+
+        self.model_accessor = FakeModelAccessor()
+        self.policy = AttWorkflowDriverServiceInstancePolicy(model_accessor=self.model_accessor)
+
+        service = Mock(id=1)
+        self.si = Mock(
+            id=10, serial_number="BRCM1234", owner_id=1, owner=Mock(leaf_model=service),
+            of_dpid="of:0000000000000001", uni_port_id=16, status_message="",
+            admin_onu_state="AWAITING", oper_onu_status="ENABLED", authentication_state="APPROVED",
+            dhcp_state="DHCPACK", ip_address="10.11.1.1", mac_address="90:e2:ba:82:fa:81",
+        )
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.items = [
+            Mock(id=5, owner_id=1, serial_number="BRCM1234", pon_port_id=1, device_id="of:0000000000000001"),
+        ]
+        self.model_accessor.ONUDevice.objects.items = [
+            Mock(id=20, serial_number="BRCM1234", admin_state="DISABLED", pon_port=Mock(port_no=1)),
+        ]
+        self.model_accessor.RCORDSubscriber.objects.items = [
+            Mock(id=30, onu_device="BRCM1234", status="awaiting-auth"),
+        ]
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def run_policy(self):
+        self.model_accessor.reads.clear()
+        self.policy.handle_update(self.si)
+        return dict(self.model_accessor.reads)
+
+    def test_reads(self):
+        # first run, nothing is cached yet: every model is loaded once
+        self.assertEqual(self.run_policy(), {
+            "AttWorkflowDriverWhiteListEntry": 1,
+            "ONUDevice": 1,
+            "RCORDSubscriber": 1,
+            "RCORDIpAddress": 1,
+        })
+        self.assertEqual(self.si.admin_onu_state, "ENABLED")
+        self.model_accessor.ONUDevice.objects.items[0].save_changed_fields.assert_called_once_with(
+            always_update_timestamp=True)
+
+        # nothing has changed
+        self.assertEqual(self.run_policy(), {})
+
+        # the ONU is disabled: the ONUDevice is read once, even if both validate_onu and update_onu need it
+        self.si.oper_onu_status = "DISABLED"
+        self.assertEqual(self.run_policy(), {
+            "ONUDevice": 1,
+            "RCORDSubscriber": 1,
+        })
+        self.assertEqual(self.si.authentication_state, "AWAITING")
+
+    def test_reads_without_identity_map(self):
+        # the same run, bypassing the identity map, reads the ONUDevice twice
+        self.policy.reads = self.model_accessor
+        self.policy.process_onu_state(self.si)
+        self.policy.process_onu_state(self.si)
+        self.assertEqual(self.model_accessor.reads, {
+            "AttWorkflowDriverWhiteListEntry": 1,
+            "ONUDevice": 4,
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import Mock
+
+import os
+import socket
+import sys
+import urllib2
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        import metrics
+        self.metrics = metrics
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+        for name in ["att_workflow_driver_test_events", "att_workflow_driver_test_depth",
+                     "att_workflow_driver_test_seconds"]:
+            self.metrics.registry.pop(name, None)
+
+    def test_histogram(self):
+        histogram = self.metrics.histogram("att_workflow_driver_test_seconds", "Test histogram", buckets=[1, 0.1])
+
+        self.assertIs(self.metrics.histogram("att_workflow_driver_test_seconds", "Test histogram"), histogram)
+        for value in [0.05, 0.1, 0.5, 2]:
+            histogram.observe(value)
+        with self.assertRaises(ValueError):
+            with histogram.time():
+                raise ValueError()
+
+        (buckets, total, count) = histogram.get()
+        # the buckets are cumulative, the time of the block has been observed even if it raised
+        self.assertEqual(buckets, [(0.1, 3), (1, 4), (float("inf"), 5)])
+        self.assertAlmostEqual(total, 2.65, places=2)
+        self.assertEqual(count, 5)
+
+        histogram.reset()
+        self.assertEqual(histogram.get(), ([(0.1, 0), (1, 0), (float("inf"), 0)], 0.0, 0))
+
+    def test_render(self):
+        self.metrics.counter("att_workflow_driver_test_events", "Test counter").inc(3)
+        depth = self.metrics.gauge("att_workflow_driver_test_depth", "Test gauge")
+        depth.track(lambda: 7)
+        self.metrics.histogram("att_workflow_driver_test_seconds", "Test histogram", buckets=[0.1]).observe(0.5)
+
+        lines = self.metrics.render().splitlines()
+
+        for line in ["# HELP att_workflow_driver_test_events Test counter",
+                     "# TYPE att_workflow_driver_test_events counter",
+                     "att_workflow_driver_test_events 3",
+                     "# TYPE att_workflow_driver_test_depth gauge",
+                     "att_workflow_driver_test_depth 7",
+                     "# TYPE att_workflow_driver_test_seconds histogram",
+                     'att_workflow_driver_test_seconds_bucket{le="0.1"} 0',
+                     'att_workflow_driver_test_seconds_bucket{le="+Inf"} 1',
+                     "att_workflow_driver_test_seconds_sum 0.5",
+                     "att_workflow_driver_test_seconds_count 1"]:
+            self.assertIn(line, lines)
+
+    def test_exporter(self):
+        self.metrics.counter("att_workflow_driver_test_events", "Test counter").inc()
+
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        exporter = self.metrics.MetricsExporter()
+        exporter.address = "127.0.0.1"
+        exporter.port = port
+        exporter.start(Mock())
+        try:
+            body = urllib2.urlopen("http://127.0.0.1:%d/metrics" % port, timeout=5).read()
+            self.assertIn("att_workflow_driver_test_events 1", body.splitlines())
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen("http://127.0.0.1:%d/other" % port, timeout=5)
+        finally:
+            exporter.stop()
+
+    def test_exporter_disabled(self):
+        exporter = self.metrics.MetricsExporter()
+        exporter.port = 0
+        exporter.start(Mock())
+        self.assertIsNone(exporter.server)
+
+
+if __name__ == '__main__':
+    unittest.main()
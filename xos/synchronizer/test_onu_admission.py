@@ -0,0 +1,202 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import patch, Mock
+
+import os
+import sys
+import time
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestONUAdmission(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from caches import clear_caches
+        from onu_admission import ONUAdmission, rejected_onu_events, reaped_sis
+        clear_caches()
+
+        class TestAdmission(ONUAdmission):
+            max_admissions = 2
+
+            def start(self, model_accessor, log):
+                # the test drives reap(), don't start the thread
+                self.model_accessor = model_accessor
+                self.log = log
+
+        self.admission = TestAdmission()
+        self.rejected_onu_events = rejected_onu_events
+        self.reaped_sis = reaped_sis
+
+        self.model_accessor = Mock()
+        self.model_accessor.AttWorkflowDriverService.objects.first.return_value = Mock(id=1)
+        self.whitelist = []
+        whitelist = self.model_accessor.AttWorkflowDriverWhiteListEntry.objects
+        whitelist.filter.side_effect = lambda owner_id: self.whitelist
+        self.log = Mock()
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def event(self, serial_number, device_id="of:0000000000000001"):
+        return {"status": "activated", "serialNumber": serial_number, "deviceId": device_id, "portNumber": "16"}
+
+    def admit(self, serial_number, device_id="of:0000000000000001", step=None):
+        return self.admission.admit(self.model_accessor, self.log, self.event(serial_number, device_id), step=step)
+
+    def test_whitelisted(self):
+        self.whitelist = [Mock(id=1, serial_number="BRCM1")]
+        for _ in range(5):
+            self.assertTrue(self.admit("BRCM1"))
+        self.assertEqual(self.admission.rejected, {})
+
+    def test_negative_cache(self):
+        rejected = self.rejected_onu_events.value
+
+        self.assertTrue(self.admit("BRCM1"))
+        # the following events of the same ONU are dropped, whatever their case
+        self.assertFalse(self.admit("BRCM1"))
+        self.assertFalse(self.admit("brcm1"))
+        self.assertEqual(self.rejected_onu_events.value, rejected + 2)
+
+        # until the ONU is added to the whitelist
+        self.admission.forget("BRCM1")
+        self.assertTrue(self.admit("BRCM1"))
+
+    def test_negative_ttl(self):
+        self.assertTrue(self.admit("BRCM1"))
+        with patch("time.time", return_value=time.time() + self.admission.negative_ttl + 1):
+            self.assertTrue(self.admit("BRCM1"))
+
+    def test_rate_limit(self):
+        self.assertTrue(self.admit("BRCM1"))
+        self.assertTrue(self.admit("BRCM2"))
+        # the OLT has reached max_admissions
+        self.assertFalse(self.admit("BRCM3"))
+        # which doesn't affect the other OLTs
+        self.assertTrue(self.admit("BRCM4", device_id="of:0000000000000002"))
+
+        with patch("time.time", return_value=time.time() + self.admission.admission_window + 1):
+            self.assertTrue(self.admit("BRCM3"))
+
+    def test_replay(self):
+        step = Mock()
+        self.assertTrue(self.admit("BRCM1", step=step))
+        self.assertTrue(self.admit("BRCM2", step=step))
+        # dropped by the rate limit, the ONU has no SI
+        self.assertFalse(self.admit("BRCM3", step=step))
+        disabled = dict(self.event("BRCM3"), status="disabled")
+        self.assertFalse(self.admission.admit(self.model_accessor, self.log, disabled, step=step))
+        # dropped by the negative cache
+        self.assertFalse(self.admit("BRCM1", step=step))
+
+        # the last dropped event is processed once the ONU is added to the whitelist,
+        # by the onu.events consumer rather than by the thread of the whitelist model_policy
+        self.admission.forget("brcm3")
+        step.handle_value.assert_not_called()
+        self.admission.replay()
+        step.handle_value.assert_called_once_with(disabled)
+        self.admission.forget("BRCM3")
+        self.admission.replay()
+        self.assertEqual(step.handle_value.call_count, 1)
+
+        self.admission.forget("BRCM1")
+        self.admission.replay()
+        self.assertEqual(step.handle_value.call_count, 2)
+
+        self.admission.forget("BRCM2")
+        self.admission.replay()
+        self.assertEqual(step.handle_value.call_count, 2)
+
+    def test_replay_path(self):
+        from event_dispatcher import EventDispatcher
+        from event_workers import EventWorkerPool
+
+        step = Mock()
+        self.admit("BRCM1", step=step)
+        self.admit("BRCM2", step=step)
+        self.assertFalse(self.admit("BRCM3", step=step))
+        self.assertFalse(self.admit("BRCM4", step=step))
+
+        # the events are handed over to the dispatcher or to the worker of the ONU, if enabled
+        with patch.object(EventDispatcher, "window_ms", 100), patch.object(EventDispatcher, "for_step") as for_step:
+            self.admission.forget("BRCM3")
+            for_step.return_value.add.assert_called_once_with(step, self.event("BRCM3"))
+        with patch.object(EventWorkerPool, "workers", 4), patch.object(EventWorkerPool, "for_step") as for_step:
+            self.admission.forget("BRCM4")
+            for_step.return_value.add.assert_called_once_with(step, self.event("BRCM4"))
+
+        self.admission.replay()
+        step.handle_value.assert_not_called()
+
+    def test_max_dropped(self):
+        self.admission.max_dropped = 2
+        step = Mock()
+        self.admit("BRCM1", step=step)
+        self.admit("BRCM2", step=step)
+        for serial_number in ["BRCM3", "BRCM4", "BRCM5"]:
+            self.admit(serial_number, step=step)
+
+        # the events of the oldest ONUs are forgotten
+        self.assertEqual(self.admission.dropped.keys(), ["brcm4", "brcm5"])
+
+    def test_purge(self):
+        self.admit("BRCM1")
+        with patch("time.time", return_value=time.time() + self.admission.negative_ttl + 1):
+            self.admission.purge()
+        self.assertEqual((self.admission.rejected, self.admission.admissions), ({}, {}))
+
+    def test_reap(self):
+        reaped = self.reaped_sis.value
+        self.admit("BRCM1")
+
+        now = time.time()
+        old = now - self.admission.si_ttl - 1
+        sis = [
+            Mock(id=1, serial_number="BRCM1", status_message="ONU not found in whitelist", updated=old),
+            # recently updated
+            Mock(id=2, serial_number="BRCM2", status_message="ONU not found in whitelist", updated=now),
+            # disabled for another reason
+            Mock(id=3, serial_number="BRCM3", status_message="ONU activated in wrong location", updated=old),
+            # added to the whitelist in the meantime
+            Mock(id=4, serial_number="BRCM4", status_message="ONU not found in whitelist", updated=old),
+        ]
+        from caches import whitelist_index
+        whitelist_index.update(Mock(id=1, owner_id=1, serial_number="BRCM4"))
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.return_value = sis
+
+        self.assertEqual(self.admission.reap(), [1])
+        sis[0].delete.assert_called_once_with()
+        # the SIs that have been validated once are never removed
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.assert_called_with(
+            admin_onu_state="DISABLED", validated=False)
+        self.assertEqual(self.reaped_sis.value, reaped + 1)
+
+    def test_reap_disabled(self):
+        self.admission.si_ttl = 0
+        self.admit("BRCM1")
+        self.assertEqual(self.admission.reap(), [])
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+from mock import Mock
+import threading
+import time
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestONUWaitlist(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from caches import clear_caches, onu_device_cache
+        from onu_waitlist import ONUWaitlist, parked_sis, released_sis, expired_sis
+        clear_caches()
+
+        class TestWaitlist(ONUWaitlist):
+            max_onu_retry = 3
+
+            def start(self, model_accessor, log):
+                # the test drives check(), don't start the thread
+                self.model_accessor = model_accessor
+                self.log = log
+
+        self.waitlist = TestWaitlist()
+        self.onu_device_cache = onu_device_cache
+        self.parked_sis = parked_sis
+        self.released_sis = released_sis
+        self.expired_sis = expired_sis
+
+        self.model_accessor = Mock()
+        self.onus = []
+        self.model_accessor.ONUDevice.objects.filter.side_effect = lambda serial_number__iexact: [
+            onu for onu in self.onus if onu.serial_number.lower() == serial_number__iexact.lower()]
+        self.sis = {}
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.get.side_effect = lambda id: self.sis[id]
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def create_si(self, si_id, serial_number):
+        si = Mock(id=si_id, serial_number=serial_number)
+        self.sis[si_id] = si
+        return si
+
+    def test_park(self):
+        si = self.create_si(1, "BRCM1234")
+        self.waitlist.park(self.model_accessor, Mock(), si)
+        self.waitlist.park(self.model_accessor, Mock(), si)
+
+        self.assertTrue(self.waitlist.is_parked(si))
+        self.assertEqual(self.parked_sis.value, 1)
+
+        self.waitlist.discard(si)
+        self.assertFalse(self.waitlist.is_parked(si))
+        self.assertEqual(self.parked_sis.value, 0)
+
+    def test_release_once(self):
+        si1 = self.create_si(1, "BRCM1234")
+        si2 = self.create_si(2, "BRCM5678")
+        self.waitlist.park(self.model_accessor, Mock(), si1)
+        self.waitlist.park(self.model_accessor, Mock(), si2)
+        self.waitlist.max_onu_retry = 10
+        released = self.released_sis.value
+
+        self.assertEqual(self.waitlist.check(), ([], []))
+        si1.save.assert_not_called()
+
+        self.onus = [Mock(id=10, serial_number="brcm1234")]
+        # the negative cache expires within check_interval
+        self.onu_device_cache.missing.discard("brcm1234")
+        self.assertEqual(self.waitlist.check(), ([1], []))
+        self.assertEqual(self.waitlist.check(), ([], []))
+
+        # the SI is saved once, so that the model_policy runs again
+        si1.save.assert_called_once_with(update_fields=["updated"], always_update_timestamp=True)
+        si2.save.assert_not_called()
+        self.assertEqual(self.released_sis.value, released + 1)
+        self.assertEqual(self.parked_sis.value, 1)
+
+        # the parked serial numbers are looked up one by one, the ONUDevices are never scanned
+        self.model_accessor.ONUDevice.objects.all.assert_not_called()
+        self.model_accessor.ONUDevice.objects.filter.assert_any_call(serial_number__iexact="brcm5678")
+
+    def test_retry_budget(self):
+        si = self.create_si(1, "BRCM1234")
+        self.waitlist.park(self.model_accessor, Mock(), si)
+        expired = self.expired_sis.value
+
+        self.assertEqual(self.waitlist.check(), ([], []))
+        self.assertEqual(self.waitlist.check(), ([], []))
+        self.assertEqual(self.waitlist.check(), ([], [1]))
+
+        self.assertFalse(self.waitlist.is_parked(si))
+        self.assertEqual(si.status_message, "ONU device not found after 3 checks")
+        si.save_changed_fields.assert_called_once_with()
+        self.assertEqual(self.expired_sis.value, expired + 1)
+
+    def test_empty(self):
+        self.waitlist.start(self.model_accessor, Mock())
+        self.assertEqual(self.waitlist.check(), ([], []))
+        self.model_accessor.ONUDevice.objects.filter.assert_not_called()
+
+    def test_wake(self):
+        si1 = self.create_si(1, "BRCM1234")
+        si2 = self.create_si(2, "BRCM5678")
+        self.waitlist.park(self.model_accessor, Mock(), si1)
+        self.waitlist.park(self.model_accessor, Mock(), si2)
+
+        self.waitlist.wake("BRCM9999")
+        self.assertEqual(self.waitlist.woken, set())
+        self.waitlist.wake("brcm1234")
+        self.assertEqual(self.waitlist.woken, set(["brcm1234"]))
+
+        # the full check has just found that the ONUDevice doesn't exist
+        self.assertEqual(self.waitlist.check(), ([], []))
+        self.onus = [Mock(id=10, serial_number="BRCM1234")]
+
+        # only the woken ONU is looked up, bypassing the negative cache, and no check is counted for it
+        self.model_accessor.ONUDevice.objects.filter.reset_mock()
+        self.assertEqual(self.waitlist.check(["brcm1234"]), ([1], []))
+        self.model_accessor.ONUDevice.objects.filter.assert_called_once_with(serial_number__iexact="brcm1234")
+        self.assertEqual(self.waitlist.check(["brcm5678"]), ([], []))
+        self.assertEqual(self.waitlist.parked, {"brcm5678": {2: 1}})
+
+    def test_wake_rate_limit(self):
+        si = self.create_si(1, "BRCM1234")
+        self.waitlist.park(self.model_accessor, Mock(), si)
+        self.waitlist.check_interval = 60
+        self.waitlist.min_wake_interval = 0.2
+        self.waitlist.load = Mock()
+        checks = []
+        checked = threading.Event()
+
+        def check(serial_numbers=None):
+            checks.append((time.time(), serial_numbers))
+            self.waitlist.checked_at = time.time()
+            checked.set()
+        self.waitlist.check = check
+
+        thread = threading.Thread(target=self.waitlist.run)
+        thread.daemon = True
+        thread.start()
+
+        for _ in range(2):
+            checked.clear()
+            for _ in range(5):
+                self.waitlist.wake("BRCM1234")
+            self.assertTrue(checked.wait(5))
+
+        # the wakes are checked together, at most once every min_wake_interval
+        self.assertEqual([serial_numbers for (checked_at, serial_numbers) in checks], [set(["brcm1234"])] * 2)
+        self.assertGreaterEqual(checks[1][0] - checks[0][0], 0.2)
+
+    def test_expired_wake(self):
+        si = self.create_si(1, "BRCM1234")
+        self.waitlist.park(self.model_accessor, Mock(), si)
+        for _ in range(3):
+            self.waitlist.check()
+        self.assertFalse(self.waitlist.is_parked(si))
+
+        # the ONU is activated later on, the SI waits again and is released once its ONUDevice is found
+        self.waitlist.wake("BRCM1234")
+        self.assertTrue(self.waitlist.is_parked(si))
+        self.onus = [Mock(id=10, serial_number="BRCM1234")]
+        self.assertEqual(self.waitlist.check(self.waitlist.woken), ([1], []))
+        si.save.assert_called_once_with(update_fields=["updated"], always_update_timestamp=True)
+
+    def test_load(self):
+        from onu_waitlist import WAITING_MESSAGE
+
+        parked = self.create_si(1, "BRCM1234")
+        expired = self.create_si(2, "BRCM5678")
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.side_effect = lambda status_message: {
+            WAITING_MESSAGE: [parked],
+            "ONU device not found after 3 checks": [expired],
+        }[status_message]
+        self.waitlist.start(self.model_accessor, Mock())
+        self.waitlist.load()
+
+        self.assertTrue(self.waitlist.is_parked(parked))
+        self.waitlist.wake("BRCM5678")
+        self.assertTrue(self.waitlist.is_parked(expired))
+
+
+if __name__ == '__main__':
+    unittest.main()
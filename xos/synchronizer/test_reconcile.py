@@ -0,0 +1,161 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import Mock
+
+import os
+import sys
+import time
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestReconciler(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from caches import clear_caches, policy_state_cache, whitelist_index
+        from reconcile import Reconciler, Snapshot
+        clear_caches()
+        self.policy_state_cache = policy_state_cache
+        self.whitelist_index = whitelist_index
+        self.Snapshot = Snapshot
+
+        self.reconciler = type("TestReconciler", (Reconciler,), {"max_corrections_per_second": 0})()
+        self.reconciler.model_accessor = self.model_accessor = Mock()
+        self.reconciler.log = Mock()
+
+        old = time.time() - 3600
+        self.si = Mock(id=1, owner_id=1, serial_number="BRCM1", of_dpid="of:0000000000000001",
+                       admin_onu_state="ENABLED", oper_onu_status="ENABLED", authentication_state="APPROVED",
+                       dhcp_state="DHCPACK", status_message="ONU has been validated - Authentication succeeded",
+                       updated=old)
+        self.entry = Mock(id=1, owner_id=1, serial_number="BRCM1", pon_port_id=1, device_id="of:0000000000000001")
+        self.onu = Mock(id=1, serial_number="brcm1", admin_state="ENABLED", pon_port_id=10, updated=old)
+        self.pon_port = Mock(id=10, port_no=1)
+        self.subscriber = Mock(id=1, onu_device="BRCM1", status="enabled", updated=old)
+
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.all.return_value = [self.si]
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.all.return_value = [self.entry]
+        self.model_accessor.ONUDevice.objects.all.return_value = [self.onu]
+        self.model_accessor.PONPort.objects.all.return_value = [self.pon_port]
+        self.model_accessor.RCORDSubscriber.objects.all.return_value = [self.subscriber]
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_nothing_to_correct(self):
+        stats = self.reconciler.sweep()
+
+        self.assertEqual((stats["sis"], stats["si"], stats["onu"], stats["completed"]), (1, 0, 0, True))
+        self.si.save.assert_not_called()
+        self.onu.save_changed_fields.assert_not_called()
+        # the ONUDevices are not read one by one
+        self.model_accessor.ONUDevice.objects.get.assert_not_called()
+
+    def test_onu_admin_state(self):
+        self.onu.admin_state = "DISABLED"
+        stats = self.reconciler.sweep()
+
+        self.assertEqual((stats["si"], stats["onu"]), (0, 1))
+        self.assertEqual(self.onu.admin_state, "ENABLED")
+        self.onu.save_changed_fields.assert_called_once_with(always_update_timestamp=True)
+
+        # the ONU has been disabled by the operator
+        self.onu.admin_state = "ADMIN_DISABLED"
+        self.si.admin_onu_state = "DISABLED"
+        self.si.authentication_state = "AWAITING"
+        self.si.status_message = "ONU has been manually disabled"
+        self.subscriber.status = "awaiting-auth"
+        self.assertEqual(self.reconciler.check(self.Snapshot(self.model_accessor), self.si), None)
+
+    def test_whitelist_removed(self):
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.all.return_value = []
+        self.policy_state_cache.set(self.si.id, {})
+
+        stats = self.reconciler.sweep()
+
+        self.assertEqual((stats["si"], stats["onu"]), (1, 0))
+        # the model_policy of the SI runs again, all its stages
+        self.si.save.assert_called_once_with(update_fields=["updated"], always_update_timestamp=True)
+        self.assertEqual(self.policy_state_cache.get(self.si.id), None)
+
+    def test_whitelist_index_replaced(self):
+        # the delete policy of the entry has not been called, the index still has it
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter.return_value = [self.entry]
+        self.whitelist_index.load(self.model_accessor, 1)
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.all.return_value = []
+
+        self.reconciler.sweep()
+
+        # the model_policy validates the SI against the same whitelist as the reconciler
+        self.assertEqual(self.whitelist_index.get(self.model_accessor, 1, "BRCM1"), None)
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter.assert_called_once_with(owner_id=1)
+
+    def test_whitelist_index_changed(self):
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter.return_value = []
+        self.whitelist_index.load(self.model_accessor, 1)
+        self.reconciler.sweep()
+
+        # an entry saved by the policy after the snapshot has been read is kept
+        entry = Mock(id=2, owner_id=1, serial_number="BRCM2")
+        self.whitelist_index.update(entry)
+        self.whitelist_index.replace([self.entry], time.time() - 1)
+        self.assertEqual(self.whitelist_index.get(self.model_accessor, 1, "BRCM2"), entry)
+
+    def test_authentication_state(self):
+        self.si.oper_onu_status = "DISABLED"
+        self.assertEqual(self.reconciler.sweep()["si"], 1)
+
+    def test_subscriber_status(self):
+        self.subscriber.status = "awaiting-auth"
+        self.assertEqual(self.reconciler.sweep()["si"], 1)
+
+        # the operator has disabled the subscriber
+        self.si.save.reset_mock()
+        self.subscriber.status = "disabled"
+        self.assertEqual(self.reconciler.sweep()["si"], 0)
+
+    def test_skipped(self):
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.all.return_value = []
+        sis = [
+            # recently updated, its model_policy may be running
+            Mock(id=2, serial_number="BRCM1", admin_onu_state="ENABLED", updated=time.time()),
+            # the ONUDevice is not known yet
+            Mock(id=3, serial_number="BRCM2", admin_onu_state="ENABLED", updated=0),
+            # not validated yet
+            Mock(id=4, serial_number="BRCM1", admin_onu_state="AWAITING", updated=0),
+        ]
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.all.return_value = sis
+
+        self.assertEqual(self.reconciler.sweep()["si"], 0)
+
+    def test_time_budget(self):
+        self.reconciler.time_budget = -1
+        self.onu.admin_state = "DISABLED"
+
+        stats = self.reconciler.sweep()
+
+        self.assertEqual((stats["onu"], stats["completed"]), (0, False))
+        self.onu.save_changed_fields.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import patch
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestSettings(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from settings import env_int
+        self.env_int = env_int
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_env_int(self):
+        with patch.dict(os.environ, {"ATT_WORKFLOW_DRIVER_EVENT_WORKERS": "8"}):
+            self.assertEqual(self.env_int("ATT_WORKFLOW_DRIVER_EVENT_WORKERS", 0), 8)
+
+    def test_default(self):
+        with patch.dict(os.environ, {"ATT_WORKFLOW_DRIVER_EVENT_WORKERS": " "}):
+            self.assertEqual(self.env_int("ATT_WORKFLOW_DRIVER_EVENT_WORKERS", 0), 0)
+        self.assertEqual(self.env_int("ATT_WORKFLOW_DRIVER_NOT_SET", 1000), 1000)
+
+    def test_invalid(self):
+        with patch.dict(os.environ, {"ATT_WORKFLOW_DRIVER_EVENT_WORKERS": "many"}):
+            with self.assertRaises(ValueError) as e:
+                self.env_int("ATT_WORKFLOW_DRIVER_EVENT_WORKERS", 0)
+        self.assertEqual(str(e.exception), "ATT_WORKFLOW_DRIVER_EVENT_WORKERS must be an integer, got 'many'")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import Mock
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestStateSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        import caches
+        import snapshot
+        from warmup import warm_up
+        caches.clear_caches()
+        self.caches = caches
+        self.snapshot = snapshot
+        self.warm_up = warm_up
+
+        self.directory = tempfile.mkdtemp()
+        self.state_snapshot = snapshot.StateSnapshot()
+        self.state_snapshot.path = os.path.join(self.directory, "state", "snapshot.json")
+
+        self.model_accessor = Mock()
+        self.model_accessor.ONUDevice.objects.all.return_value = [
+            Mock(id=10, serial_number="BRCM1"), Mock(id=11, serial_number="BRCM2")]
+        self.model_accessor.RCORDSubscriber.objects.all.return_value = [Mock(id=20, onu_device="BRCM1")]
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.all.return_value = [
+            Mock(id=40, serial_number="BRCM1"), Mock(id=41, serial_number="BRCM2")]
+        self.log = Mock()
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        caches = self.caches
+        caches.onu_device_cache.refresh(self.model_accessor)
+        caches.subscriber_index.refresh(self.model_accessor)
+        caches.service_instance_index.load(self.model_accessor)
+
+    def test_save_restore(self):
+        self.load()
+        self.assertEqual(self.state_snapshot.save(), ["onu_devices", "service_instances", "subscribers"])
+        self.caches.clear_caches()
+
+        # BRCM3 has been added and the SI of BRCM2 has moved to BRCM3 after the snapshot has been saved
+        self.model_accessor.reset_mock()
+        self.model_accessor.ONUDevice.objects.filter.return_value = [Mock(id=12, serial_number="BRCM3")]
+        self.model_accessor.RCORDSubscriber.objects.filter.return_value = []
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.return_value = [
+            Mock(id=41, serial_number="BRCM3")]
+
+        restored = self.state_snapshot.restore(self.model_accessor, self.log)
+
+        self.assertEqual(restored, {"onu_devices": 1, "subscribers": 0, "service_instances": 1})
+        caches = self.caches
+        self.assertEqual(caches.onu_device_cache.ids, {"brcm1": 10, "brcm2": 11, "brcm3": 12})
+        self.assertEqual(caches.subscriber_index.ids, {"brcm1": 20})
+        self.assertEqual(caches.service_instance_index.dump(), {"brcm1": [40], "brcm3": [41]})
+
+        # only the objects updated since the snapshot has been saved are read, with an integer timestamp
+        since = self.model_accessor.ONUDevice.objects.filter.call_args[1]["updated__gte"]
+        self.assertIsInstance(since, int)
+        self.assertLess(since, time.time() - self.state_snapshot.clock_skew + 1)
+        self.model_accessor.ONUDevice.objects.all.assert_not_called()
+        self.model_accessor.RCORDSubscriber.objects.all.assert_not_called()
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.all.assert_not_called()
+
+    def test_index_not_loaded(self):
+        self.caches.onu_device_cache.refresh(self.model_accessor)
+        self.assertEqual(self.state_snapshot.save(), ["onu_devices", "subscribers"])
+        self.caches.clear_caches()
+        self.model_accessor.ONUDevice.objects.filter.return_value = []
+        self.model_accessor.RCORDSubscriber.objects.filter.return_value = []
+
+        restored = self.state_snapshot.restore(self.model_accessor, self.log)
+
+        self.assertEqual(sorted(restored.keys()), ["onu_devices", "subscribers"])
+        self.assertFalse(self.caches.service_instance_index.loaded)
+
+    def test_no_snapshot(self):
+        self.assertEqual(self.state_snapshot.restore(self.model_accessor, self.log), {})
+
+    def test_unusable_snapshot(self):
+        self.load()
+        self.state_snapshot.save()
+        with open(self.state_snapshot.path) as f:
+            snapshot = json.load(f)
+
+        for (field, value) in [("version", self.snapshot.SNAPSHOT_VERSION + 1),
+                               ("saved_at", time.time() - self.state_snapshot.max_age - 1)]:
+            with open(self.state_snapshot.path, "w") as f:
+                json.dump(dict(snapshot, **{field: value}), f)
+            self.assertEqual(self.state_snapshot.restore(self.model_accessor, self.log), {})
+
+        with open(self.state_snapshot.path, "w") as f:
+            f.write(json.dumps(snapshot)[:20])
+        self.assertEqual(self.state_snapshot.restore(self.model_accessor, self.log), {})
+        self.log.exception.assert_called_once()
+
+    def test_catch_up_failure(self):
+        self.load()
+        self.state_snapshot.save()
+        self.caches.clear_caches()
+        self.model_accessor.ONUDevice.objects.filter.side_effect = Exception("the core is not reachable")
+        self.model_accessor.RCORDSubscriber.objects.filter.return_value = []
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.return_value = []
+
+        restored = self.state_snapshot.restore(self.model_accessor, self.log)
+
+        # the ONUDevices will be loaded from the core
+        self.assertEqual(sorted(restored.keys()), ["service_instances", "subscribers"])
+        self.assertEqual(self.caches.onu_device_cache.ids, {})
+
+    def test_warm_up(self):
+        self.load()
+        self.state_snapshot.save()
+        self.caches.clear_caches()
+        self.model_accessor.reset_mock()
+        self.model_accessor.AttWorkflowDriverService.objects.all.return_value = [Mock(id=1)]
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter.return_value = []
+        self.model_accessor.ONUDevice.objects.filter.return_value = []
+        self.model_accessor.RCORDSubscriber.objects.filter.return_value = []
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.filter.return_value = []
+
+        self.snapshot.state_snapshot.path = self.state_snapshot.path
+        try:
+            loaded = self.warm_up(self.model_accessor, self.log)
+        finally:
+            self.snapshot.state_snapshot.path = self.snapshot.StateSnapshot.path
+
+        # the whitelist is always loaded from the core
+        self.assertEqual(sorted(loaded.keys()), ["whitelist"])
+        self.assertEqual(self.caches.onu_device_cache.ids, {"brcm1": 10, "brcm2": 11})
+        self.model_accessor.ONUDevice.objects.all.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
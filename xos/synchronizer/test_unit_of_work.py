@@ -0,0 +1,115 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+from mock import Mock, call
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestUnitOfWork(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from unit_of_work import UnitOfWork
+        self.writes = UnitOfWork(Mock())
+
+        # records the writes of all the objects, in order
+        self.backend = Mock()
+        self.onu = self.backend.onu
+        self.ip = self.backend.ip
+        self.subscriber = self.backend.subscriber
+        self.si = self.backend.si
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_immediate(self):
+        callback = Mock()
+        self.writes.save_changed_fields(self.onu, always_update_timestamp=True)
+        self.writes.save(self.ip, after=callback)
+
+        self.onu.save_changed_fields.assert_called_once_with(always_update_timestamp=True)
+        self.ip.save.assert_called_once_with()
+        callback.assert_called_once_with()
+
+    def test_commit(self):
+        callback = Mock()
+        with self.writes.begin():
+            self.writes.save_changed_fields(self.onu, always_update_timestamp=True)
+            self.writes.delete(self.ip, after=callback)
+            self.writes.save_changed_fields(self.subscriber, always_update_timestamp=False)
+            self.writes.save_changed_fields(self.si)
+
+            self.assertEqual(self.backend.mock_calls, [])
+            callback.assert_not_called()
+
+        self.assertEqual(self.backend.mock_calls, [
+            call.onu.save_changed_fields(always_update_timestamp=True),
+            call.ip.delete(),
+            call.subscriber.save_changed_fields(always_update_timestamp=False),
+            call.si.save_changed_fields(),
+        ])
+        callback.assert_called_once_with()
+
+    def test_delete_failed(self):
+        on_error = Mock()
+        self.ip.delete.side_effect = ValueError("not found")
+        with self.writes.begin():
+            self.writes.delete(self.ip, on_error=on_error)
+            self.writes.save_changed_fields(self.si)
+
+        # the failed delete doesn't prevent the rest of the writes
+        self.assertEqual(self.backend.mock_calls, [
+            call.ip.delete(),
+            call.si.save_changed_fields(),
+        ])
+        self.assertEqual(str(on_error.call_args[0][0]), "not found")
+
+    def test_merge(self):
+        with self.writes.begin():
+            self.writes.save_changed_fields(self.subscriber, always_update_timestamp=False)
+            self.writes.save_changed_fields(self.si)
+            self.writes.save_changed_fields(self.subscriber, always_update_timestamp=True)
+
+        self.assertEqual(self.backend.mock_calls, [
+            call.subscriber.save_changed_fields(always_update_timestamp=True),
+            call.si.save_changed_fields(),
+        ])
+
+    def test_discard(self):
+        callback = Mock()
+        with self.assertRaises(ValueError):
+            with self.writes.begin():
+                self.writes.save_changed_fields(self.onu, always_update_timestamp=True)
+                self.writes.after_commit(callback)
+                raise ValueError("failed")
+
+        self.assertEqual(self.backend.mock_calls, [])
+        callback.assert_not_called()
+
+        # the next run starts from a clean state
+        with self.writes.begin():
+            self.writes.save_changed_fields(self.si)
+        self.assertEqual(self.backend.mock_calls, [call.si.save_changed_fields()])
+
+
+if __name__ == '__main__':
+    unittest.main()
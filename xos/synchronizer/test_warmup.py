@@ -0,0 +1,99 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import Mock
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        import caches
+        from warmup import warm_up, warmup_seconds
+        caches.clear_caches()
+        self.caches = caches
+        self.warm_up = warm_up
+        self.warmup_seconds = warmup_seconds
+
+        self.model_accessor = Mock()
+        self.model_accessor.AttWorkflowDriverService.objects.all.return_value = [Mock(id=2), Mock(id=1)]
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter.side_effect = lambda owner_id: [
+            Mock(id=owner_id, owner_id=owner_id, serial_number="BRCM%s" % owner_id)]
+        self.model_accessor.ONUDevice.objects.all.return_value = [Mock(id=10, serial_number="BRCM1")]
+        self.model_accessor.RCORDSubscriber.objects.all.return_value = [
+            Mock(id=20, onu_device="BRCM1"), Mock(id=21, onu_device="BRCM2")]
+        self.model_accessor.RCORDIpAddress.objects.all.return_value = [
+            Mock(id=30, subscriber_id=20, ip="10.0.0.1")]
+        self.model_accessor.AttWorkflowDriverServiceInstance.objects.all.return_value = [
+            Mock(id=40, serial_number="BRCM1")]
+        self.log = Mock()
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_warm_up(self):
+        loaded = self.warm_up(self.model_accessor, self.log)
+
+        self.assertEqual(dict((name, objects) for (name, (objects, seconds)) in loaded.items()), {
+            "whitelist": 2,
+            "onu_devices": 1,
+            "subscribers": 2,
+            "service_instances": 1,
+        })
+        # the caches are loaded in parallel
+        self.assertGreaterEqual(self.warmup_seconds.value, max(seconds for (objects, seconds) in loaded.values()))
+
+        caches = self.caches
+        self.assertEqual(caches.owner_service_cache.first(self.model_accessor).id, 1)
+        self.assertTrue(caches.whitelist_index.is_loaded(1))
+        self.assertTrue(caches.whitelist_index.is_loaded(2))
+        self.assertEqual(caches.onu_device_cache.ids, {"brcm1": 10})
+        self.assertEqual(caches.subscriber_index.ids, {"brcm1": 20, "brcm2": 21})
+        self.assertTrue(caches.service_instance_index.loaded)
+
+        # the lookups on the event path don't go to the core anymore
+        self.model_accessor.reset_mock()
+        self.assertEqual(caches.subscriber_ip_cache.get(self.model_accessor, 20, "10.0.0.1").id, 30)
+        self.assertEqual(caches.subscriber_ip_cache.get(self.model_accessor, 21, "10.0.0.1"), None)
+        self.assertEqual(caches.subscriber_index.get(self.model_accessor, "BRCM3"), None)
+        self.assertEqual(caches.whitelist_index.get(self.model_accessor, 1, "brcm1").id, 1)
+        self.model_accessor.RCORDIpAddress.objects.filter.assert_not_called()
+        self.model_accessor.RCORDSubscriber.objects.all.assert_not_called()
+        self.model_accessor.AttWorkflowDriverWhiteListEntry.objects.filter.assert_not_called()
+
+    def test_failure(self):
+        self.model_accessor.ONUDevice.objects.all.side_effect = Exception("the core is not reachable")
+
+        loaded = self.warm_up(self.model_accessor, self.log)
+
+        # the other caches are loaded anyway
+        self.assertEqual(loaded["onu_devices"][0], None)
+        self.assertEqual(loaded["subscribers"][0], 2)
+        self.log.exception.assert_called_once()
+        self.assertEqual(self.caches.onu_device_cache.ids, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+from mock import patch, Mock
+from StringIO import StringIO
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+CSV = """serial_number,pon_port_id,device_id
+BRCM1,1,of:0000000000000001
+BRCM2,2,of:0000000000000001
+BRCM3,3,of:0000000000000001
+"""
+
+TOSCA = """
+tosca_definitions_version: tosca_simple_yaml_1_0
+topology_template:
+  node_templates:
+    service#att:
+      type: tosca.nodes.AttWorkflowDriverService
+      properties:
+        name: att-workflow-driver
+        must-exist: true
+    whitelist_1:
+      type: tosca.nodes.AttWorkflowDriverWhiteListEntry
+      properties:
+        serial_number: BRCM1
+        pon_port_id: 1
+        device_id: of:0000000000000001
+      requirements:
+        - owner:
+            node: service#att
+            relationship: tosca.relationships.BelongsToOne
+"""
+
+
+class FakeManager(object):
+    def __init__(self):
+        self.items = []
+        self.queries = 0
+
+    def filter(self, **kwargs):
+        self.queries += 1
+        return [i for i in self.items if all(getattr(i, k) == v for (k, v) in kwargs.items())]
+
+
+class FakeModel(object):
+    def __init__(self):
+        self.objects = FakeManager()
+
+    def __call__(self, **kwargs):
+        obj = Mock(id=None, **kwargs)
+
+        def save():
+            obj.id = len(self.objects.items) + 1
+            self.objects.items.append(obj)
+        obj.save.side_effect = save
+        return obj
+
+
+class TestWhitelistImport(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        from xosconfig import Config
+        Config.clear()
+        Config.init(os.path.join(test_path, "test_config.yaml"), "synchronizer-config-schema.yaml")
+
+        from caches import clear_caches
+        clear_caches()
+
+        from whitelist_import import WhitelistImporter, read_csv, read_tosca
+        self.read_csv = read_csv
+        self.read_tosca = read_tosca
+
+        self.service = Mock(id=1)
+        self.service.name = "att-workflow-driver"
+        self.model_accessor = Mock(AttWorkflowDriverWhiteListEntry=FakeModel(),
+                                   AttWorkflowDriverServiceInstance=FakeModel())
+        self.entries = self.model_accessor.AttWorkflowDriverWhiteListEntry.objects
+        self.sis = self.model_accessor.AttWorkflowDriverServiceInstance.objects
+
+        self.importer = WhitelistImporter(self.model_accessor, Mock(), self.service)
+        self.importer.progress_interval = 2
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def test_import_csv(self):
+        stats = self.importer.import_entries(self.read_csv(StringIO(CSV)))
+
+        self.assertEqual(stats["created"], 3)
+        self.assertEqual([(e.serial_number, e.pon_port_id, e.owner_id, e.normalized_serial_number)
+                          for e in self.entries.items],
+                         [("BRCM1", 1, 1, "brcm1"), ("BRCM2", 2, 1, "brcm2"), ("BRCM3", 3, 1, "brcm3")])
+        # the existing entries are read once, the SIs are validated again by the whitelist policy
+        self.assertEqual(self.entries.queries, 1)
+        self.assertEqual(self.sis.queries, 0)
+        # progress is reported every progress_interval entries and at the end
+        self.assertEqual(self.importer.log.info.call_count, 2)
+
+    def test_import_tosca(self):
+        stats = self.importer.import_entries(self.read_tosca(StringIO(TOSCA)))
+
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(self.entries.items[0].device_id, "of:0000000000000001")
+
+    def test_upsert(self):
+        self.importer.import_entries(self.read_csv(StringIO(CSV)))
+        existing = list(self.entries.items)
+
+        csv = "serial_number,pon_port_id,device_id\nbrcm1,1,of:0000000000000001\nBRCM2,5,of:0000000000000001\n"
+        stats = self.importer.import_entries(self.read_csv(StringIO(csv)))
+
+        # the entries are matched by normalized serial number, and only saved if they have changed
+        self.assertEqual(len(self.entries.items), 3)
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"]), (0, 2, 0))
+        self.assertEqual(existing[0].serial_number, "brcm1")
+        self.assertEqual(existing[1].pon_port_id, 5)
+        existing[1].save_changed_fields.assert_called_once_with()
+        existing[2].save_changed_fields.assert_not_called()
+
+        stats = self.importer.import_entries(self.read_csv(StringIO(csv)))
+        self.assertEqual(stats["unchanged"], 2)
+
+    def test_invalid_rows(self):
+        csv = "serial_number,pon_port_id,device_id\n,1,of:1\nBRCM2,foo,of:1\nBRCM3,3,\nBRCM4,4,of:1\n"
+        stats = self.importer.import_entries(self.read_csv(StringIO(csv)))
+
+        self.assertEqual((stats["processed"], stats["invalid"], stats["created"]), (4, 3, 1))
+        self.assertEqual(self.importer.log.warning.call_count, 3)
+
+    def test_sync(self):
+        self.importer.import_entries(self.read_csv(StringIO(CSV)))
+        existing = list(self.entries.items)
+
+        csv = ("serial_number,pon_port_id,device_id\n"
+               "BRCM1,1,of:0000000000000001\nBRCM2,5,of:0000000000000001\nBRCM4,4,of:0000000000000001\n")
+        stats = self.importer.sync_entries(self.read_csv(StringIO(csv)))
+
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"], stats["deleted"]), (1, 1, 1, 1))
+        # only the changed entries are written, so the whitelist policy only runs for them
+        existing[0].save_changed_fields.assert_not_called()
+        existing[0].delete.assert_not_called()
+        existing[1].save_changed_fields.assert_called_once_with()
+        existing[2].delete.assert_called_once_with()
+        self.assertEqual(self.entries.items[3].serial_number, "BRCM4")
+
+        # nothing has changed
+        stats = self.importer.sync_entries(self.read_csv(StringIO(csv)))
+        self.assertEqual(stats["unchanged"], 3)
+
+    def test_sync_duplicates(self):
+        self.entries.items = [
+            Mock(id=1, owner_id=1, serial_number="BRCM1", pon_port_id=1, device_id="of:0000000000000001"),
+            Mock(id=2, owner_id=1, serial_number="brcm1", pon_port_id=2, device_id="of:0000000000000001"),
+        ]
+
+        stats = self.importer.sync_entries(self.read_csv(StringIO(CSV)))
+
+        # the oldest entry is kept
+        self.assertEqual((stats["created"], stats["unchanged"], stats["deleted"]), (2, 1, 1))
+        self.entries.items[0].delete.assert_not_called()
+        self.entries.items[1].delete.assert_called_once_with()
+
+    def test_sync_invalid_rows(self):
+        self.importer.import_entries(self.read_csv(StringIO(CSV)))
+
+        csv = "serial_number,pon_port_id,device_id\nBRCM1,1,of:0000000000000001\nBRCM2,foo,of:1\n"
+        stats = self.importer.sync_entries(self.read_csv(StringIO(csv)))
+
+        # a whitelist with invalid entries could be truncated, nothing is deleted
+        self.assertEqual((stats["invalid"], stats["deleted"]), (1, 0))
+        self.importer.log.error.assert_called_once()
+
+    def test_no_revalidation(self):
+        self.sis.items = [Mock(id=1, owner_id=1, serial_number="BRCM1")]
+
+        with patch("helpers.AttHelpers.revalidate_onu") as revalidate_onu:
+            self.importer.import_entries(self.read_csv(StringIO(CSV)))
+
+        # each saved entry triggers the whitelist policy, that validates its SIs again
+        revalidate_onu.assert_not_called()
+        self.assertEqual(self.sis.queries, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+from mock import Mock
+
+import os
+import sys
+
+test_path = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+
+
+class TestWorkflow(unittest.TestCase):
+
+    def setUp(self):
+        self.sys_path_save = sys.path
+        sys.path.append(test_path)
+
+        import workflow
+        self.workflow = workflow
+
+    def tearDown(self):
+        sys.path = self.sys_path_save
+
+    def evaluate(self, admin_onu_state, oper_onu_status, authentication_state, dhcp_state="AWAITING"):
+        si = Mock(admin_onu_state=admin_onu_state, oper_onu_status=oper_onu_status,
+                  authentication_state=authentication_state, dhcp_state=dhcp_state)
+        return self.workflow.evaluate(si)
+
+    def test_compiled(self):
+        # every combination of the model choices is compiled
+        self.assertEqual(len(self.workflow.TABLE), 3 * 3 * 5 * 2)
+        for (key, transition) in self.workflow.TABLE.items():
+            self.assertEqual(transition, self.workflow.transition(*key))
+
+    def test_onu_disabled(self):
+        for (admin_onu_state, oper_onu_status) in [("DISABLED", "ENABLED"), ("ENABLED", "DISABLED")]:
+            transition = self.evaluate(admin_onu_state, oper_onu_status, "APPROVED", "DHCPACK")
+            self.assertEqual(transition.authentication_state, "AWAITING")
+            self.assertEqual(transition.status_message, "")
+            self.assertTrue(transition.reset_dhcp)
+            self.assertEqual(transition.subscriber_status, "awaiting-auth")
+
+    def test_approved(self):
+        transition = self.evaluate("ENABLED", "ENABLED", "APPROVED", "DHCPACK")
+        self.assertEqual(transition, self.workflow.Transition(
+            authentication_state="APPROVED",
+            status_message=" - Authentication succeeded",
+            reset_dhcp=False,
+            subscriber_status="enabled",
+            valid=True,
+        ))
+
+    def test_reauthentication(self):
+        transition = self.evaluate("ENABLED", "ENABLED", "STARTED", "DHCPACK")
+        self.assertEqual(transition.status_message, " - Authentication started")
+        self.assertTrue(transition.reset_dhcp)
+        self.assertTrue(transition.valid)
+
+    def test_invalid(self):
+        self.assertFalse(self.evaluate("ENABLED", "ENABLED", "DENIED", "DHCPACK").valid)
+        self.assertFalse(self.evaluate("AWAITING", "ENABLED", "APPROVED").valid)
+        self.assertTrue(self.evaluate("ENABLED", "ENABLED", "DENIED").valid)
+
+    def test_unknown_state(self):
+        transition = self.evaluate("ENABLED", "ENABLED", "TIMEOUT", "DHCPACK")
+        self.assertEqual(transition.authentication_state, "TIMEOUT")
+        self.assertEqual(transition.status_message, "")
+        self.assertEqual(transition.subscriber_status, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
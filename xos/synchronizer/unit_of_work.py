@@ -0,0 +1,122 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from contextlib import contextmanager
+
+
+class UnitOfWork(object):
+    """
+    Collects the objects written by a model_policy run and writes them once the run has completed.
+
+    Within begin() saves and deletes are queued, an object saved more than once is written once, and nothing is
+    written if the run fails: the policy is retried from a clean state rather than leaving some of the objects updated.
+    The writes are then done in the order they have been queued, so the object the policy runs on should be saved last:
+    if one of the writes fails it won't be marked as policed and the policy will run again.
+    NOTE the core API has no transactions across objects, each write is still a separate call.
+
+    Outside of begin() (eg: when the methods of a policy are called directly) writes are done immediately.
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self.active = False
+        self.reset()
+
+    def reset(self):
+        # [(operation, object, kwargs, on_error)]
+        self.operations = []
+        # id(object) -> kwargs of its queued save_changed_fields
+        self.changed = {}
+        self.callbacks = []
+
+    @contextmanager
+    def begin(self):
+        self.reset()
+        self.active = True
+        try:
+            yield self
+        except BaseException:
+            if self.operations:
+                self.log.debug("UnitOfWork: discarding writes", writes=len(self.operations))
+            raise
+        finally:
+            self.active = False
+        self.commit()
+
+    def save_changed_fields(self, obj, always_update_timestamp=None):
+        kwargs = {}
+        if always_update_timestamp is not None:
+            kwargs["always_update_timestamp"] = always_update_timestamp
+
+        if not self.active:
+            obj.save_changed_fields(**kwargs)
+            return
+
+        queued = self.changed.get(id(obj))
+        if queued is None:
+            self.changed[id(obj)] = kwargs
+            self.operations.append(("save_changed_fields", obj, kwargs, None))
+        elif always_update_timestamp is not None:
+            queued["always_update_timestamp"] = queued.get("always_update_timestamp", False) or always_update_timestamp
+
+    def save(self, obj, after=None):
+        """
+        Saves a new object, after is called once it has been saved
+        """
+        self.queue("save", obj, after)
+
+    def delete(self, obj, after=None, on_error=None):
+        """
+        Deletes an object, if on_error is given a failed delete is passed to it instead of failing the run
+        """
+        self.queue("delete", obj, after, on_error)
+
+    def after_commit(self, callback):
+        if not self.active:
+            callback()
+            return
+        self.callbacks.append(callback)
+
+    def queue(self, operation, obj, after, on_error=None):
+        if not self.active:
+            self.write(operation, obj, {}, on_error)
+            if after:
+                after()
+            return
+        self.operations.append((operation, obj, {}, on_error))
+        if after:
+            self.callbacks.append(after)
+
+    def write(self, operation, obj, kwargs, on_error):
+        if on_error is None:
+            getattr(obj, operation)(**kwargs)
+            return
+        try:
+            getattr(obj, operation)(**kwargs)
+        except BaseException as e:
+            on_error(e)
+
+    def commit(self):
+        operations = self.operations
+        callbacks = self.callbacks
+        self.reset()
+
+        for (operation, obj, kwargs, on_error) in operations:
+            self.write(operation, obj, kwargs, on_error)
+        for callback in callbacks:
+            callback()
+
+        if operations:
+            self.log.debug("UnitOfWork: committed writes", writes=len(operations))
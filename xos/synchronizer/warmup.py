@@ -0,0 +1,105 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+
+from caches import whitelist_index, onu_device_cache, subscriber_index, service_instance_index, \
+    owner_service_cache, subscriber_ip_cache
+from onu_waitlist import onu_waitlist
+from onu_admission import onu_admission
+from reconcile import reconciler
+from snapshot import state_snapshot
+import metrics
+
+warmup_seconds = metrics.gauge(
+    "att_workflow_driver_warmup_seconds",
+    "Time taken to load the caches when the synchronizer has started")
+
+
+def load_whitelist(model_accessor):
+    services = owner_service_cache.load(model_accessor)
+    return sum(whitelist_index.load(model_accessor, service.id) for service in services)
+
+
+def load_onu_devices(model_accessor):
+    return len(onu_device_cache.refresh(model_accessor))
+
+
+def load_subscribers(model_accessor):
+    subscribers = subscriber_index.refresh(model_accessor)
+    subscriber_ip_cache.load(model_accessor, [subscriber.id for subscriber in subscribers.values()])
+    return len(subscribers)
+
+
+def load_service_instances(model_accessor):
+    return service_instance_index.load(model_accessor)
+
+
+# name -> function loading a cache, returning the number of objects loaded
+LOADERS = {
+    "whitelist": load_whitelist,
+    "onu_devices": load_onu_devices,
+    "subscribers": load_subscribers,
+    "service_instances": load_service_instances,
+}
+
+
+def warm_up(model_accessor, log):
+    """
+    Loads the caches used on the event path, in parallel, so that the first events after a restart don't pay for
+    the lookups in the core. A cache that fails to load is loaded on demand, as it would be without the warm-up.
+    The caches saved in the snapshot are restored from it and are not loaded again.
+
+    :return: dict of {name: (objects, seconds)}, objects is None if the cache failed to load
+    """
+    start = time.time()
+    restored = state_snapshot.restore(model_accessor, log)
+    loaded = {}
+
+    def load(name, loader):
+        t = time.time()
+        try:
+            objects = loader(model_accessor)
+        except Exception:
+            log.exception("Warm-up: failed to load %s, it will be loaded on demand" % name)
+            objects = None
+        loaded[name] = (objects, time.time() - t)
+
+    threads = [threading.Thread(target=load, args=(name, loader), name="warmup-%s" % name)
+               for (name, loader) in LOADERS.items() if name not in restored]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.time() - start
+    warmup_seconds.set(elapsed)
+    log.info("Warm-up: caches loaded", elapsed="%.1fs" % elapsed,
+             **dict((name, "%s objects in %.1fs" % (objects, seconds))
+                    for (name, (objects, seconds)) in loaded.items()))
+    return loaded
+
+
+def start_tasks(model_accessor, log):
+    """
+    Starts the background tasks of the synchronizer
+    """
+    # restores the SIs that were waiting for their ONUDevice before the restart
+    onu_waitlist.start(model_accessor, log)
+    onu_admission.start(model_accessor, log)
+    reconciler.start(model_accessor, log)
+    state_snapshot.start(model_accessor, log)
+    metrics.exporter.start(log)
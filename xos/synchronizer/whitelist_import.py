@@ -0,0 +1,236 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Bulk import of the whitelist of an AttWorkflowDriverService, from a CSV file or a TOSCA recipe.
+#
+# usage: python whitelist_import.py [--service NAME] [--format csv|tosca] [--progress-interval N] [--sync]
+#                                   [--endpoint HOST:PORT] [--username USER --password PASSWORD] FILE
+#
+# The CSV file has a header row and the columns serial_number, pon_port_id and device_id.
+
+import argparse
+import csv
+import os
+import sys
+import time
+import yaml
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.realpath(__file__))))
+
+from caches import whitelist_index, normalize_serial  # noqa: E402
+
+WHITELIST_ENTRY_TYPE = "tosca.nodes.AttWorkflowDriverWhiteListEntry"
+
+
+def read_csv(stream):
+    """
+    :return: an iterator over the rows of a CSV whitelist, as dicts
+    """
+    return csv.DictReader(stream)
+
+
+def read_tosca(stream):
+    """
+    :return: an iterator over the properties of the whitelist entries in a TOSCA recipe
+    """
+    recipe = yaml.safe_load(stream) or {}
+    nodes = (recipe.get("topology_template") or {}).get("node_templates") or {}
+    for (name, node) in sorted(nodes.items()):
+        if node.get("type") == WHITELIST_ENTRY_TYPE:
+            yield node.get("properties") or {}
+
+
+def parse_row(row):
+    """
+    :return: the fields of a whitelist entry
+    :raises ValueError: if a field is missing or invalid
+    """
+    serial_number = (row.get("serial_number") or "").strip()
+    device_id = (row.get("device_id") or "").strip()
+    if not serial_number:
+        raise ValueError("missing serial_number")
+    if not device_id:
+        raise ValueError("missing device_id")
+    try:
+        pon_port_id = int(row.get("pon_port_id"))
+    except (TypeError, ValueError):
+        raise ValueError("invalid pon_port_id %r" % row.get("pon_port_id"))
+    return {"serial_number": serial_number, "pon_port_id": pon_port_id, "device_id": device_id}
+
+
+class WhitelistImporter(object):
+    """
+    Upserts the whitelist entries of an AttWorkflowDriverService.
+
+    Each entry is looked up in the whitelist_index, loaded with a single query, and only saved if it is new or has
+    changed. Every saved entry is still a separate call to the core, and AttWorkflowDriverWhiteListEntryPolicy
+    validates again the AttWorkflowDriverServiceInstances of its serial number, so the importer doesn't.
+    Progress and throughput are logged every progress_interval entries.
+    """
+
+    # number of entries processed between two progress reports
+    progress_interval = 1000
+
+    def __init__(self, model_accessor, log, service):
+        self.model_accessor = model_accessor
+        self.log = log
+        self.service = service
+
+    def import_entries(self, rows):
+        """
+        :param rows: iterator over the rows of the whitelist, see read_csv and read_tosca
+        :return: the import stats
+        """
+        self.start()
+        for (n, fields) in enumerate(self.parse(rows), 1):
+            self.upsert(fields)
+            if n % self.progress_interval == 0:
+                self.report("imported entries")
+
+        self.report("import completed")
+        return self.stats
+
+    def sync_entries(self, rows):
+        """
+        Makes the whitelist of the service match rows, which is the complete list of entries:
+        the minimal set of changes is computed in memory and entries that are already current are not saved.
+        Existing entries that are not in rows, or are duplicates, are deleted, unless rows contains invalid entries.
+
+        :param rows: iterator over the rows of the whitelist, see read_csv and read_tosca
+        :return: the sync stats
+        """
+        self.start()
+        desired = {}
+        for fields in self.parse(rows):
+            desired[normalize_serial(fields["serial_number"])] = fields
+
+        for (n, serial_number) in enumerate(sorted(desired.keys()), 1):
+            self.upsert(desired[serial_number])
+            if n % self.progress_interval == 0:
+                self.report("synchronized entries")
+
+        if self.stats["invalid"]:
+            # a truncated or corrupted whitelist would otherwise disable the ONUs that are missing from it
+            self.log.error("WHITELIST_IMPORT: not deleting entries, the whitelist contains invalid entries",
+                           invalid=self.stats["invalid"])
+        else:
+            for (serial_number, entries) in whitelist_index.entries(self.model_accessor, self.service.id).items():
+                # upsert() keeps the oldest entry for a serial number
+                for entry in entries if serial_number not in desired else entries[1:]:
+                    self.delete(entry)
+
+        self.report("sync completed")
+        return self.stats
+
+    def start(self):
+        self.start_time = time.time()
+        self.stats = dict(processed=0, created=0, updated=0, unchanged=0, deleted=0, invalid=0)
+
+    def parse(self, rows):
+        for (n, row) in enumerate(rows, 1):
+            self.stats["processed"] += 1
+            try:
+                yield parse_row(row)
+            except ValueError as e:
+                self.stats["invalid"] += 1
+                self.log.warning("WHITELIST_IMPORT: skipping invalid entry", row=n, reason=str(e))
+
+    def upsert(self, fields):
+        existing = whitelist_index.get(self.model_accessor, self.service.id, fields["serial_number"])
+        if existing is None:
+            entry = self.model_accessor.AttWorkflowDriverWhiteListEntry(
+                owner_id=self.service.id,
+                normalized_serial_number=normalize_serial(fields["serial_number"]),
+                # the entry has been created by the synchronizer, so the delete policy has to run
+                backend_need_delete_policy=True,
+                **fields
+            )
+            entry.save()
+            self.stats["created"] += 1
+        elif all(getattr(existing, f) == v for (f, v) in fields.items()):
+            self.stats["unchanged"] += 1
+            return
+        else:
+            entry = existing
+            for (f, v) in fields.items():
+                setattr(entry, f, v)
+            entry.save_changed_fields()
+            self.stats["updated"] += 1
+
+        whitelist_index.update(entry)
+
+    def delete(self, entry):
+        self.log.debug("WHITELIST_IMPORT: deleting entry", serial_number=entry.serial_number,
+                       pon_port=entry.pon_port_id, device=entry.device_id)
+        entry.delete()
+        whitelist_index.remove(entry)
+        self.stats["deleted"] += 1
+
+    def report(self, message):
+        elapsed = time.time() - self.start_time
+        self.log.info("WHITELIST_IMPORT: %s" % message, service=self.service.name, elapsed="%.1fs" % elapsed,
+                      rate="%.1f entries/s" % (self.stats["processed"] / elapsed if elapsed else 0), **self.stats)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import the whitelist of an AttWorkflowDriverService")
+    parser.add_argument("file", help="CSV file or TOSCA recipe")
+    parser.add_argument("--service", default="att-workflow-driver", help="name of the AttWorkflowDriverService")
+    parser.add_argument("--format", choices=["csv", "tosca"],
+                        help="format of the file (default: tosca for .yaml files, csv otherwise)")
+    parser.add_argument("--progress-interval", type=int, default=WhitelistImporter.progress_interval,
+                        help="number of entries processed between two progress reports")
+    parser.add_argument("--sync", action="store_true",
+                        help="the file is the complete whitelist, delete the entries that are not in it")
+    parser.add_argument("--endpoint", default="xos-core:50055",
+                        help="gRPC endpoint of the XOS core, use the secure endpoint with --username")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    from xosconfig import Config
+    Config.init(os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.yaml"),
+                "synchronizer-config-schema.yaml")
+
+    from multistructlog import create_logger
+    from xosapi import xos_grpc_client
+    log = create_logger(Config().get("logging"))
+
+    fmt = args.format or ("tosca" if args.file.endswith((".yaml", ".yml")) else "csv")
+    reader = read_tosca if fmt == "tosca" else read_csv
+
+    def run():
+        orm = xos_grpc_client.coreclient.xos_orm
+        service = orm.AttWorkflowDriverService.objects.get(name=args.service)
+        importer = WhitelistImporter(orm, log, service)
+        importer.progress_interval = args.progress_interval
+        with open(args.file) as f:
+            if args.sync:
+                importer.sync_entries(reader(f))
+            else:
+                importer.import_entries(reader(f))
+
+    kwargs = {"endpoint": args.endpoint}
+    if args.username:
+        kwargs.update(username=args.username, password=args.password)
+    xos_grpc_client.start_api(run, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Copyright 2019-present Open Networking Foundation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# The subscriber workflow implemented by AttWorkflowDriverServiceInstancePolicy, described as tables.
+#
+# Once the ONU has been validated (admin_onu_state is ENABLED or DISABLED) the rest of the workflow only depends on
+# the state of the SI, so the tables are compiled at import time into a single lookup from
+# (admin_onu_state, oper_onu_status, authentication_state, dhcp_state is AWAITING) to the resulting Transition.
+# Evaluating an SI costs one dict lookup and has no side effects, so it can be applied to many SIs at once.
+
+from collections import namedtuple
+
+ANY = "*"
+
+ONU_STATES = ["AWAITING", "ENABLED", "DISABLED"]
+AUTH_STATES = ["AWAITING", "REQUESTED", "STARTED", "APPROVED", "DENIED"]
+
+# If the ONU has been disabled then we force re-authentication when it is re-enabled.
+# Setting si.authentication_state = AWAITING:
+#   -> subscriber status = "awaiting_auth"
+#   -> service chain deleted
+#   -> need authentication to restore connectivity after ONU enabled
+# (admin_onu_state, oper_onu_status) -> authentication_state, the first matching row wins
+AUTH_TRANSITIONS = [
+    (("DISABLED", ANY), "AWAITING"),
+    ((ANY, "DISABLED"), "AWAITING"),
+]
+
+# authentication_state -> text appended to the status_message, when the authentication_state is not reset
+AUTH_MESSAGES = {
+    "AWAITING": " - Awaiting Authentication",
+    "REQUESTED": " - Authentication requested",
+    "STARTED": " - Authentication started",
+    "APPROVED": " - Authentication succeeded",
+    "DENIED": " - Authentication denied",
+}
+
+# The DhcpL2Relay ONOS app generates events that update dhcp_state, ip_address and mac_address.
+# It only sends events when it processes DHCP packets.  It keeps no internal state.
+# We reset them when the authentication_state is one of these:
+#   -> subscriber status = "awaiting_auth"
+#   -> service chain not present
+#   -> subscriber's OLT flow rules, xconnect not present
+#   -> DHCP packets won't go through
+# Note, however, that the DHCP state at the endpoints is not changed.
+# A previously issued DHCP lease may still be valid.
+DHCP_RESET_STATES = ["AWAITING", "REQUESTED", "STARTED"]
+
+# authentication_state -> RCORDSubscriber status, unless the subscriber has been disabled by the operator
+SUBSCRIBER_STATUS = {
+    "AWAITING": "awaiting-auth",
+    "REQUESTED": "awaiting-auth",
+    "STARTED": "awaiting-auth",
+    "APPROVED": "enabled",
+    "DENIED": "auth-failed",
+}
+
+# The valid state combinations after the workflow has been applied,
+# anything else means an event has fired in the meantime
+# (admin_onu_state, authentication_state, dhcp_state is AWAITING)
+VALID_STATES = [
+    ("AWAITING", "AWAITING", True),
+    ("DISABLED", "AWAITING", True),
+    ("ENABLED", ANY, True),
+    ("ENABLED", "APPROVED", ANY),
+]
+
+Transition = namedtuple("Transition", [
+    "authentication_state",
+    "status_message",
+    "reset_dhcp",
+    "subscriber_status",
+    "valid",
+])
+
+
+def matches(row, values):
+    return all(r == ANY or r == v for (r, v) in zip(row, values))
+
+
+def transition(admin_onu_state, oper_onu_status, authentication_state, dhcp_awaiting):
+    """
+    Evaluates the tables for one combination of states
+    """
+    status_message = AUTH_MESSAGES.get(authentication_state, "")
+    for (row, state) in AUTH_TRANSITIONS:
+        if matches(row, (admin_onu_state, oper_onu_status)):
+            authentication_state = state
+            status_message = ""
+            break
+
+    reset_dhcp = authentication_state in DHCP_RESET_STATES
+    valid = any(matches(row, (admin_onu_state, authentication_state, dhcp_awaiting or reset_dhcp))
+                for row in VALID_STATES)
+
+    return Transition(
+        authentication_state=authentication_state,
+        status_message=status_message,
+        reset_dhcp=reset_dhcp,
+        subscriber_status=SUBSCRIBER_STATUS.get(authentication_state),
+        valid=valid,
+    )
+
+
+def compile_workflow():
+    table = {}
+    for admin_onu_state in ONU_STATES:
+        for oper_onu_status in ONU_STATES:
+            for authentication_state in AUTH_STATES:
+                for dhcp_awaiting in [True, False]:
+                    key = (admin_onu_state, oper_onu_status, authentication_state, dhcp_awaiting)
+                    table[key] = transition(*key)
+    return table
+
+
+TABLE = compile_workflow()
+
+
+def evaluate(si):
+    """
+    :return: the Transition for the current state of si
+    """
+    key = (si.admin_onu_state, si.oper_onu_status, si.authentication_state, si.dhcp_state == "AWAITING")
+    compiled = TABLE.get(key)
+    if compiled is None:
+        # a state that is not in the model choices
+        return transition(*key)
+    return compiled